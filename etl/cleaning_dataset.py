@@ -1,12 +1,15 @@
 import logging
 import os
-import pandas as pd
+
+from scraping.datasets import dataset_path, read_dataset
 
 logging.basicConfig(level=logging.INFO)
 
 def main(TAG: str):
-    dataset_file = f'output/eps_rep_{TAG}.csv'
-    df = pd.read_csv(dataset_file)
+    # Reads output/eps_rep_<TAG>.parquet when the scraper wrote columnar output
+    dataset_file = dataset_path(f'output/eps_rep_{TAG}')
+    # report_year only exists as a partition of the Parquet layout
+    df = read_dataset(dataset_file).drop(columns=['report_year'], errors='ignore')
     logging.info(f"Loaded dataset with {df.shape[0]} rows and {df.shape[1]} columns.")
     # Perform data cleaning and preprocessing here
     df.dropna(inplace=True)
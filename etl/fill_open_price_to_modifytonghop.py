@@ -1,5 +1,7 @@
 import pandas as pd
 
+from scraping.price_store import DEFAULT_PRICE_STORE, PriceStore
+
 def fill_closing_price():
     df = pd.read_csv('./data/modified_tonghop.csv')
     df_closing_price = pd.read_csv('./data/get_cp_datebefore_repdate.csv')
@@ -20,5 +22,22 @@ def fill_closing_price():
     df.to_csv('./output/modified_tonghop_filled.csv', index=False)
     print("Filled closing prices and saved to ./output/modified_tonghop_filled.csv")
 
+def fill_closing_price_from_store(store_path=DEFAULT_PRICE_STORE):
+    """
+    Same output as fill_closing_price, looked up in the price store instead of
+    get_cp_datebefore_repdate.csv: price_day_before is the closing price of the last stored
+    trading day before report_date, and get_date that day.
+    """
+    df = pd.read_csv('./data/modified_tonghop.csv')
+    store = PriceStore.load(store_path, df['sec_code'].unique())
+
+    found_days, prices = store.asof_many(df['sec_code'], df['report_date'], side='before')
+    df['price_day_before'] = prices
+    df['get_date'] = pd.Series(found_days, index=df.index).dt.strftime('%d/%m/%Y')
+    print(f"Found a stored price for {df['price_day_before'].notna().sum()} of {df.shape[0]} rows.")
+
+    df.to_csv('./output/modified_tonghop_filled.csv', index=False)
+    print("Filled closing prices and saved to ./output/modified_tonghop_filled.csv")
+
 if __name__ == "__main__":
     fill_closing_price()
\ No newline at end of file
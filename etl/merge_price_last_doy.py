@@ -1,10 +1,12 @@
 import pandas as pd
 
+from scraping.datasets import dataset_path, read_dataset
+from scraping.price_store import DEFAULT_PRICE_STORE, PriceStore
+
 def merge_closing_price():
     df = pd.read_csv('./data/data-ver2.csv')
     df = df[['sec_code', 'year']]
-    df_last_doy = pd.read_csv('./output/get_cp_lastdoy_minus1.csv')
-    df_last_doy = df_last_doy[['sec_code', 'year', 'closing_price_last_doy']]
+    df_last_doy = read_dataset(dataset_path('./output/get_cp_lastdoy_minus1'), columns=['sec_code', 'year', 'closing_price_last_doy'])
     
     # Remove duplicate rows if any
     df_last_doy = df_last_doy.drop_duplicates(subset=['sec_code', 'year'])
@@ -17,5 +19,23 @@ def merge_closing_price():
     df.to_csv('./data/data-ver2_cp_last_doy_minus1.csv', index=False)
     print("Merged closing price and saved to ./data/data-ver2_cp_last_doy_minus1.csv")
 
+def merge_closing_price_from_store(store_path=DEFAULT_PRICE_STORE):
+    """
+    Same output as merge_closing_price, looked up in the price store instead of a scrape per
+    row: the price of each (sec_code, year) is the last stored trading day before 1 January.
+    """
+    df = pd.read_csv('./data/data-ver2.csv')
+    df = df[['sec_code', 'year']]
+    store = PriceStore.load(store_path, df['sec_code'].unique())
+
+    cutoffs = df['year'].astype(int).astype(str) + '-01-01'
+    found_days, prices = store.asof_many(df['sec_code'], cutoffs, side='before')
+    df['closing_price_last_doy'] = prices
+    df['get_date'] = pd.Series(found_days, index=df.index).dt.strftime('%d/%m/%Y')
+    print(f"Found a stored price for {df['closing_price_last_doy'].notna().sum()} of {df.shape[0]} rows.")
+
+    df.to_csv('./data/data-ver2_cp_last_doy_minus1.csv', index=False)
+    print("Merged closing price and saved to ./data/data-ver2_cp_last_doy_minus1.csv")
+
 if __name__ == "__main__":
     merge_closing_price()
\ No newline at end of file
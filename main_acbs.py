@@ -24,7 +24,7 @@ def main(TAG: str, size: int = None):
     sec_code_list_test = ['VHM', 'VNM', 'IDC'] # Example stock codes for testing
 
     # scraping_acbs_all(output_dir=output_dir, max_pages=127, start_page=60, download_dir=download_dir)
-    scraping_acbs_all(output_dir=output_dir, max_pages=60, start_page=1, download_dir=download_dir, firm=TAG)
+    scraping_acbs_all(output_dir=output_dir, max_pages=60, start_page=1, download_dir=download_dir, firm=TAG, shards=4)
 
 if __name__ == "__main__":
     main("ACBS_23_toall")
@@ -1,54 +1,68 @@
-import os
 import pandas as pd
 import playwright.sync_api as pw
 from scraping.utils.Utils import parse_vietnamese_date, extract_report_date
 import logging
-import time
+from scraping import replay, waits
+from scraping.checkpoint import default_journal_path, get_journal
+from scraping.dom_extract import extract_table
+from scraping.result_writer import ResultWriter
 
 logging.basicConfig(
     level=logging.INFO,
     format="%(asctime)s - %(levelname)s - %(message)s"
 )
 
+OUTPUT_PATH = "./output/finrepdate.csv"
+OUTPUT_SCHEMA = {'sec_code': 'string', 'year': 'int', 'reference': 'string', 'date': 'string', 'flag': 'bool'}
+
 def main():
     # Initialize Playwright and open a browser
     df = pd.read_csv('./data/sec_code_with_year_1509025.csv')
     df = df[['sec_code', 'year']]
     last_sec_code = None
+    journal = get_journal(default_journal_path(OUTPUT_PATH))
     
-    with pw.sync_playwright() as p:
-        browser = p.chromium.launch(headless=False)
+    with pw.sync_playwright() as p, ResultWriter(OUTPUT_PATH, OUTPUT_SCHEMA, flush_rows=100) as writer:
+        browser = replay.launch(p.chromium, headless=False)
         page = browser.new_page()
 
         URL = f"https://congbothongtin.ssc.gov.vn/faces/NewsSearch"
         page.goto(URL)
         page.wait_for_load_state("domcontentloaded")
 
-        time.sleep(5)  # wait for 5 seconds to ensure page is fully loaded
+        waits.wait_for_selector(page, "input#pt9\\:it8112\\:\\:content", name="ssc.search_form")
 
         for index, df_row in df.iterrows():
             sec_code = df_row['sec_code']
             year = df_row['year']
+            item_key = f"{sec_code}:{year}"
+            if journal.item_done(item_key):
+                continue
             
             page.locator("input#pt9\\:it8112\\:\\:content").fill(sec_code)
             page.locator("input#pt9\\:id1\\:\\:content").fill("01/01/" + str(int(year)+1))
             page.locator("input#pt9\\:id2\\:\\:content").fill("31/12/" + str(int(year)+1))
 
-            page.click("div#pt9\\:b1 a")
-
-            time.sleep(1)
+            # The search is an ADF partial page request, wait for its POST to come back
+            waits.wait_for_response(
+                page, lambda: page.click("div#pt9\\:b1 a"),
+                lambda response: response.request.method == "POST" and "NewsSearch" in response.url,
+                name="ssc.search", max_timeout=15000
+            )
+            page.wait_for_load_state("domcontentloaded")
             
-            table = page.query_selector("table.x14q.x15f")
-            rows = table.query_selector_all("tbody tr")
+            # Every cell of the result table in one round trip
+            rows = extract_table(page, "table.x14q.x15f tbody")
             results = []
-            for row in rows:
+            for cols in rows:
                 flag = False
-                cols = row.query_selector_all("td")
-                reference = cols[3].inner_text().strip().lower()
+                if len(cols) < 5:
+                    continue
+                reference = cols[3].lower()
                 
                 # Check if reference have "hợp nhất" and "kiểm toán" in it
                 if "hợp nhất" in reference and "kiểm toán" in reference:
-                    date_str = cols[4].inner_text().strip()
+                    date_str = cols[4]
                     extracted_date = extract_report_date(date_str)
                     
                     # If date is after 31/03/year, flag = True
@@ -66,10 +80,12 @@ def main():
                     })
                     logging.info(f"Found report for {sec_code} in year {year}: {reference} on {extracted_date}, flag={flag}") 
             
-            pd.DataFrame(results).to_csv(f"./output/finrepdate.csv", index=False, mode='a', header=not os.path.exists(f"./output/finrepdate.csv"))
+            outcome = "done" if results else "empty"
+            writer.write(results, on_flushed=lambda key=item_key, outcome=outcome: journal.mark_item(key, outcome))
         
         # Close the browser
         browser.close()
+        waits.log_wait_stats()
 
 def drop_duplicates(input_csv: str, output_csv: str):
     df = pd.read_csv(input_csv)
@@ -1,9 +1,13 @@
-import os
+import argparse
 import pandas as pd
 import playwright.sync_api as pw
 from scraping.utils.Utils import parse_vietnamese_date
 import logging
-import time
+from scraping import replay, waits
+from scraping.checkpoint import default_journal_path, get_journal
+from scraping.result_writer import ResultWriter
+from scraping.cafef_prices import bulk_fetch
+from scraping.price_store import DEFAULT_PRICE_STORE, PriceStore
 
 logging.basicConfig(level=logging.INFO)
 
@@ -15,6 +19,9 @@ DATE_2022 = "30/12/2022"
 DATE_2023 = "29/12/2023"
 DATE_2024 = "31/12/2024"
 
+OUTPUT_PATH = './output/get_cp_lastdoy_minus1.csv'
+OUTPUT_SCHEMA = {'sec_code': 'string', 'closing_price_last_doy': 'float', 'get_date': 'date'}
+
 def main(start_row: int = 0):
     # Load dataframe from /data/get_eps_date_sec_code.csv
     df = pd.read_csv('./data/data-ver2_cp_last_doy_minus1.csv')
@@ -22,10 +29,12 @@ def main(start_row: int = 0):
     # Remove all columns except sec_code and year
     df = df[['sec_code', 'year', 'closing_price_last_doy']]
     last_sec_code = None
+    # Lookups finished by an earlier run are skipped, start_row is only needed to jump ahead
+    journal = get_journal(default_journal_path(OUTPUT_PATH))
 
     # Initialize Playwright and open a browser
-    with pw.sync_playwright() as p:
-        browser = p.chromium.launch(headless=False)
+    with pw.sync_playwright() as p, ResultWriter(OUTPUT_PATH, OUTPUT_SCHEMA, flush_rows=50) as writer:
+        browser = replay.launch(p.chromium, headless=False)
         page = browser.new_page()
 
         for index, row in df.iterrows():
@@ -59,6 +68,9 @@ def main(start_row: int = 0):
                 continue
             
             sec_code = sec_code.lower()
+            item_key = f"{sec_code}:{get_date}"
+            if journal.item_done(item_key):
+                continue
             if sec_code != last_sec_code:
                 last_sec_code = sec_code
                 logging.info(f"Navigating to page for {sec_code}")
@@ -69,17 +81,14 @@ def main(start_row: int = 0):
                 page.wait_for_load_state('domcontentloaded')
             else:
                 logging.info(f"Reusing page for {sec_code}")
-            time.sleep(0.2)  # Wait for the page to load
+            waits.wait_for_selector(page, 'input#date-inp-disclosure', name='cafef.page_ready')
 
             page.fill('input#date-inp-disclosure', f"{get_date} - {get_date}")
 
-            time.sleep(0.6)  # Wait for the date input to be filled
             page.mouse.click(10, 10)  # Focus on the date input
             # page.click('button.applyBtn.btn.btn-sm.btn-primary')
-            time.sleep(0.6)  # Wait for the date filter to apply
-            page.click('div#owner-find')
-            page.wait_for_load_state('domcontentloaded')
-            time.sleep(0.6)  # Wait for the table to load
+            waits.wait_for_selector(page, 'div.daterangepicker', state='hidden', name='cafef.datepicker_close', max_timeout=5000)
+            waits.wait_for_change(page, 'table#owner-contents-table tbody', lambda: page.click('div#owner-find'), name='cafef.price_table', max_timeout=10000)
             
             # Extract the closing price from the table
             try:
@@ -98,12 +107,50 @@ def main(start_row: int = 0):
                 'get_date': get_date
             })
             
-            # Write intermediate result to csv
-            pd.DataFrame([result]).to_csv('./output/get_cp_lastdoy_minus1.csv', mode='a', header=not os.path.exists('./output/get_cp_lastdoy_minus1.csv'), index=False)
+            # Buffered, the lookup is journaled once its row is on disk
+            outcome = "done" if closing_price is not None else "failed"
+            writer.write_row(result, on_flushed=lambda key=item_key, outcome=outcome: journal.mark_item(key, outcome))
             # time.sleep(5)
         # Close the browser
         browser.close()
+        waits.log_wait_stats()
+
+
+def main_bulk(store_path: str = DEFAULT_PRICE_STORE):
+    """
+    Bulk mode: fetch each ticker's full history once into the price store, then answer every
+    row from it. The last trading day of the previous year is the last stored day before
+    1 January, so no DATE_20xx constant is needed.
+    """
+    df = pd.read_csv('./data/data-ver2_cp_last_doy_minus1.csv')
+    df = df[df['closing_price_last_doy'].isna() & df['year'].between(2019, 2024)]
+    journal = get_journal(default_journal_path(OUTPUT_PATH))
 
+    sec_codes = df['sec_code'].str.lower().unique()
+    bulk_fetch(sec_codes, store_path)
+    store = PriceStore.load(store_path, sec_codes)
+
+    queries = pd.DataFrame({
+        'sec_code': df['sec_code'].str.lower(),
+        'cutoff': df['year'].astype(int).astype(str) + '-01-01',
+    }).drop_duplicates()
+    found_days, prices = store.asof_many(queries['sec_code'], queries['cutoff'], side='before')
+
+    with ResultWriter(OUTPUT_PATH, OUTPUT_SCHEMA, flush_rows=500) as writer:
+        for sec_code, cutoff, day, price in zip(queries['sec_code'], queries['cutoff'], found_days, prices):
+            if pd.isna(day):
+                logging.warning(f"No stored price for {sec_code} before {cutoff}")
+                continue
+            get_date = pd.Timestamp(day).strftime('%d/%m/%Y')
+            item_key = f"{sec_code}:{get_date}"
+            if journal.item_done(item_key):
+                continue
+            closing_price = None if pd.isna(price) else float(price)
+            outcome = "done" if closing_price is not None else "failed"
+            writer.write_row(
+                {'sec_code': sec_code, 'closing_price_last_doy': closing_price, 'get_date': get_date},
+                on_flushed=lambda key=item_key, outcome=outcome: journal.mark_item(key, outcome)
+            )
 
 def remove_duplicates():
     df = pd.read_csv('./output/get_cp_lastdoy_minus1.csv')
@@ -112,5 +159,17 @@ def remove_duplicates():
     logging.info("Removed duplicates and saved to ./output/get_cp_lastdoy_minus1.csv")
     
 if __name__ == "__main__":
-    # main()
-    remove_duplicates()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Closing price of each row's ticker on the last trading day of the previous year.")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--bulk", action="store_true", help="answer every row from the price store (main_bulk)")
+    mode.add_argument("--per-row", action="store_true", help="look each row up on cafef (main)")
+    parser.add_argument("--store", default=DEFAULT_PRICE_STORE)
+    parser.add_argument("--start-row", type=int, default=0, help="first row for --per-row")
+    args = parser.parse_args()
+    if args.bulk:
+        main_bulk(args.store)
+    elif args.per_row:
+        main(args.start_row)
+    else:
+        # Without a mode, only drop duplicate rows of the existing output
+        remove_duplicates()
\ No newline at end of file
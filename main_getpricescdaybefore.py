@@ -1,20 +1,29 @@
-import os
+import argparse
 import pandas as pd
 import playwright.sync_api as pw
 from scraping.utils.Utils import parse_vietnamese_date
 import logging
-import time
+from scraping import replay, waits
+from scraping.checkpoint import default_journal_path, get_journal
+from scraping.result_writer import ResultWriter
+from scraping.cafef_prices import bulk_fetch
+from scraping.price_store import DEFAULT_PRICE_STORE, PriceStore
 
 logging.basicConfig(level=logging.INFO)
 
+OUTPUT_PATH = './output/get_cp_datebefore_repdate_v2.csv'
+OUTPUT_SCHEMA = {'sec_code': 'string', 'report_date': 'string', 'price_day_before': 'float', 'get_date': 'string'}
+
 def main(start_row: int = 1):
     # Load dataframe from /data/get_eps_date_sec_code.csv
     df = pd.read_csv('./data/get_cp_datebefore_repdate.csv')
     last_sec_code = None
+    # Lookups finished by an earlier run are skipped, start_row is only needed to jump ahead
+    journal = get_journal(default_journal_path(OUTPUT_PATH))
 
     # Initialize Playwright and open a browser
-    with pw.sync_playwright() as p:
-        browser = p.chromium.launch(headless=False)
+    with pw.sync_playwright() as p, ResultWriter(OUTPUT_PATH, OUTPUT_SCHEMA, flush_rows=50) as writer:
+        browser = replay.launch(p.chromium, headless=False)
         page = browser.new_page()
 
         for index, row in df.iterrows():
@@ -24,6 +33,9 @@ def main(start_row: int = 1):
             sec_code = row['sec_code']
             report_date = row['report_date']
             get_date = row['get_date']
+            item_key = f"{sec_code.lower()}:{report_date}"
+            if journal.item_done(item_key):
+                continue
 
             # if open_price is not None and open_price > 0:
             #     logging.info(f"Skipping {sec_code} on {report_date} as open_price is already available: {open_price}")
@@ -41,7 +53,7 @@ def main(start_row: int = 1):
                 page.wait_for_load_state('domcontentloaded')
             else:
                 logging.info(f"Reusing page for {sec_code}")
-            time.sleep(0.2)  # Wait for the page to load
+            waits.wait_for_selector(page, 'input#date-inp-disclosure', name='cafef.page_ready')
             
             # Navigate to the historical prices section
             day, month, year = parse_vietnamese_date(get_date)
@@ -73,13 +85,10 @@ def main(start_row: int = 1):
 
             page.fill('input#date-inp-disclosure', f"{get_price_date} - {get_price_date}")
 
-            time.sleep(0.6)  # Wait for the date input to be filled
             page.mouse.click(10, 10)  # Focus on the date input
             # page.click('button.applyBtn.btn.btn-sm.btn-primary')
-            time.sleep(0.6)  # Wait for the date filter to apply
-            page.click('div#owner-find')
-            page.wait_for_load_state('domcontentloaded')
-            time.sleep(0.6)  # Wait for the table to load
+            waits.wait_for_selector(page, 'div.daterangepicker', state='hidden', name='cafef.datepicker_close', max_timeout=5000)
+            waits.wait_for_change(page, 'table#owner-contents-table tbody', lambda: page.click('div#owner-find'), name='cafef.price_table', max_timeout=10000)
             
             # Extract the closing price from the table
             try:
@@ -99,12 +108,58 @@ def main(start_row: int = 1):
                 'get_date': get_date
             })
             
-            # Write intermediate result to csv
-            pd.DataFrame([result]).to_csv('./output/get_cp_datebefore_repdate_v2.csv', mode='a', header=not os.path.exists('./output/get_cp_datebefore_repdate.csv'), index=False)
+            # Buffered, the lookup is journaled once its row is on disk
+            outcome = "done" if closing_price is not None else "failed"
+            writer.write_row(result, on_flushed=lambda key=item_key, outcome=outcome: journal.mark_item(key, outcome))
             # time.sleep(5)
         # Close the browser
         browser.close()
-    
-    
+        waits.log_wait_stats()
+
+
+def main_bulk(store_path: str = DEFAULT_PRICE_STORE):
+    """
+    Bulk mode: fetch each ticker's full history once into the price store, then answer every
+    row from it. Rows whose get_date has day 0 get the closing price of the last trading day
+    of the previous month (the calendar day itself when it was traded).
+    """
+    df = pd.read_csv('./data/get_cp_datebefore_repdate.csv')
+    dates = df['get_date'].map(parse_vietnamese_date)
+    # Only "day 0" dates need a price, as in main()
+    df = df[dates.map(lambda date: date[0] == 0)]
+    if df.empty:
+        logging.info("No row needs a price")
+        return
+    journal = get_journal(default_journal_path(OUTPUT_PATH))
+
+    sec_codes = df['sec_code'].str.lower().unique()
+    bulk_fetch(sec_codes, store_path)
+    store = PriceStore.load(store_path, sec_codes)
+
+    month_starts = [f"{year}-{month:02d}-01" for _, month, year in dates[df.index]]
+    _, prices = store.asof_many(df['sec_code'], month_starts, side='before')
+
+    with ResultWriter(OUTPUT_PATH, OUTPUT_SCHEMA, flush_rows=500) as writer:
+        for sec_code, report_date, get_date, month_start, price in zip(df['sec_code'].str.lower(), df['report_date'], df['get_date'], month_starts, prices):
+            item_key = f"{sec_code}:{report_date}"
+            if journal.item_done(item_key):
+                continue
+            closing_price = None if pd.isna(price) else float(price)
+            if closing_price is None:
+                logging.warning(f"No stored price for {sec_code} before {month_start}")
+            outcome = "done" if closing_price is not None else "failed"
+            writer.write_row(
+                {'sec_code': sec_code, 'report_date': report_date, 'price_day_before': closing_price, 'get_date': get_date},
+                on_flushed=lambda key=item_key, outcome=outcome: journal.mark_item(key, outcome)
+            )
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Closing price of each row's ticker on the trading day before its report date.")
+    parser.add_argument("--bulk", action="store_true", help="answer every row from the price store instead of one cafef lookup per row")
+    parser.add_argument("--store", default=DEFAULT_PRICE_STORE)
+    parser.add_argument("--start-row", type=int, default=1, help="first row of the per-row mode")
+    args = parser.parse_args()
+    if args.bulk:
+        main_bulk(args.store)
+    else:
+        main(args.start_row)
\ No newline at end of file
@@ -0,0 +1,255 @@
+import argparse
+import csv
+import json
+import logging
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+from scraping.eps_scraping_pdf import EXTRACTORS
+from scraping.pdf_document import load_pdf
+from scraping.result_writer import parse_date
+
+DEFAULT_CORPUS_DIR = "benchmarks/corpus"
+DEFAULT_RESULTS_DIR = "benchmarks/results"
+DEFAULT_EXTRACTORS = ["v5", "v6", "v7", "v7_mirra", "v8"]
+
+# Ground truth columns. A document with no EPS is listed once with empty clean_year and eps.
+TRUTH_COLUMNS = ["file_name", "report_date", "sec_code", "clean_year", "eps"]
+
+
+def _pair(clean_year, eps):
+    """(year, eps) key compared between extracted rows and the ground truth, None when incomplete."""
+    try:
+        return int(str(clean_year).strip()), round(float(str(eps).replace(",", "")), 2)
+    except (TypeError, ValueError):
+        return None
+
+
+def load_ground_truth(path):
+    """
+    Read the ground truth CSV (columns TRUTH_COLUMNS, sec_code optional) into
+    {file_name: {"report_date", "sec_code", "pairs"}} in file order.
+    """
+    documents = {}
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        reader = csv.DictReader(f)
+        missing = {"file_name", "report_date", "clean_year", "eps"} - set(reader.fieldnames or [])
+        if missing:
+            raise ValueError(f"{path} is missing columns {sorted(missing)}, expected {TRUTH_COLUMNS}")
+        for row in reader:
+            doc = documents.setdefault(row["file_name"], {
+                "report_date": row["report_date"],
+                "sec_code": (row.get("sec_code") or "").strip() or None,
+                "pairs": set(),
+            })
+            pair = _pair(row["clean_year"], row["eps"])
+            if pair:
+                doc["pairs"].add(pair)
+    return documents
+
+
+def percentile(values, q):
+    """q-th percentile (0-100) of `values` with linear interpolation, None when empty."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * q / 100
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def _report_date(value):
+    """Report date in the dd/mm/yyyy form the extractors parse."""
+    parsed = parse_date(value)
+    return parsed.strftime("%d/%m/%Y") if parsed else value
+
+
+def _run_extractor(version, corpus_dir, documents, extractor_kwargs):
+    """Run one extractor over the corpus. Executed in a fresh worker process so peak RSS is its own."""
+    logging.basicConfig(level=logging.WARNING, format="%(asctime)s - %(levelname)s - %(message)s")
+    extract = EXTRACTORS[version]
+    results = {}
+    for file_name, truth in documents.items():
+        pdf_path = os.path.join(corpus_dir, file_name)
+        started = time.perf_counter()
+        error = None
+        try:
+            rows = extract(
+                pdf_path, _report_date(truth["report_date"]),
+                already_detected_sc=truth["sec_code"], url="", **extractor_kwargs
+            ) or []
+        except Exception as e:
+            rows, error = [], str(e)
+        latency = time.perf_counter() - started
+
+        found = {pair for pair in (_pair(row.get("clean_year"), row.get("eps")) for row in rows) if pair}
+        expected = set(map(tuple, truth["pairs"]))
+        results[file_name] = {
+            "latency": latency,
+            "pages": load_pdf(pdf_path).page_count,
+            "rows": len(rows),
+            "tp": len(found & expected),
+            "fp": len(found - expected),
+            "fn": len(expected - found),
+            "error": error,
+        }
+    # ru_maxrss is in KiB on Linux and in bytes on macOS
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    peak_rss_mb = peak_rss / (1024 * 1024) if sys.platform == "darwin" else peak_rss / 1024
+    return results, peak_rss_mb
+
+
+def summarize(documents, peak_rss_mb):
+    """Corpus level metrics of one extractor from its per-document results."""
+    latencies = [doc["latency"] for doc in documents.values()]
+    total_time = sum(latencies)
+    tp = sum(doc["tp"] for doc in documents.values())
+    fp = sum(doc["fp"] for doc in documents.values())
+    fn = sum(doc["fn"] for doc in documents.values())
+    precision = tp / (tp + fp) if tp + fp else None
+    recall = tp / (tp + fn) if tp + fn else None
+    f1 = 2 * precision * recall / (precision + recall) if precision and recall else None
+    return {
+        "documents": len(documents),
+        "errors": sum(1 for doc in documents.values() if doc["error"]),
+        "latency_p50": percentile(latencies, 50),
+        "latency_p90": percentile(latencies, 90),
+        "latency_p99": percentile(latencies, 99),
+        "latency_max": max(latencies, default=None),
+        "total_seconds": total_time,
+        "pages_per_second": sum(doc["pages"] for doc in documents.values()) / total_time if total_time else None,
+        "peak_rss_mb": peak_rss_mb,
+        "tp": tp,
+        "fp": fp,
+        "fn": fn,
+        "precision": precision,
+        "recall": recall,
+        "f1": f1,
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmark(corpus_dir=DEFAULT_CORPUS_DIR, truth_path=None, extractors=None, extractor_kwargs=None):
+    """
+    Run `extractors` over the PDFs of `corpus_dir` listed in the ground truth CSV
+    (default <corpus_dir>/ground_truth.csv) and return the report as a dict.
+
+    Every extractor runs in its own fresh process, without the result cache, so latencies
+    include parsing and peak RSS is not shared between extractors.
+    """
+    truth_path = truth_path or os.path.join(corpus_dir, "ground_truth.csv")
+    documents = load_ground_truth(truth_path)
+    for file_name in [name for name in documents if not os.path.exists(os.path.join(corpus_dir, name))]:
+        logging.warning(f"{file_name} is listed in {truth_path} but missing from {corpus_dir}, skipping")
+        del documents[file_name]
+    if not documents:
+        raise ValueError(f"No document of {truth_path} found in {corpus_dir}")
+
+    extractors = extractors or DEFAULT_EXTRACTORS
+    for version in extractors:
+        if version not in EXTRACTORS:
+            raise ValueError(f"Unknown extractor '{version}', expected one of {sorted(EXTRACTORS)}")
+
+    report = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "corpus": os.path.abspath(corpus_dir),
+        "extractor_kwargs": extractor_kwargs or {},
+        "extractors": {},
+    }
+    for version in extractors:
+        logging.info(f"Benchmarking {version} on {len(documents)} documents")
+        with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as pool:
+            per_document, peak_rss_mb = pool.submit(
+                _run_extractor, version, corpus_dir, documents, extractor_kwargs or {}
+            ).result()
+        report["extractors"][version] = {"summary": summarize(per_document, peak_rss_mb), "documents": per_document}
+    return report
+
+
+def compare(report, baseline):
+    """
+    Lines describing how each extractor's summary moved from `baseline` (another report),
+    e.g. "v7 latency_p50: 1.204 -> 0.981 (-18.5%)".
+    """
+    lines = []
+    for version, current in report["extractors"].items():
+        previous = baseline.get("extractors", {}).get(version)
+        if previous is None:
+            lines.append(f"{version}: not in baseline")
+            continue
+        for metric in ("latency_p50", "latency_p90", "pages_per_second", "peak_rss_mb", "precision", "recall", "f1"):
+            old, new = previous["summary"].get(metric), current["summary"].get(metric)
+            if old is None or new is None:
+                continue
+            change = f" ({(new - old) / old:+.1%})" if old else ""
+            lines.append(f"{version} {metric}: {old:.3f} -> {new:.3f}{change}")
+        changed = [
+            name for name, doc in current["documents"].items()
+            if name in previous["documents"] and (doc["tp"], doc["fp"], doc["fn"]) != (
+                previous["documents"][name]["tp"], previous["documents"][name]["fp"], previous["documents"][name]["fn"]
+            )
+        ]
+        if changed:
+            lines.append(f"{version} accuracy changed on: {', '.join(changed)}")
+    return lines
+
+
+def _format_summary(version, summary):
+    def fmt(value, spec):
+        return "-" if value is None else format(value, spec)
+    return (
+        f"{version:<10} docs={summary['documents']} errors={summary['errors']}"
+        f" p50={fmt(summary['latency_p50'], '.3f')}s p90={fmt(summary['latency_p90'], '.3f')}s"
+        f" p99={fmt(summary['latency_p99'], '.3f')}s pages/s={fmt(summary['pages_per_second'], '.2f')}"
+        f" rss={fmt(summary['peak_rss_mb'], '.0f')}MB"
+        f" precision={fmt(summary['precision'], '.3f')} recall={fmt(summary['recall'], '.3f')} f1={fmt(summary['f1'], '.3f')}"
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the EPS extractors on a local PDF corpus with ground truth.")
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS_DIR, help="directory of sample PDFs (default: %(default)s)")
+    parser.add_argument("--truth", help="ground truth CSV with columns " + ", ".join(TRUTH_COLUMNS) + " (default: <corpus>/ground_truth.csv)")
+    parser.add_argument("--extractors", nargs="+", choices=sorted(EXTRACTORS), default=DEFAULT_EXTRACTORS)
+    parser.add_argument("--early-exit", action="store_true", help="run the extractors with early_exit=True")
+    parser.add_argument("--output", help="JSON report path (default: %s/<timestamp>.json)" % DEFAULT_RESULTS_DIR)
+    parser.add_argument("--baseline", help="earlier JSON report to compare against")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    report = run_benchmark(
+        args.corpus, args.truth, args.extractors,
+        extractor_kwargs={"early_exit": True} if args.early_exit else None
+    )
+
+    output = args.output or os.path.join(DEFAULT_RESULTS_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+    for version, result in report["extractors"].items():
+        print(_format_summary(version, result["summary"]))
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            for line in compare(report, json.load(f)):
+                print(line)
+    print(f"Report written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,12 @@
-import os
-import requests
 import logging
-import time
 from urllib.parse import urljoin
 from playwright.sync_api import sync_playwright
-import pandas as pd
 
-from scraping.eps_scraping_pdf import extract_clean_eps_v6
+from scraping.download_store import DEFAULT_STORE_DIR, get_store
+from scraping import waits
+from scraping import profiling, replay
+from scraping.pipeline import ExtractionPipeline, ExtractionJob, ResultSink
+from scraping.checkpoint import default_journal_path, get_journal
 from scraping.utils.Utils import parse_vietnamese_date, extract_report_date, convert_vietnamese_charmonth_int, validate_sec_code
 
 ROOT_URL = "https://www.bvsc.com.vn"
@@ -14,17 +14,21 @@ BASE_URL = "https://www.bvsc.com.vn/danhmuc/phan-tich/bao-cao-chi-tiet-bvsc/bao-
 DATE_RANGE = ""
 PAGE_PARAM = ""
         
-def scraping_bvs_all(download_dir="downloads", valid_codes=None, max_pages=20, start_page=1, output_dir="output/eps_rep_bvs.csv", blacklist_code=None, firm="BVS"):
-    os.makedirs(download_dir, exist_ok=True)
+def scraping_bvs_all(download_dir="downloads", valid_codes=None, max_pages=20, start_page=1, output_dir="output/eps_rep_bvs.csv", blacklist_code=None, firm="BVS", store_dir=DEFAULT_STORE_DIR, interactive=False, checkpoint_path=None):
+    store = get_store(store_dir)
     
-    with sync_playwright() as p:
-        browser = p.chromium.launch(headless=False)
+    journal = get_journal(checkpoint_path or default_journal_path(output_dir))
+    
+    with sync_playwright() as p, ExtractionPipeline("v6", ResultSink(output_dir), journal=journal, valid_codes=valid_codes, blacklist_codes=blacklist_code) as pipeline:
+        browser = replay.launch(p.chromium, headless=False)
         page = browser.new_page()
-        page.goto(BASE_URL, timeout=60000)
-        page.wait_for_load_state("domcontentloaded")
+        with profiling.stage("navigation"):
+            page.goto(BASE_URL, timeout=60000)
+            page.wait_for_load_state("domcontentloaded")
 
-        time.sleep(10)  # wait for 10 seconds to ensure the page is fully loaded after date range input
-        # Click outside to close the date picker
+        if interactive:
+            waits.wait_for_operator("Set the date range in the browser.")
+        waits.wait_for_selector(page, "div.chitiet_baocaophantich_child", name="bvs.listing", max_timeout=60000)
                 
         for page_num in range(start_page, max_pages + 1):
             page.wait_for_load_state("domcontentloaded")
@@ -51,7 +55,7 @@ def scraping_bvs_all(download_dir="downloads", valid_codes=None, max_pages=20, s
                         logging.warning(f"Could not find sec_code for report {idx} on page {page_num}, fallback to sec code tickets.")
                     
                     report_item.query_selector("button").click()
-                    time.sleep(1)  # wait for modal to open
+                    waits.wait_for_selector(page, "div.phantich_modal div.baocaophantich_table_fileinfo_detail", name="bvs.modal_open", max_timeout=10000)
                     modal = page.query_selector("div.phantich_modal")
                     report_date_tag = modal.query_selector("div.baocaophantich_table_fileinfo_detail > div > div")
                     logging.info(report_date_tag)
@@ -76,7 +80,7 @@ def scraping_bvs_all(download_dir="downloads", valid_codes=None, max_pages=20, s
                     # Click outside to close the modal
                     # Click near the top-left of the page (outside the modal)
                     page.mouse.click(10, 10)
-                    time.sleep(1)  # wait for modal to close                    
+                    waits.wait_for_selector(page, "div.phantich_modal", state="hidden", name="bvs.modal_close", max_timeout=10000)
                     
                 # Get pdf link and download
                 local_path = None
@@ -90,50 +94,32 @@ def scraping_bvs_all(download_dir="downloads", valid_codes=None, max_pages=20, s
 
                     logging.info(f"Found PDF link for report {idx} on page {page_num}")
 
-                    # Use Playwright download API
-                    with page.expect_download() as download_info:
-                        pdf_link_tag.click()   # triggers the download
-                    download = download_info.value
-
-                    # Playwright suggests the real filename (from server headers)
-                    filename = download.suggested_filename
-                    local_path = os.path.join(download_dir, filename) + ".pdf"
+                    # pdf_url only identifies the listing page, key the store by the attachment name as well
+                    store_key = f"{pdf_url}#{pdf_link_tag.inner_text().strip()}"
 
-                    logging.info(f"Saving PDF -> {local_path}")
-                    download.save_as(local_path)
+                    if journal.item_done(store_key):
+                        continue
+                    local_path = store.lookup(store_key)
+                    if local_path:
+                        logging.info(f"PDF already downloaded: {store_key} -> {local_path}")
+                    else:
+                        # Use Playwright download API
+                        with page.expect_download() as download_info:
+                            pdf_link_tag.click()   # triggers the download
+                        local_path = store.save_download(store_key, download_info.value, staging_dir=download_dir)
 
                 except Exception as e:
                     logging.error(f"Error downloading PDF for report {idx} on page {page_num}: {e}")
                     continue
             
-                # Extract EPS
-                try:
-                    eps_results = extract_clean_eps_v6(local_path, report_date, valid_codes=valid_codes, blacklist_codes=blacklist_code, firm=firm, url=pdf_url, already_detected_sc=sec_code)
-                    logging.info(f"Extracted {len(eps_results)} EPS entries from {local_path}")
-                    logging.info(f"EPS Results: {eps_results}")
-                    if not eps_results:
-                        logging.info(f"No EPS data extracted from {local_path}")
-                        continue
-                    
-                    result_df = pd.DataFrame(eps_results)
-                    result_df["sc_tag"] = is_sec_code_tagged
-                    result_df["file_name"] = local_path
-                    os.makedirs("output", exist_ok=True)
-                    if not os.path.exists(output_dir):
-                        result_df.to_csv(output_dir, index=False)
-                        logging.info(f"Results saved to {output_dir}")
-                    else:
-                        result_df.to_csv(output_dir, mode="a", header=False, index=False)
-                        logging.info(f"Results appended to {output_dir}")
+                # Queue EPS extraction, workers parse the PDF while the crawler moves on
+                pipeline.submit(ExtractionJob(local_path, report_date, sec_code, firm, pdf_url, {"sc_tag": is_sec_code_tagged, "file_name": local_path}, page=page_num, key=store_key))
 
-                except Exception as e:
-                    logging.error(f"Error processing report {idx} on page {page_num}: {e}")
-                    continue
+            journal.mark_page(page_num)
                 
             page.wait_for_load_state("domcontentloaded")
             next_button = page.query_selector("button.btn.btn-outline-primary.btnNext")
-            next_button.click()
-            page.wait_for_load_state("domcontentloaded")
-            time.sleep(3)  # wait for 3 seconds to ensure the next page is loaded
+            waits.wait_for_change(page, "div.phantich_chitiet_baocaophantich_main", next_button.click, name="bvs.next_page")
 
         browser.close()
+        waits.log_wait_stats()
@@ -0,0 +1,204 @@
+import datetime
+import logging
+import os
+import queue
+import threading
+
+from playwright.sync_api import sync_playwright
+
+from scraping import profiling, replay, waits
+from scraping.dom_extract import extract_table
+from scraping.checkpoint import default_journal_path, get_journal
+from scraping.price_store import DEFAULT_PRICE_STORE, load_price_history
+from scraping.result_writer import PRICE_HISTORY_PARTITIONING, PRICE_HISTORY_SCHEMA, ResultWriter, parse_date
+
+CAFEF_HISTORY_URL = "https://cafef.vn/du-lieu/lich-su-giao-dich-{sec_code}-1.chn"
+HISTORY_START = "01/01/2017"
+HISTORY_END = "31/12/2024"
+# Browsers (one thread each) fetching tickers side by side
+DEFAULT_WORKERS = 4
+
+DATE_INPUT = "input#date-inp-disclosure"
+PRICE_TABLE = "table#owner-contents-table tbody"
+NEXT_PAGE = "i#paging-right"
+# Cells of a history row, in table order
+PRICE_COLUMNS = [column for column in PRICE_HISTORY_SCHEMA if column != "sec_code"]
+# True when the next page button (or its wrapper) is disabled or hidden, i.e. on the last page
+_NEXT_DISABLED_SCRIPT = """el => el.offsetParent === null || [el, el.parentElement].some(e => e && (
+    e.disabled || e.getAttribute("aria-disabled") === "true" || /disable/i.test(e.className)
+    || getComputedStyle(e).pointerEvents === "none" || getComputedStyle(e).visibility === "hidden"))"""
+
+
+class IncompleteHistoryError(RuntimeError):
+    """The price table stopped paging before its last page, the rows read so far are partial."""
+
+
+def _history_key(sec_code, start, end):
+    return f"{sec_code}:{start}-{end}"
+
+
+def _last_page(next_button, page_rows, full_page):
+    """Whether the table shows its last page: no next button, a disabled one, or a short page."""
+    if next_button is None or next_button.evaluate(_NEXT_DISABLED_SCRIPT):
+        return True
+    return full_page is not None and len(page_rows) < full_page
+
+
+def fetch_price_history(page, sec_code, start=HISTORY_START, end=HISTORY_END, max_pages=500, since=None):
+    """
+    Daily price rows of `sec_code` between `start` and `end` (dd/mm/yyyy), newest first.
+    The date range is applied once, then the table is paged through up to its last page.
+    With `since` (a date), rows on or before it are dropped and paging stops at the first
+    page reaching it. Raises IncompleteHistoryError when a page does not load in time (or
+    `max_pages` is exceeded) instead of returning a history cut short.
+    """
+    sec_code = sec_code.lower()
+    with profiling.stage("navigation"):
+        page.goto(CAFEF_HISTORY_URL.format(sec_code=sec_code))
+        page.wait_for_load_state("domcontentloaded")
+    waits.wait_for_selector(page, DATE_INPUT, name="cafef.page_ready")
+    page.fill(DATE_INPUT, f"{start} - {end}")
+    page.mouse.click(10, 10)
+    waits.wait_for_selector(page, "div.daterangepicker", state="hidden", name="cafef.datepicker_close", max_timeout=5000)
+    waits.wait_for_change(page, PRICE_TABLE, lambda: page.click("div#owner-find"), name="cafef.price_table", max_timeout=10000)
+
+    rows = []
+    full_page = None
+    for page_num in range(1, max_pages + 1):
+        cells = extract_table(page, PRICE_TABLE)
+        # A "no data" table has a single merged cell
+        page_rows = [
+            {"sec_code": sec_code, **dict(zip(PRICE_COLUMNS, row))}
+            for row in cells if len(row) >= len(PRICE_COLUMNS)
+        ]
+        full_page = full_page or len(page_rows)
+        reached_since = False
+        if since is not None:
+            newer = [row for row in page_rows if (parse_date(row["date"]) or since) > since]
+            reached_since = len(newer) < len(page_rows)
+            rows.extend(newer)
+        else:
+            rows.extend(page_rows)
+        logging.info(f"{sec_code}: {len(page_rows)} price rows on page {page_num}")
+        next_button = page.query_selector(NEXT_PAGE)
+        if not page_rows or reached_since or _last_page(next_button, page_rows, full_page):
+            return rows
+        if not waits.wait_for_change(page, PRICE_TABLE, next_button.click, name="cafef.next_page", max_timeout=10000):
+            raise IncompleteHistoryError(f"{sec_code}: page {page_num + 1} of the price history did not load, {len(rows)} rows read")
+    raise IncompleteHistoryError(f"{sec_code}: price history has more than {max_pages} pages, {len(rows)} rows read")
+
+
+def _run_tickers(fetch, sec_codes, workers=DEFAULT_WORKERS, headless=True):
+    """
+    Call `fetch(page, sec_code)` for every ticker, spread over `workers` threads. The sync
+    API is bound to the thread that started it, so every worker runs its own browser, and
+    each ticker gets a fresh context that is closed once fetched: at most `workers` contexts
+    are open at a time.
+    """
+    todo = queue.Queue()
+    for sec_code in sec_codes:
+        todo.put(sec_code)
+
+    def work():
+        with sync_playwright() as p:
+            browser = replay.launch(p.chromium, headless=headless)
+            try:
+                while True:
+                    try:
+                        sec_code = todo.get_nowait()
+                    except queue.Empty:
+                        return
+                    context = browser.new_context()
+                    try:
+                        fetch(context.new_page(), sec_code)
+                    except Exception as e:
+                        logging.error(f"Error fetching the price history of {sec_code}: {e}")
+                    finally:
+                        context.close()
+            finally:
+                browser.close()
+
+    threads = [threading.Thread(target=work, name=f"cafef-{n}") for n in range(max(1, min(workers, todo.qsize())))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    waits.log_wait_stats()
+
+
+def bulk_fetch(sec_codes, store_path=DEFAULT_PRICE_STORE, start=HISTORY_START, end=HISTORY_END, headless=True, journal_path=None, workers=DEFAULT_WORKERS):
+    """
+    Fetch the full `start`..`end` history of every ticker in `sec_codes` into the price store,
+    one cafef visit per ticker. Tickers already fetched for that range (per the journal next
+    to the store) are skipped, so later calls only visit new tickers.
+    """
+    journal = get_journal(journal_path or default_journal_path(store_path))
+    todo = [
+        sec_code for sec_code in dict.fromkeys(str(code).lower() for code in sec_codes)
+        if not journal.item_done(_history_key(sec_code, start, end))
+    ]
+    if not todo:
+        logging.info(f"Price history of every ticker is already in {store_path}")
+        return
+    logging.info(f"Fetching the price history of {len(todo)} tickers into {store_path}")
+
+    with ResultWriter(store_path, PRICE_HISTORY_SCHEMA, partition_by=PRICE_HISTORY_PARTITIONING) as writer:
+        def fetch(page, sec_code):
+            key = _history_key(sec_code, start, end)
+            try:
+                rows = fetch_price_history(page, sec_code, start, end)
+            except Exception as e:
+                journal.mark_item(key, "failed", detail=str(e))
+                raise
+            outcome = "done" if rows else "empty"
+            # One part per ticker, journaled once its rows are on disk
+            writer.write(rows, on_flushed=lambda: journal.mark_item(key, outcome, detail=str(len(rows))))
+            writer.flush()
+
+        _run_tickers(fetch, todo, workers, headless)
+
+
+def last_stored_dates(store_path=DEFAULT_PRICE_STORE, sec_codes=None):
+    """{sec_code: datetime.date of its newest stored row}; tickers not in the store are left out."""
+    if not os.path.exists(store_path):
+        return {}
+    history = load_price_history(store_path, sec_codes, columns=("sec_code", "date"))
+    return {sec_code: date.date() for sec_code, date in history.groupby("sec_code")["date"].max().items()}
+
+
+def update_price_history(sec_codes, store_path=DEFAULT_PRICE_STORE, end=None, headless=True, workers=DEFAULT_WORKERS):
+    """
+    Append to the price store the rows of every ticker newer than its last stored date, up
+    to `end` (dd/mm/yyyy, today by default). Tickers not in the store yet are fetched from
+    HISTORY_START. Only the pages holding new rows are visited and nothing already stored is
+    written again, so reruns need no de-duplication. A ticker whose fetch stops short of its
+    last stored date writes nothing and keeps that date, the next run fetches the whole gap.
+    """
+    end_date = parse_date(end) if end else datetime.date.today()
+    sec_codes = list(dict.fromkeys(str(code).lower() for code in sec_codes))
+    last_dates = last_stored_dates(store_path, sec_codes)
+    todo = [sec_code for sec_code in sec_codes if last_dates.get(sec_code, datetime.date.min) < end_date]
+    if not todo:
+        logging.info(f"Price history of every ticker in {store_path} is up to {end_date:%d/%m/%Y}")
+        return
+    logging.info(f"Updating the price history of {len(todo)} tickers in {store_path} up to {end_date:%d/%m/%Y}")
+
+    failed = []
+    with ResultWriter(store_path, PRICE_HISTORY_SCHEMA, partition_by=PRICE_HISTORY_PARTITIONING) as writer:
+        def fetch(page, sec_code):
+            since = last_dates.get(sec_code)
+            start = (since + datetime.timedelta(days=1)).strftime("%d/%m/%Y") if since else HISTORY_START
+            try:
+                rows = fetch_price_history(page, sec_code, start, end_date.strftime("%d/%m/%Y"), since=since)
+            except Exception:
+                # Appending a partial range would leave a gap the next run never fills
+                failed.append(sec_code)
+                raise
+            logging.info(f"{sec_code}: {len(rows)} new price rows since {since or start}")
+            if rows:
+                writer.write(rows)
+                writer.flush()
+
+        _run_tickers(fetch, todo, workers, headless)
+    if failed:
+        logging.warning(f"Price history of {len(failed)} tickers was not updated, rerun to retry them: {sorted(failed)}")
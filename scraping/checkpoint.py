@@ -0,0 +1,125 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from scraping import replay
+
+# Outcomes that end the work on an item, anything else is retried by the next run
+FINAL_OUTCOMES = {"done", "extracted", "empty"}
+
+
+def default_journal_path(output_dir):
+    """Journal kept next to a scraper's output, e.g. output/eps_rep_acbs.journal.sqlite."""
+    return f"{os.path.splitext(output_dir)[0]}.journal.sqlite"
+
+
+class CrawlJournal:
+    """
+    Checkpoint journal of one crawl, so a restarted run skips the work already done.
+
+    Two SQLite tables record what was processed:
+    - items: one row per report (keyed by its url) or per scripted lookup (e.g. "vnm:31/12/2023"),
+      with the listing page it came from and its latest outcome ("queued", "extracted", "empty",
+      "failed", "timed_out", ...). Items in FINAL_OUTCOMES are skipped, the others retried.
+    - pages: listing pages whose reports were all handed on, per shard. A page counts as
+      done only while none of its items is still queued or failed.
+
+    Delete the file to crawl from scratch.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS pages ("
+            " page INTEGER PRIMARY KEY,"
+            " shard TEXT,"
+            " outcome TEXT NOT NULL,"
+            " updated_at REAL)"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS items ("
+            " key TEXT PRIMARY KEY,"
+            " page INTEGER,"
+            " outcome TEXT NOT NULL,"
+            " detail TEXT,"
+            " updated_at REAL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS items_page ON items (page)")
+        self._db.commit()
+
+    def mark_page(self, page_num, outcome="done", shard=None):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO pages (page, shard, outcome, updated_at) VALUES (?, ?, ?, ?)",
+                (page_num, shard, outcome, time.time())
+            )
+            self._db.commit()
+
+    def done_pages(self):
+        """Listing pages that were crawled and have no item left to retry (none while recording)."""
+        if replay.recording():
+            return set()
+        placeholders = ", ".join("?" * len(FINAL_OUTCOMES))
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT page FROM pages WHERE outcome = 'done' AND page NOT IN ("
+                f" SELECT page FROM items WHERE page IS NOT NULL AND outcome NOT IN ({placeholders}))",
+                tuple(FINAL_OUTCOMES)
+            ).fetchall()
+        return {row[0] for row in rows}
+
+    def mark_item(self, key, outcome, page=None, detail=None):
+        """Record the outcome of `key`. `page` is kept from an earlier record when not given."""
+        if not key:
+            return
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO items (key, page, outcome, detail, updated_at) VALUES (?, ?, ?, ?, ?)"
+                " ON CONFLICT(key) DO UPDATE SET page = COALESCE(excluded.page, items.page),"
+                " outcome = excluded.outcome, detail = excluded.detail, updated_at = excluded.updated_at",
+                (key, page, outcome, detail, time.time())
+            )
+            self._db.commit()
+
+    def item_outcome(self, key):
+        if not key:
+            return None
+        with self._lock:
+            row = self._db.execute("SELECT outcome FROM items WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def item_done(self, key):
+        """True when `key` reached a final outcome in this or an earlier run (never while recording)."""
+        if replay.recording():
+            return False
+        outcome = self.item_outcome(key)
+        if outcome in FINAL_OUTCOMES:
+            logging.info(f"Already processed ({outcome}), skipping: {key}")
+            return True
+        return False
+
+    def summary(self):
+        """Item count per outcome."""
+        with self._lock:
+            return dict(self._db.execute("SELECT outcome, COUNT(*) FROM items GROUP BY outcome").fetchall())
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+_journals = {}
+
+
+def get_journal(path):
+    """Journal instance for `path`, shared within the process."""
+    path = os.path.abspath(path)
+    if path not in _journals:
+        _journals[path] = CrawlJournal(path)
+    return _journals[path]
@@ -0,0 +1,96 @@
+import argparse
+import logging
+import os
+
+import pandas as pd
+
+from scraping.result_writer import (
+    EPS_PARTITIONING, EPS_SCHEMA, NULL_PARTITION, PRICE_HISTORY_PARTITIONING, PRICE_HISTORY_SCHEMA, ResultWriter
+)
+
+# Datasets `convert` knows how to type and partition
+LAYOUTS = {
+    "eps": (EPS_SCHEMA, EPS_PARTITIONING),
+    "price": (PRICE_HISTORY_SCHEMA, PRICE_HISTORY_PARTITIONING),
+}
+
+_OPERATORS = {
+    "=": lambda column, value: column == value,
+    "==": lambda column, value: column == value,
+    "!=": lambda column, value: column != value,
+    "<": lambda column, value: column < value,
+    "<=": lambda column, value: column <= value,
+    ">": lambda column, value: column > value,
+    ">=": lambda column, value: column >= value,
+    "in": lambda column, value: column.isin(value),
+    "not in": lambda column, value: ~column.isin(value),
+}
+
+
+def dataset_path(stem):
+    """`stem`.parquet when that dataset exists, else `stem`.csv, e.g. dataset_path("output/eps_rep_acbs")."""
+    parquet_path = f"{stem}.parquet"
+    return parquet_path if os.path.isdir(parquet_path) else f"{stem}.csv"
+
+
+def read_dataset(path, columns=None, filters=None):
+    """
+    Load a dataset written by ResultWriter into a DataFrame.
+
+    `filters` is a list of (column, op, value) tuples that must all hold, with op one of
+    =, ==, !=, <, <=, >, >=, in, not in. For a Parquet dataset they are pushed down to
+    pyarrow, so whole partitions (e.g. firm=..., report_year=..., sec_code=...) and row
+    groups are skipped, and only `columns` are decoded. CSV files are read in full and
+    filtered afterwards.
+    """
+    if os.path.isdir(path):
+        try:
+            import pyarrow.dataset as ds
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise ImportError(f"Reading {path} needs pyarrow (pip install pyarrow)") from e
+        # Plain (not dictionary) partition columns, so a null partition reads back as None
+        partitioning = ds.HivePartitioning.discover(infer_dictionary=False, null_fallback=NULL_PARTITION)
+        table = pq.read_table(path, columns=columns, filters=filters or None, partitioning=partitioning)
+        return table.to_pandas()
+
+    # Filter columns must be loaded even when not requested
+    needed = None
+    if columns is not None:
+        needed = list(dict.fromkeys([*columns, *(column for column, _, _ in filters or [])]))
+    df = pd.read_csv(path, usecols=needed)
+    for column, op, value in filters or []:
+        if op not in _OPERATORS:
+            raise ValueError(f"Unknown filter operator '{op}', expected one of {sorted(_OPERATORS)}")
+        df = df[_OPERATORS[op](df[column], value)]
+    return df[columns] if columns is not None else df
+
+
+def convert(csv_path, parquet_path, layout, chunksize=100000):
+    """Rewrite a CSV dataset as a typed, partitioned Parquet dataset with the schema of `layout`."""
+    if not parquet_path.endswith(".parquet"):
+        raise ValueError(f"Parquet datasets are directories named *.parquet, got {parquet_path}")
+    schema, partitioning = LAYOUTS[layout]
+    rows = 0
+    with ResultWriter(parquet_path, schema, flush_rows=chunksize, partition_by=partitioning) as writer:
+        for chunk in pd.read_csv(csv_path, chunksize=chunksize, dtype=str, keep_default_na=False):
+            records = chunk.to_dict("records")
+            writer.write(records)
+            rows += len(records)
+    logging.info(f"Converted {rows} rows from {csv_path} to {parquet_path}")
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert scraped CSV output to partitioned Parquet")
+    parser.add_argument("csv_path")
+    parser.add_argument("parquet_path")
+    parser.add_argument("--layout", choices=sorted(LAYOUTS), default="eps")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    convert(args.csv_path, args.parquet_path, args.layout)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+from collections import namedtuple
+
+from scraping import profiling
+
+# Declarative DOM extraction: every field of every listing item (or every cell of a table)
+# is read in ONE evaluate call, instead of a query_selector + text_content round trip to the
+# browser per field and item.
+#
+# A field is a Field, or a shorthand:
+#   "h3.title"                -> Field("h3.title"): trimmed textContent of the first match
+#   ("a.download", "href")    -> Field("a.download", "href"): an attribute of the first match
+# Field.selector is looked up inside the item; None reads the item itself, and a tuple of
+# selectors is followed step by step (first match of each step), like chained
+# query_selector calls. Field.nth picks the match (-1 for the last one, as in
+# query_selector_all(...)[-1]) and Field.all returns every match as a list.
+# Field.attribute is "text" (textContent), "inner_text" (rendered innerText), "html"
+# (innerHTML) or an attribute name. A missing element or attribute reads as None.
+# extract_items_html applies the same spec to fetched HTML (see scraping.http_transport).
+
+Field = namedtuple("Field", ["selector", "attribute", "nth", "all"], defaults=("text", 0, False))
+
+_ITEMS_SCRIPT = """(items, fields) => items.map(item => {
+    const read = (el, attribute) => {
+        if (attribute === "text") return el.textContent.trim();
+        if (attribute === "inner_text") return el.innerText.trim();
+        if (attribute === "html") return el.innerHTML;
+        return el.getAttribute(attribute);
+    };
+    const result = {};
+    for (const [name, field] of fields) {
+        let scope = item;
+        const steps = field.selector === null ? [] : [].concat(field.selector);
+        for (const step of steps.slice(0, -1)) {
+            scope = scope && scope.querySelector(step);
+        }
+        let matches = [];
+        if (scope) {
+            matches = steps.length ? Array.from(scope.querySelectorAll(steps[steps.length - 1])) : [scope];
+        }
+        if (field.all) {
+            result[name] = matches.map(el => read(el, field.attribute));
+        } else {
+            const el = matches[field.nth < 0 ? matches.length + field.nth : field.nth];
+            result[name] = el ? read(el, field.attribute) : null;
+        }
+    }
+    return result;
+})"""
+
+_TABLE_SCRIPT = """(rows, attribute) => rows.map(tr => Array.from(tr.querySelectorAll("td")).map(
+    td => attribute === "inner_text" ? td.innerText.trim() : td.textContent.trim()))"""
+
+
+def as_field(spec):
+    """Field for a Field, a selector string or a (selector, attribute) tuple."""
+    if isinstance(spec, Field):
+        return spec
+    if spec is None or isinstance(spec, str):
+        return Field(spec)
+    if isinstance(spec, tuple) and len(spec) == 2:
+        return Field(*spec)
+    raise ValueError(f"Unsupported field spec {spec!r}")
+
+
+def extract_items(root, item_selector, fields):
+    """
+    One dict per element matching `item_selector` under `root` (a page or element handle),
+    with the value of every field of `fields` ({name: spec}, see above), in one round trip.
+    """
+    specs = [[name, as_field(spec)._asdict()] for name, spec in fields.items()]
+    with profiling.stage("dom_extract"):
+        items = root.eval_on_selector_all(item_selector, _ITEMS_SCRIPT, specs)
+    profiling.count("dom_extract.items", len(items))
+    return items
+
+
+def _read_html(el, attribute):
+    if attribute in ("text", "inner_text"):
+        return el.get_text().strip()
+    if attribute == "html":
+        return el.decode_contents()
+    value = el.get(attribute)
+    # Multi-valued attributes (class, rel) come back as lists
+    return " ".join(value) if isinstance(value, list) else value
+
+
+def extract_items_html(html, item_selector, fields):
+    """extract_items over an HTML document instead of a live page, parsed with BeautifulSoup."""
+    try:
+        from bs4 import BeautifulSoup
+    except ImportError as e:
+        raise ImportError("Parsing HTML listings needs beautifulsoup4 (pip install beautifulsoup4 lxml)") from e
+    try:
+        soup = BeautifulSoup(html, "lxml")
+    except Exception:
+        # lxml is faster, the stdlib parser is the fallback
+        soup = BeautifulSoup(html, "html.parser")
+
+    specs = [(name, as_field(spec)) for name, spec in fields.items()]
+    items = []
+    with profiling.stage("dom_extract"):
+        for item in soup.select(item_selector):
+            result = {}
+            for name, field in specs:
+                steps = [] if field.selector is None else [field.selector] if isinstance(field.selector, str) else list(field.selector)
+                scope = item
+                for step in steps[:-1]:
+                    scope = scope.select_one(step) if scope is not None else None
+                matches = [] if scope is None else scope.select(steps[-1]) if steps else [scope]
+                if field.all:
+                    result[name] = [_read_html(el, field.attribute) for el in matches]
+                else:
+                    index = len(matches) + field.nth if field.nth < 0 else field.nth
+                    result[name] = _read_html(matches[index], field.attribute) if 0 <= index < len(matches) else None
+            items.append(result)
+    profiling.count("dom_extract.items", len(items))
+    return items
+
+
+def extract_table(root, table_selector, attribute="inner_text"):
+    """Cell texts of every row of the table(s) matching `table_selector` under `root`, in one round trip."""
+    with profiling.stage("dom_extract"):
+        rows = root.eval_on_selector_all(f"{table_selector} tr", _TABLE_SCRIPT, attribute)
+    profiling.count("dom_extract.items", len(rows))
+    return rows
@@ -0,0 +1,181 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+from scraping import profiling, replay
+
+# Shared by every broker scraper, so a report linked from two places is stored once
+DEFAULT_STORE_DIR = "downloads/store"
+# A PDF header may follow some junk, but within the first KiB
+PDF_MAGIC = b"%PDF"
+PDF_HEADER_WINDOW = 1024
+
+
+class NotPdfError(Exception):
+    """A download that should be a report is something else, e.g. an HTML interstitial."""
+
+
+def check_pdf(path, url=None):
+    """Raise NotPdfError unless the file at `path` starts with a PDF header."""
+    with open(path, "rb") as f:
+        head = f.read(PDF_HEADER_WINDOW)
+    if PDF_MAGIC not in head:
+        raise NotPdfError(f"{url or path} is not a PDF (starts with {head[:32]!r})")
+
+
+class DownloadStore:
+    """
+    Content-addressed store for downloaded reports.
+
+    Files live under `root/<sha[:2]>/<sha>.pdf` and a SQLite index maps each source key
+    (normally the PDF url) to the content hash, together with the ETag / Last-Modified
+    headers of the response. Scrapers call `lookup` (or go through the Downloader) before fetching, so
+    a rerun or a resumed crawl only pays for the listing pages.
+    """
+
+    def __init__(self, root=DEFAULT_STORE_DIR):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(root, "index.sqlite"), timeout=30, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS downloads ("
+            " url TEXT PRIMARY KEY,"
+            " sha256 TEXT NOT NULL,"
+            " size INTEGER,"
+            " etag TEXT,"
+            " last_modified TEXT,"
+            " fetched_at REAL)"
+        )
+        # Report detail page -> PDF url, so a rerun can skip the detail page as well
+        self._db.execute("CREATE TABLE IF NOT EXISTS aliases (key TEXT PRIMARY KEY, url TEXT NOT NULL)")
+        self._db.commit()
+
+    def path_for(self, sha256):
+        """Location of a blob in the store (the .pdf suffix is required by camelot)."""
+        return os.path.join(self.root, sha256[:2], f"{sha256}.pdf")
+
+    def _row(self, url):
+        with self._lock:
+            return self._db.execute(
+                "SELECT sha256, etag, last_modified FROM downloads WHERE url = ?", (url,)
+            ).fetchone()
+
+    def lookup(self, url):
+        """
+        Return the stored file for `url`, or None when it was never downloaded (or the blob is
+        gone). Always None while recording a replay archive, so the report is fetched again.
+        """
+        if not url or replay.recording():
+            return None
+        row = self._row(url)
+        if row is None:
+            return None
+        path = self.path_for(row[0])
+        return path if os.path.exists(path) else None
+
+    def alias(self, key, url):
+        """Remember that `key` (e.g. the report page) leads to the PDF at `url`."""
+        if not key or not url:
+            return
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO aliases (key, url) VALUES (?, ?)", (key, url))
+            self._db.commit()
+
+    def resolve(self, key):
+        """PDF url recorded for `key` with `alias`, or None (always None while recording)."""
+        if not key or replay.recording():
+            return None
+        with self._lock:
+            row = self._db.execute("SELECT url FROM aliases WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def validators(self, url):
+        """(etag, last_modified) recorded for `url`, for conditional requests."""
+        row = self._row(url)
+        return (row[1], row[2]) if row else (None, None)
+
+    def _record(self, url, sha256, size, etag=None, last_modified=None):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO downloads (url, sha256, size, etag, last_modified, fetched_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (url, sha256, size, etag, last_modified, time.time())
+            )
+            self._db.commit()
+
+    def put_file(self, url, src_path, etag=None, last_modified=None, sha256=None):
+        """
+        Move a downloaded file into the store and index it under `url`. Returns the stored path.
+        Pass `sha256` when the content was already hashed while streaming it to disk.
+        """
+        if sha256 is None:
+            digest = hashlib.sha256()
+            with open(src_path, "rb") as f:
+                for chunk in iter(lambda: f.read(1 << 20), b""):
+                    digest.update(chunk)
+            sha256 = digest.hexdigest()
+        size = os.path.getsize(src_path)
+
+        path = self.path_for(sha256)
+        if os.path.exists(path):
+            os.remove(src_path)
+            logging.info(f"Already stored as {path}, dropped duplicate {src_path}")
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(src_path, path)
+        self._record(url, sha256, size, etag, last_modified)
+        return path
+
+    def put_bytes(self, url, content, etag=None, last_modified=None):
+        """Write `content` into the store and index it under `url`. Returns the stored path."""
+        sha256 = hashlib.sha256(content).hexdigest()
+        path = self.path_for(sha256)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write next to the target and rename, so an interrupted run never leaves a truncated blob
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".part")
+            with os.fdopen(fd, "wb") as f:
+                f.write(content)
+            os.replace(tmp_path, path)
+        self._record(url, sha256, len(content), etag, last_modified)
+        return path
+
+    def staging_path(self, filename, staging_dir=None):
+        """Temporary location for downloads that must be saved to disk before hashing (Playwright)."""
+        staging_dir = staging_dir or os.path.join(self.root, "staging")
+        os.makedirs(staging_dir, exist_ok=True)
+        return os.path.join(staging_dir, f"{os.getpid()}_{threading.get_ident()}_{os.path.basename(filename)}")
+
+    def save_download(self, url, download, staging_dir=None):
+        """Save a Playwright `Download` into the store under `url`. Returns the stored path."""
+        staged_path = self.staging_path(download.suggested_filename, staging_dir)
+        logging.info(f"Saving PDF -> {staged_path}")
+        with profiling.stage("download"):
+            download.save_as(staged_path)
+        try:
+            check_pdf(staged_path, url)
+        except NotPdfError:
+            os.remove(staged_path)
+            raise
+        local_path = self.put_file(url, staged_path)
+        logging.info(f"Stored PDF {url} -> {local_path}")
+        return local_path
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+_stores = {}
+
+
+def get_store(root=DEFAULT_STORE_DIR):
+    """Store instance for `root`, shared within the process."""
+    root = os.path.abspath(root)
+    if root not in _stores:
+        _stores[root] = DownloadStore(root)
+    return _stores[root]
@@ -0,0 +1,210 @@
+import asyncio
+import atexit
+import hashlib
+import logging
+import os
+import random
+import tempfile
+import threading
+from concurrent.futures import Future
+from urllib.parse import urlsplit
+
+import aiohttp
+
+from scraping import profiling, replay
+from scraping.download_store import DEFAULT_STORE_DIR, check_pdf, get_store
+
+# Concurrent downloads allowed per host, override per broker with `host_limits`
+DEFAULT_PER_HOST = 4
+# Upper bound on open connections across all hosts
+DEFAULT_TOTAL = 32
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+CHUNK_SIZE = 1 << 16
+
+
+class DownloadError(Exception):
+    pass
+
+
+class Downloader:
+    """
+    Shared HTTP download service for report PDFs.
+
+    An aiohttp session runs on a background event loop, so the (synchronous) crawlers can
+    queue downloads with `submit` and carry on. Connections are pooled per host, each host
+    gets at most `per_host` concurrent requests (or its entry in `host_limits`), responses
+    are streamed to disk and moved into the DownloadStore, failed requests are retried with
+    jittered exponential backoff, and URLs already in the store are revalidated with a
+    conditional GET (ETag / Last-Modified) when `refresh=True`. A response that is not a
+    PDF fails with NotPdfError and is never stored.
+    """
+
+    def __init__(self, store=None, per_host=DEFAULT_PER_HOST, host_limits=None, total=DEFAULT_TOTAL, retries=4, backoff=1.0, timeout=120, headers=None):
+        self.store = store or get_store()
+        self.per_host = per_host
+        self.host_limits = host_limits or {}
+        self.total = total
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.headers = headers or {"User-Agent": "Mozilla/5.0"}
+
+        self._host_slots = {}
+        self._inflight = {}
+        self._inflight_lock = threading.Lock()
+        self._session = None
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="downloader", daemon=True)
+        self._thread.start()
+        asyncio.run_coroutine_threadsafe(self._open(), self._loop).result()
+
+    async def _open(self):
+        self._session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self.total, limit_per_host=max([self.per_host, *self.host_limits.values()])),
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+            headers=self.headers,
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    def _slots_for(self, host):
+        if host not in self._host_slots:
+            self._host_slots[host] = asyncio.Semaphore(self.host_limits.get(host, self.per_host))
+        return self._host_slots[host]
+
+    def submit(self, url, cookies=None, refresh=False):
+        """
+        Queue a download and return a Future resolving to the stored file path.
+        URLs already in the store resolve immediately unless `refresh` is set;
+        concurrent requests for the same URL share one download.
+        """
+        if not refresh:
+            local_path = self.store.lookup(url)
+            if local_path:
+                logging.info(f"PDF already downloaded: {url} -> {local_path}")
+                future = Future()
+                future.set_result(local_path)
+                return future
+
+        with self._inflight_lock:
+            future = self._inflight.get(url)
+            if future is None:
+                future = asyncio.run_coroutine_threadsafe(self._download(url, cookies), self._loop)
+                self._inflight[url] = future
+                future.add_done_callback(lambda _: self._forget(url))
+        return future
+
+    def _forget(self, url):
+        with self._inflight_lock:
+            self._inflight.pop(url, None)
+
+    def fetch(self, url, cookies=None, refresh=False):
+        """Blocking download, returns the stored file path."""
+        return self.submit(url, cookies=cookies, refresh=refresh).result()
+
+    async def _download(self, url, cookies=None):
+        host = urlsplit(url).hostname or ""
+        async with self._slots_for(host):
+            for attempt in range(self.retries + 1):
+                try:
+                    # Timed once a host slot is free, so the stage is transfer time and not queueing
+                    with profiling.stage("download"):
+                        return await self._get(url, cookies)
+                except aiohttp.ClientResponseError as e:
+                    if e.status not in RETRY_STATUSES:
+                        raise DownloadError(f"{url} answered HTTP {e.status}") from e
+                    error = e
+                except (aiohttp.ClientError, asyncio.TimeoutError, DownloadError) as e:
+                    error = e
+                if attempt == self.retries:
+                    raise DownloadError(f"Giving up on {url} after {attempt + 1} attempts: {error}") from error
+                delay = self.backoff * (2 ** attempt) * random.uniform(0.5, 1.5)
+                logging.warning(f"Download of {url} failed ({error}), retrying in {delay:.1f}s")
+                profiling.count("download.retries")
+                await asyncio.sleep(delay)
+
+    async def _get(self, url, cookies=None):
+        headers = {}
+        existing = self.store.lookup(url)
+        if existing:
+            etag, last_modified = self.store.validators(url)
+            if etag:
+                headers["If-None-Match"] = etag
+            if last_modified:
+                headers["If-Modified-Since"] = last_modified
+
+        async with self._session.get(replay.request_url(url), headers=headers, cookies=cookies) as response:
+            if response.status == 304 and existing:
+                logging.info(f"PDF not modified: {url} -> {existing}")
+                profiling.count("download.not_modified")
+                return existing
+            if response.status in RETRY_STATUSES:
+                raise DownloadError(f"HTTP {response.status}")
+            response.raise_for_status()
+
+            logging.info(f"Downloading PDF {url}")
+            staging_dir = os.path.join(self.store.root, "staging")
+            os.makedirs(staging_dir, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=staging_dir, suffix=".part")
+            digest = hashlib.sha256()
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+                        digest.update(chunk)
+                        f.write(chunk)
+            except BaseException:
+                os.remove(tmp_path)
+                raise
+
+            profiling.count("download.bytes", os.path.getsize(tmp_path))
+            try:
+                # Not retried: an error or login page served with 200 stays one
+                check_pdf(tmp_path, url)
+            except Exception:
+                os.remove(tmp_path)
+                raise
+            replay.record(url, response.status, response.headers, path=tmp_path)
+            local_path = self.store.put_file(
+                url, tmp_path,
+                etag=response.headers.get("ETag"),
+                last_modified=response.headers.get("Last-Modified"),
+                sha256=digest.hexdigest()
+            )
+        logging.info(f"Downloaded PDF {url} -> {local_path}")
+        return local_path
+
+    def close(self):
+        """Wait for queued downloads, then close the session and stop the loop."""
+        if self._session is None:
+            return
+        with self._inflight_lock:
+            pending = list(self._inflight.values())
+        for future in pending:
+            try:
+                future.result()
+            except Exception:
+                pass  # reported to whoever submitted it
+        asyncio.run_coroutine_threadsafe(self._session.close(), self._loop).result()
+        self._session = None
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+
+_downloaders = {}
+
+
+def get_downloader(store_dir=DEFAULT_STORE_DIR):
+    """Downloader writing into the store at `store_dir`, shared within the process and closed at exit."""
+    store = get_store(store_dir)
+    if store.root not in _downloaders:
+        downloader = Downloader(store)
+        atexit.register(downloader.close)
+        _downloaders[store.root] = downloader
+    return _downloaders[store.root]
@@ -1,10 +1,98 @@
 import logging
 import re
-import pdfplumber
-import camelot
 
+import numpy as np
+import pandas as pd
+
+from scraping import profiling
+from scraping.patterns import (
+    EPS_LABEL_PATTERN, EPS_LINE_PATTERN, EPS_PAGE_PATTERN, EPS_WORD_PATTERN, FLAT_EPS_VALUES_PATTERN,
+    FLAT_YEAR_PATTERN, LABEL_WORD_PATTERN, NUMBER_PATTERN, SEC_CODE_BLACKLIST, TEXT_YEAR_LABEL_PATTERN, TICKER_PATTERN,
+    TICKER_WITH_DIGIT_PATTERN, WHITESPACE_PATTERN, YEAR_HEADER_CELL_PATTERN, YEAR_LABEL_PATTERN,
+    YEAR_OR_DATE_CELL_PATTERN
+)
+from scraping.pdf_document import load_pdf, parse_page_spec
 from scraping.utils.Utils import parse_vietnamese_date, clean_number, verify_four_digit_year, normalize_year
 
+
+def _match_mask(values, pattern):
+    """Boolean array shaped like the 2-D str array `values`, True where `pattern` is found in the cell."""
+    matches = pd.Series(values.ravel(), dtype=object).str.contains(pattern)
+    return matches.to_numpy(dtype=bool).reshape(values.shape)
+
+
+def _eps_table_rows(df, eps_pattern, year_pattern):
+    """
+    Header and EPS rows of a camelot table, or None when no cell matches `eps_pattern`.
+
+    Columns with a cell matching `eps_pattern` or `year_pattern` are kept from the first EPS
+    column on, then the rows with such a cell; the first kept row is the header. Returns
+    (header, [(idx, row), ...]) for the rows below the header that mention EPS, idx counting
+    from 0 under the header. All matching is done on the whole table at once.
+    """
+    values = df.astype(str).to_numpy(dtype=object)
+    if values.size == 0:
+        return None
+    eps_mask = _match_mask(values, eps_pattern)
+    label_mask = eps_mask | _match_mask(values, year_pattern)
+
+    eps_cols = np.flatnonzero(eps_mask.any(axis=0))
+    if eps_cols.size == 0:
+        return None
+    cols = np.flatnonzero(label_mask.any(axis=0))
+    cols = cols[cols >= eps_cols[0]]
+    rows = np.flatnonzero(label_mask[:, cols].any(axis=1))
+    logging.info(f"After EPS filtering, table has columns: {df.columns[cols].tolist()}")
+
+    table = values[np.ix_(rows, cols)]
+    header, body = table[0].tolist(), table[1:]
+    eps_rows = np.flatnonzero(_match_mask(body, EPS_WORD_PATTERN).any(axis=1))
+    logging.info(f"Filtered table: header {header}, {len(body)} rows, EPS rows {eps_rows.tolist()}")
+    return header, [(int(idx), body[idx].tolist()) for idx in eps_rows]
+
+
+def detect_sec_code(doc, valid_codes=None, blacklist_codes=None, pages_to_check=3, with_digit_codes=True):
+    """
+    Detect the most frequent ticker in the first pages of a parsed PDF.
+    Returns the sec_code, or None if no valid ticker is found.
+    """
+    text = doc.leading_text(pages_to_check)
+
+    # Only match exactly 3 uppercase letters, or with 2 uppercase letters with 1 number, standalone
+    matches = TICKER_PATTERN.findall(text)
+    if with_digit_codes:
+        matches += TICKER_WITH_DIGIT_PATTERN.findall(text)
+
+    blacklist = blacklist_codes or SEC_CODE_BLACKLIST
+    tickers = [m for m in matches if m not in blacklist]
+
+    # Cross-check with valid_codes list if provided
+    if valid_codes:
+        tickers = [m for m in tickers if m in valid_codes]
+
+    if tickers:
+        sec_code = max(set(tickers), key=tickers.count)  # most frequent
+        logging.info(f"Detected sec_code '{sec_code}' in {doc.pdf_path}")
+        return sec_code
+    logging.warning(f"No valid sec_code found in {doc.pdf_path}")
+    return None
+
+def find_eps_pages(doc, pdf_pages="1-end"):
+    """
+    Return a camelot page spec restricted to the pages whose text layer matches EPS and a year header.
+    Falls back to `pdf_pages` unchanged when no page matches (e.g. scanned reports without text layer).
+    """
+    candidates = parse_page_spec(pdf_pages, doc.page_count)
+    matched = [
+        n for n in candidates
+        if EPS_PAGE_PATTERN.search(doc.page_text(n)) and YEAR_LABEL_PATTERN.search(doc.page_text(n))
+    ]
+    if not matched:
+        logging.info(f"Prescan found no EPS page in {doc.pdf_path}, using pages '{pdf_pages}'")
+        return pdf_pages
+    logging.info(f"Prescan selected pages {matched} of {doc.page_count} in {doc.pdf_path}")
+    return ",".join(str(n) for n in matched)
+
 # V3 Scraping
 def extract_clean_eps_v3(pdf_path, report_date):
     if not report_date:
@@ -13,111 +101,112 @@ def extract_clean_eps_v3(pdf_path, report_date):
     rep_year = int(rep_year)
 
     results = []
-    with pdfplumber.open(pdf_path) as pdf:
-        for page in pdf.pages:
-            logging.info("Extracting tables from page..., table mode")
-            tables = page.extract_tables()
-            for table in tables:
-                # Normalize table: replace None with ""
-                table = [[(c or "").strip() for c in row] for row in table if row]
+    doc = load_pdf(pdf_path)
+    for page_num in doc.page_numbers():
+        logging.info("Extracting tables from page..., table mode")
+        tables = doc.page_tables(page_num)
+        for table in tables:
+            # Normalize table: replace None with ""
+            table = [[(c or "").strip() for c in row] for row in table if row]
 
-                # Find a row containing EPS or EPS (VNĐ)
-                eps_rows = [row for row in table if any(re.search(r"EPS", c, re.IGNORECASE) for c in row)]
-                if not eps_rows:
-                    logging.info("No EPS row found in this table.")
-                    continue
+            # Find a row containing EPS or EPS (VNĐ)
+            eps_rows = [row for row in table if any(re.search(r"EPS", c, re.IGNORECASE) for c in row)]
+            if not eps_rows:
+                logging.info("No EPS row found in this table.")
+                continue
 
-                for eps_row in eps_rows:
-                    # first col is label, rest are EPS values
-                    values = [clean_number(c) for c in eps_row[1:] if c]
+            for eps_row in eps_rows:
+                # first col is label, rest are EPS values
+                values = [clean_number(c) for c in eps_row[1:] if c]
 
-                    # Find header row (years)
-                    header = None
-                    for r in table:
-                        if any(re.search(r"\d{4}", c) for c in r):
-                            header = r
-                            break
-                    if not header:
-                        header = table[0]
-
-                    years = [c for c in header[1:] if c]
-
-                    for year, val in zip(years, values):
-                        val = clean_number(val)
-                        if val is None or not (500 <= val <= 18000):
-                            logging.info(f"No valid EPS value found for {year}.")
-                            continue
-                        
-                        clean_year = normalize_year(year)
-                        
-                        if not clean_year or not verify_four_digit_year(clean_year):
-                            logging.warning(f"Invalid year format: {year} -> {clean_year}")
-                            continue
-                        
-                        is_forecast = False
-                        
-                        if clean_year.isdigit() and int(clean_year) >= rep_year:
-                            is_forecast = True
-                        results.append({
-                            "year": year,
-                            "clean_year": clean_year,
-                            "eps": val,
-                            "is_forecast": is_forecast,
-                            "report_date": report_date,
-                        })
-        
+                # Find header row (years)
+                header = None
+                for r in table:
+                    if any(re.search(r"\d{4}", c) for c in r):
+                        header = r
+                        break
+                if not header:
+                    header = table[0]
+
+                years = [c for c in header[1:] if c]
+
+                for year, val in zip(years, values):
+                    val = clean_number(val)
+                    if val is None or not (500 <= val <= 18000):
+                        logging.info(f"No valid EPS value found for {year}.")
+                        continue
+                    
+                    clean_year = normalize_year(year)
+                    
+                    if not clean_year or not verify_four_digit_year(clean_year):
+                        logging.warning(f"Invalid year format: {year} -> {clean_year}")
+                        continue
+                    
+                    is_forecast = False
+                    
+                    if clean_year.isdigit() and int(clean_year) >= rep_year:
+                        is_forecast = True
+                    results.append({
+                        "year": year,
+                        "clean_year": clean_year,
+                        "eps": val,
+                        "is_forecast": is_forecast,
+                        "report_date": report_date,
+                    })
+    
     
     if not results:  
         logging.info("No EPS data found in tables, trying full text search. text mode")
-        with pdfplumber.open(pdf_path) as pdf:
-            text = "\n".join(page.extract_text() for page in pdf.pages if page.extract_text())
-
-            # Match year rows like: 2015 2016E 2017F 2018F Dec-21 F*22 31/12/2022
-            year_line_pattern = re.compile(
-                r"(?:\d{4}(?:E|F)?)"             # 2015, 2016E, 2017F
-                r"|(?:[A-Za-z]{3}-\d{2})"        # Dec-21
-                r"|(?:FY\d{2,4})"                # FY22, FY2022
-                r"|(?:F\d{2,4})"                 # F22, F2022
-                r"|(?:31/12/\d{4})"              # ONLY 31/12/YYYY
-            )
-
-            # Match EPS values row with 4 numbers
-            eps_line_pattern = re.compile(
-                r"EPS[^\d]*([\d\.,]+)\s+([\d\.,]+)\s+([\d\.,]+)\s+([\d\.,]+)",
-                re.IGNORECASE
-            )
-
-            years = []
-            values = []
-
-            year_match = year_line_pattern.search(text)
-            if year_match:
-                years = [y for y in year_match.groups() if y]
-
-            eps_match = eps_line_pattern.search(text)
-            if eps_match:
-                values = [v for v in eps_match.groups() if v]
-
-            for year, val in zip(years, values):
-                # Normalize year (remove E/F if exists)
-                clean_year = normalize_year(year)
-                if not clean_year or not verify_four_digit_year(clean_year):
-                    logging.warning(f"Invalid year format in text mode: {year} -> {clean_year}")
-                    continue
-                val = clean_number(val)
-                if val is None and not (500 <= val <= 18000):
-                    logging.info(f"No valid EPS value found for {year} in text mode.")
-                    continue
-                is_forecast = False
-                if clean_year.isdigit() and int(clean_year) >= rep_year:
-                    is_forecast = True
-                results.append({
-                            "year": year,
-                            "clean_year": clean_year,
-                            "eps": val,
-                            "is_forecast": is_forecast,
-                            "report_date": report_date,
-                        })
+        # Match year rows like: 2015 2016E 2017F 2018F Dec-21 F*22 31/12/2022
+        year_line_pattern = re.compile(
+            r"(?:\d{4}(?:E|F)?)"             # 2015, 2016E, 2017F
+            r"|(?:[A-Za-z]{3}-\d{2})"        # Dec-21
+            r"|(?:FY\d{2,4})"                # FY22, FY2022
+            r"|(?:F\d{2,4})"                 # F22, F2022
+            r"|(?:31/12/\d{4})"              # ONLY 31/12/YYYY
+        )
+
+        # Match EPS values row with 4 numbers
+        eps_line_pattern = re.compile(
+            r"EPS[^\d]*([\d\.,]+)\s+([\d\.,]+)\s+([\d\.,]+)\s+([\d\.,]+)",
+            re.IGNORECASE
+        )
+
+        years = []
+        values = []
+
+        # Page by page, stopping at the first page where both were found
+        year_match = eps_match = None
+        for _, text in doc.iter_page_texts():
+            year_match = year_match or year_line_pattern.search(text)
+            eps_match = eps_match or eps_line_pattern.search(text)
+            if year_match and eps_match:
+                break
+        if year_match:
+            years = [y for y in year_match.groups() if y]
+        if eps_match:
+            values = [v for v in eps_match.groups() if v]
+
+        for year, val in zip(years, values):
+            # Normalize year (remove E/F if exists)
+            clean_year = normalize_year(year)
+            if not clean_year or not verify_four_digit_year(clean_year):
+                logging.warning(f"Invalid year format in text mode: {year} -> {clean_year}")
+                continue
+            val = clean_number(val)
+            if val is None and not (500 <= val <= 18000):
+                logging.info(f"No valid EPS value found for {year} in text mode.")
+                continue
+            is_forecast = False
+            if clean_year.isdigit() and int(clean_year) >= rep_year:
+                is_forecast = True
+            results.append({
+                        "year": year,
+                        "clean_year": clean_year,
+                        "eps": val,
+                        "is_forecast": is_forecast,
+                        "report_date": report_date,
+                    })
 
     return results
 
@@ -130,83 +219,42 @@ def extract_clean_eps_v4(pdf_path, report_date):
 
     results = []
 
-    with pdfplumber.open(pdf_path) as pdf:
-        for page in pdf.pages:
-            try:
-                tables = page.extract_tables()
-            except Exception as e:
-                logging.warning(f"extract_tables failed: {e}")
-                continue
-
-            for idx, table in enumerate(tables):
-                # --- Step 1: structured parsing ---
-                table = [[(c or "").strip() for c in row] for row in table if row]
-
-                eps_rows = [
-                    row for row in table
-                    if any(re.search(r"(EPS|Lãi cơ bản trên cổ phiếu)", c, re.IGNORECASE) for c in row)
-                ]
-                if eps_rows:
-                    # detect header row (years)
-                    header = None
-                    for r in table:
-                        if any(
-                            re.search(r"\d{4}", c) or
-                            re.search(r"(?:Dec|Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov)[- ]?\d{2}", c) or
-                            re.search(r"\d{1,2}/\d{1,2}/\d{4}", c) for c in r
-                        ):
-                            header = r
-                            break
-                    if not header:
-                        header = table[0]
-
-                    years_raw = [c for c in header[1:] if c]
-
-                    for eps_row in eps_rows:
-                        values = [clean_number(c) for c in eps_row[1:] if c]
-                        for year, val in zip(years_raw, values):
-                            if val is None or not (500 <= val <= 18000):  # strict filter
-                                continue
-                            clean_year = normalize_year(year)
-                            if not clean_year or not verify_four_digit_year(clean_year):
-                                continue
-                            is_forecast = False
-                            if clean_year.isdigit() and int(clean_year) >= rep_year:
-                                is_forecast = True
-                            results.append({
-                                "year": year,
-                                "clean_year": clean_year,
-                                "eps": val,
-                                "is_forecast": is_forecast,
-                                "report_date": report_date,
-                            })
-
-                # --- Step 2: fallback regex on flattened table ---
-                if not results:
-                    flat_text = "\n".join(" ".join(row) for row in table)
-
-                    year_pattern = re.compile(
-                        r"(?:\d{4}(?:E|F)?)|(?:\w{3}-\d{2})|(?:F\*\d{2,4})|(?:\d{1,2}/\d{1,2}/\d{4})"
-                    )
-                    eps_pattern = re.compile(
-                        r"(?:EPS|Lãi cơ bản trên cổ phiếu)[^\d]*(\d[\d\., ]+)+",
-                        re.IGNORECASE
-                    )
-
-                    years = year_pattern.findall(flat_text)
-                    eps_matches = eps_pattern.findall(flat_text)
-
-                    values = []
-                    for match in eps_matches:
-                        vals = [clean_number(v) for v in re.split(r"\s+", match.strip()) if v]
-                        values.extend(vals)
+    doc = load_pdf(pdf_path)
+    for page_num in doc.page_numbers():
+        try:
+            tables = doc.page_tables(page_num)
+        except Exception as e:
+            logging.warning(f"extract_tables failed: {e}")
+            continue
+
+        for idx, table in enumerate(tables):
+            # --- Step 1: structured parsing ---
+            table = [[(c or "").strip() for c in row] for row in table if row]
+
+            eps_rows = [
+                row for row in table
+                if any(re.search(r"(EPS|Lãi cơ bản trên cổ phiếu)", c, re.IGNORECASE) for c in row)
+            ]
+            if eps_rows:
+                # detect header row (years)
+                header = None
+                for r in table:
+                    if any(YEAR_OR_DATE_CELL_PATTERN.search(c) for c in r):
+                        header = r
+                        break
+                if not header:
+                    header = table[0]
+
+                years_raw = [c for c in header[1:] if c]
 
-                    for year, val in zip(years, values):
+                for eps_row in eps_rows:
+                    values = [clean_number(c) for c in eps_row[1:] if c]
+                    for year, val in zip(years_raw, values):
+                        if val is None or not (500 <= val <= 18000):  # strict filter
+                            continue
                         clean_year = normalize_year(year)
                         if not clean_year or not verify_four_digit_year(clean_year):
                             continue
-                        if val is None or not (500 <= val <= 18000):  # strict filter
-                            continue
                         is_forecast = False
                         if clean_year.isdigit() and int(clean_year) >= rep_year:
                             is_forecast = True
@@ -218,96 +266,12 @@ def extract_clean_eps_v4(pdf_path, report_date):
                             "report_date": report_date,
                         })
 
-    return results
-
-def validate_sec_code_in_pdf(pdf_path, sec_code):
-    """Check if sec_code exists in the first 2 pages of the PDF."""
-    sec_code = sec_code.upper()
-    try:
-        with pdfplumber.open(pdf_path) as pdf:
-            pages_to_check = min(2, len(pdf.pages))
-            text = ""
-            for i in range(pages_to_check):
-                text += pdf.pages[i].extract_text() or ""
-        if re.search(rf"\b{re.escape(sec_code)}\b", text, re.IGNORECASE):
-            return True
-        else:
-            return False
-    except Exception as e:
-        logging.error(f"Failed to validate sec_code in {pdf_path}: {e}")
-        return False
-
-
-# V5 Scraping - cross validate
-def extract_clean_eps_w_sc_v5(pdf_path, report_date, sec_code):
-    if not validate_sec_code_in_pdf(pdf_path, sec_code):
-        logging.warning(f"SEC_CODE '{sec_code}' not found in {pdf_path}")
-        return None
-
-    if not report_date:
-        return None
-    _, _, rep_year = parse_vietnamese_date(report_date)
-    rep_year = int(rep_year)
-
-    final_results = []
-
-    with pdfplumber.open(pdf_path) as pdf:
-        for page in pdf.pages:
-            try:
-                tables = page.extract_tables()
-            except Exception as e:
-                logging.warning(f"extract_tables failed: {e}")
-                continue
-
-            for idx, table in enumerate(tables):
-                # Normalize table
-                table = [[(c or "").strip() for c in row] for row in table if row]
-
-                # --- Step 1: structured table parsing ---
-                structured_results = []
-                eps_rows = [
-                    row for row in table
-                    if any(re.search(r"(\bEPS\b)", c, re.IGNORECASE) for c in row)
-                ]
-                if eps_rows:
-                    # find header row
-                    header = None
-                    for r in table:
-                        if any(
-                            re.search(r"\d{4}", c) or
-                            re.search(r"(?:Dec|Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov)[- ]?\d{2}", c) or
-                            re.search(r"\d{1,2}/\d{1,2}/\d{4}", c) for c in r
-                        ):
-                            header = r
-                            break
-                    if not header:
-                        header = table[0]
-
-                    years_raw = [c for c in header[1:] if c]
-
-                    for eps_row in eps_rows:
-                        values = [clean_number(c) for c in eps_row[1:] if c]
-                        for year, val in zip(years_raw, values):
-                            if val is None or not (500 <= val <= 18000):
-                                continue
-                            clean_year = normalize_year(year)
-                            if not clean_year or not verify_four_digit_year(clean_year):
-                                continue
-                            is_forecast = False
-                            if clean_year.isdigit() and int(clean_year) >= rep_year:
-                                is_forecast = True
-                            structured_results.append({
-                                "year": year,
-                                "clean_year": clean_year,
-                                "eps": val,
-                                "is_forecast": is_forecast,
-                                "report_date": report_date,
-                            })
-
-                # --- Step 2: regex on flattened table text ---
+            # --- Step 2: fallback regex on flattened table ---
+            if not results:
                 flat_text = "\n".join(" ".join(row) for row in table)
+
                 year_pattern = re.compile(
-                    r"(?:\d{4}(?:E|F)?)|(?:\w{3}-\d{2})|(?:F\*\d{2,4})|(?:31/12/\d{4})"
+                    r"(?:\d{4}(?:E|F)?)|(?:\w{3}-\d{2})|(?:F\*\d{2,4})|(?:\d{1,2}/\d{1,2}/\d{4})"
                 )
                 eps_pattern = re.compile(
                     r"(?:EPS|Lãi cơ bản trên cổ phiếu)[^\d]*(\d[\d\., ]+)+",
@@ -317,22 +281,21 @@ def extract_clean_eps_w_sc_v5(pdf_path, report_date, sec_code):
                 years = year_pattern.findall(flat_text)
                 eps_matches = eps_pattern.findall(flat_text)
 
-                regex_results = []
                 values = []
                 for match in eps_matches:
-                    vals = [clean_number(v) for v in re.split(r"\s+", match.strip()) if v]
+                    vals = [clean_number(v) for v in WHITESPACE_PATTERN.split(match.strip()) if v]
                     values.extend(vals)
 
                 for year, val in zip(years, values):
                     clean_year = normalize_year(year)
                     if not clean_year or not verify_four_digit_year(clean_year):
                         continue
-                    if val is None or not (500 <= val <= 18000):
+                    if val is None or not (500 <= val <= 18000):  # strict filter
                         continue
                     is_forecast = False
                     if clean_year.isdigit() and int(clean_year) >= rep_year:
                         is_forecast = True
-                    regex_results.append({
+                    results.append({
                         "year": year,
                         "clean_year": clean_year,
                         "eps": val,
@@ -340,816 +303,533 @@ def extract_clean_eps_w_sc_v5(pdf_path, report_date, sec_code):
                         "report_date": report_date,
                     })
 
-                # --- Step 3: cross-validate results ---
-                if structured_results and regex_results:
-                    validated = []
-                    for s in structured_results:
-                        for r in regex_results:
-                            if (
-                                s["clean_year"] == r["clean_year"] and
-                                s["eps"] == r["eps"]
-                            ):
-                                validated.append(s)
-                    final_results.extend(validated)
-                else:
-                    # if only one mode found, keep it
-                    final_results.extend(structured_results or regex_results)
-
-    return final_results
-
-def extract_clean_eps_v5(pdf_path, report_date, valid_codes=None, blacklist_codes=None):
-    if not report_date:
-        return None
-    _, _, rep_year = parse_vietnamese_date(report_date)
-    rep_year = int(rep_year)
+    return results
 
-    final_results = []
-    
-    # --- Step 0: detect sec_code in the PDF ---
-    sec_code = None
+def validate_sec_code_in_pdf(pdf_path, sec_code):
+    """Check if sec_code exists in the first 2 pages of the PDF."""
+    sec_code = sec_code.upper()
     try:
-        with pdfplumber.open(pdf_path) as pdf:
-            pages_to_check = min(3, len(pdf.pages))
-            text = ""
-            for i in range(pages_to_check):
-                text += pdf.pages[i].extract_text() or ""
+        text = load_pdf(pdf_path).leading_text(2)
+        if re.search(rf"\b{re.escape(sec_code)}\b", text, re.IGNORECASE):
+            return True
+        else:
+            return False
+    except Exception as e:
+        logging.error(f"Failed to validate sec_code in {pdf_path}: {e}")
+        return False
 
-        # Only match exactly 3 uppercase letters, standalone
-        matches = re.findall(r"(?<![A-Z])([A-Z]{3})(?![A-Z])", text)
 
-        blacklist = blacklist_codes or {"MBS", "PDF", "EPS", "CP", "QTR", "BCT"}
-        tickers = [m for m in matches if m not in blacklist]
+# --- Extraction engine ---
+#
+# Every extractor version below is an EpsEngine running a LayoutProfile: an ordered list
+# of strategies plus the ticker detection and confidence settings of that layout. The
+# strategies share one ParsedPdf, so text, pdfplumber tables and camelot tables are each
+# computed at most once per document.
 
-        # Cross-check with valid_codes list if provided
-        if valid_codes:
-            tickers = [m for m in tickers if m in valid_codes]
+# Plausible EPS range in VND, used by the strategies that cannot rely on table structure
+MIN_PLAUSIBLE_EPS = 500
+MAX_PLAUSIBLE_EPS = 18000
 
-        if tickers:
-            sec_code = max(set(tickers), key=tickers.count)  # most frequent
-        else:
-            logging.warning(f"No valid sec_code found in {pdf_path}")
-            return []  # skip EPS extraction if no ticker detected
-    except Exception as e:
-        logging.error(f"Failed sec_code detection in {pdf_path}: {e}")
-        return []
 
-    with pdfplumber.open(pdf_path) as pdf:
-        for page in pdf.pages:
-            try:
-                tables = page.extract_tables()
-            except Exception as e:
-                logging.warning(f"extract_tables failed: {e}")
-                continue
+def _plausible_eps(value):
+    return value is not None and MIN_PLAUSIBLE_EPS <= value <= MAX_PLAUSIBLE_EPS
 
-            for idx, table in enumerate(tables):
-                # Normalize table
-                table = [[(c or "").strip() for c in row] for row in table if row]
 
-                # --- Step 1: structured table parsing ---
-                structured_results = []
-                eps_rows = [
-                    row for row in table
-                    if any(re.search(r"(\bEPS\b)", c, re.IGNORECASE) for c in row)
-                ]
-                if eps_rows:
-                    # find header row
-                    header = None
-                    for r in table:
-                        if any(
-                            re.search(r"\d{4}(?:E|F)", c)                     # only 2022E, 2022F
-                            or re.search(r"(?:Dec)[- ]?\d{2}", c)             # Dec-12
-                            or re.search(r"31/12/\d{2,4}", c)                 # 31/12/22 or 31/12/2022
-                            or re.search(r"FY\d{2,4}[EF]?", c)                # FY22, FY22F, FY2022, FY2022F
-                            for c in r
-                        ):
-                            header = r
-                            break
-                    if not header:
-                        header = table[0]
-
-                    years_raw = [c for c in header[1:] if c]
-
-                    for eps_row in eps_rows:
-                        values = [clean_number(c) for c in eps_row[1:] if c]
-                        for year, val in zip(years_raw, values):
-                            if val is None or not (500 <= val <= 18000):
-                                continue
-                            clean_year = normalize_year(year)
-                            if not clean_year or not verify_four_digit_year(clean_year):
-                                continue
-                            is_forecast = False
-                            if clean_year.isdigit() and int(clean_year) >= rep_year:
-                                is_forecast = True
-                            structured_results.append({
-                                "year": year,
-                                "clean_year": clean_year,
-                                "eps": val,
-                                "is_forecast": is_forecast,
-                                "report_date": report_date,
-                                "sec_code": sec_code,
-                            })
-
-                # --- Step 2: regex on flattened table text ---
-                flat_text = "\n".join(" ".join(row) for row in table)
-                year_pattern = re.compile(
-                    r"(?:\d{4}(?:E|F)?)|(?:\w{3}-\d{2})|(?:F\*\d{2,4})|(?:31/12/\d{4})"
-                )
-                eps_pattern = re.compile(
-                    r"(?:EPS|Lãi cơ bản trên cổ phiếu)[^\d]*(\d[\d\., ]+)+",
-                    re.IGNORECASE
-                )
+def _valid_year(clean_year):
+    return bool(clean_year) and verify_four_digit_year(str(clean_year))
 
-                years = year_pattern.findall(flat_text)
-                eps_matches = eps_pattern.findall(flat_text)
 
-                regex_results = []
-                values = []
-                for match in eps_matches:
-                    vals = [clean_number(v) for v in re.split(r"\s+", match.strip()) if v]
-                    values.extend(vals)
+# Yielded by strategies after each table (or EPS line): the point where an early exit may happen
+END_OF_TABLE = None
 
-                for year, val in zip(years, values):
-                    clean_year = normalize_year(year)
-                    if not clean_year or not verify_four_digit_year(clean_year):
-                        continue
-                    if val is None or not (500 <= val <= 18000):
-                        continue
-                    is_forecast = False
-                    if clean_year.isdigit() and int(clean_year) >= rep_year:
-                        is_forecast = True
-                    regex_results.append({
-                        "year": year,
-                        "clean_year": clean_year,
-                        "eps": val,
-                        "is_forecast": is_forecast,
-                        "report_date": report_date,
-                        "sec_code": sec_code,
-                    })
 
-                # --- Step 3: cross-validate results ---
-                if structured_results and regex_results:
-                    validated = []
-                    for s in structured_results:
-                        for r in regex_results:
-                            if (
-                                s["clean_year"] == r["clean_year"] and
-                                s["eps"] == r["eps"]
-                            ):
-                                validated.append(s)
-                    final_results.extend(validated)
-                else:
-                    # if only one mode found, keep it
-                    final_results.extend(structured_results or regex_results)
+class ExtractionFailed(Exception):
+    """An extractor called with strict=True hit an error it would otherwise log and return [] for."""
 
-    return final_results
 
-def extract_clean_eps_v6(pdf_path, report_date, valid_codes=None, blacklist_codes=None, url=None, firm=None, already_detected_sc=None, pdf_pages="1-end"):
+class ConfidenceRule:
     """
-    (parameter) pages: str
-    pages : str, optional (default: '1')
-    Comma-separated page numbers. Example: '1,3,4' or '1,4-end' or 'all'.
+    Early exit rule: the rows found so far hold EPS values for at least `min_pairs` distinct
+    valid years, `min_forecasts` of them forecast years.
     """
-    if not report_date:
-        return None
-    _, _, rep_year = parse_vietnamese_date(report_date)
-    rep_year = int(rep_year)
-    year_patterns = [
-        r"\d{4}(?:E|F)", 
-        r"(?:Dec)[- ]?\d{2}",
-        r"31/12/\d{2,4}",
-        r"FY\d{2,4}[EF]?",
-        r"F\*\d{2,4}"
-    ]
-    year_patterns_v2 = [
-        r"\d{4}(?:E|F)?(?:\s*(?:cũ|mới|old|new))?",     # 2021, 2021E, 2021F, 2021 cũ, 2021 mới
-        r"(?:Dec)[- ]?\d{2}(?:\s*(?:cũ|mới|old|new))?", # Dec-21, Dec-21 mới
-        r"31/12/\d{2,4}(?:\s*(?:cũ|mới|old|new))?",     # 31/12/2021, 31/12/2021 cũ
-        r"FY\d{2,4}[EF]?(?:\s*(?:cũ|mới|old|new))?",    # FY22, FY2022F, FY22 mới
-        r"F\*?\d{2,4}(?:\s*(?:cũ|mới|old|new))?"        # F22, F*22, F2022 cũ
-    ]
-    
-    global_year_pattern = re.compile(
-        "|".join(year_patterns),
-        re.IGNORECASE
-        )
-    eps_patterns = [
-        r"^\s*EPS\b"
-    ]
-    global_eps_pattern = re.compile("|".join(eps_patterns), re.IGNORECASE)
-    final_results = []
-    
-    # --- Step 0: detect sec_code in the PDF ---
-    
-    sec_code = None
-    try:
-        if already_detected_sc:
-            sec_code = already_detected_sc
-        else:
-            with pdfplumber.open(pdf_path) as pdf:
-                pages_to_check = min(3, len(pdf.pages))
-                text = ""
-                for i in range(pages_to_check):
-                    text += pdf.pages[i].extract_text() or ""
-
-            # Only match exactly 3 uppercase letters, or with 2 uppercase letters with 1 number, standalone
-            matches = re.findall(r"(?<![A-Z])([A-Z]{3})(?![A-Z])", text)
-            matches += re.findall(r"(?<![A-Z])([A-Z]{2}\d)(?![A-Z])", text)
-
-            blacklist = blacklist_codes or {"MBS", "PDF", "EPS", 
-                                            "KKN", "CP", "QTR", 
-                                            "BCT", "KCN", "HNX", 
-                                            "HSX", "HOSE", "VNI", 
-                                            "VN30", "UPCOM", "USD", 
-                                            "VND", "VIX", "VNINDEX", 
-                                            "FY2", "FY1", "YTD", "MUA", "BÁN", "VNĐ", 
-                                            "NIM", "NPL", "IEA", "KHO", "BLĐ", "NII",
-                                            "PER", "ROE", "ROA", "P/B", "P/E", "PBR",
-                                            "CIR", "COV", "FDI"
-                                            }
-            tickers = [m for m in matches if m not in blacklist]
-
-            # Cross-check with valid_codes list if provided
-            if valid_codes:
-                tickers = [m for m in tickers if m in valid_codes]
-
-            if tickers:
-                sec_code = max(set(tickers), key=tickers.count)  # most frequent
-                logging.info(f"Detected sec_code '{sec_code}' in {pdf_path}")
-            else:
-                logging.warning(f"No valid sec_code found in {pdf_path}")
-                return []  # skip EPS extraction if no ticker detected
 
-        tables = camelot.read_pdf(pdf_path, pages=pdf_pages, flavor='stream')
-        results = []
+    def __init__(self, min_pairs=3, min_forecasts=1):
+        self.min_pairs = min_pairs
+        self.min_forecasts = min_forecasts
+
+    def __call__(self, rows):
+        forecasts = {}
+        for row in rows:
+            if _valid_year(row["clean_year"]) and row["eps"] is not None:
+                forecasts[row["clean_year"]] = forecasts.get(row["clean_year"]) or bool(row["is_forecast"])
+        return len(forecasts) >= self.min_pairs and sum(forecasts.values()) >= self.min_forecasts
+
+    def __repr__(self):
+        # Part of the result cache key when passed as an extractor argument
+        return f"ConfidenceRule(min_pairs={self.min_pairs}, min_forecasts={self.min_forecasts})"
+
+
+DEFAULT_CONFIDENCE = ConfidenceRule()
+
+
+class ExtractionContext:
+    """Document level state shared by the strategies of one extraction."""
+
+    def __init__(self, doc, report_date, rep_year, sec_code, firm, url, page_spec, stop_when=None):
+        self.doc = doc
+        self.report_date = report_date
+        self.rep_year = rep_year
+        self.sec_code = sec_code
+        self.firm = firm
+        # Space to avoid URL truncation in some DB viewers
+        self.url = url + "  " if url is not None else None
+        self.page_spec = page_spec
+        self.pages = parse_page_spec(page_spec, doc.page_count)
+        # ConfidenceRule ending the extraction early, None to read every page
+        self.stop_when = stop_when
+        # Errors the strategies logged and skipped, see EpsEngine.extract(strict=True)
+        self.errors = []
+
+    def row(self, year, clean_year, eps, is_forecast):
+        return {
+            "year": year,
+            "clean_year": clean_year,
+            "eps": eps,
+            "is_forecast": is_forecast,
+            "report_date": self.report_date,
+            "sec_code": self.sec_code,
+            "firm": self.firm,
+            "url": self.url,
+        }
+
+
+class TextLayerStrategy:
+    """
+    EPS line of the page text and the closest year header line above it.
 
-        for table in tables:
-            df = table.df
-            # logging.info(f"Extracted table {table} with \n{df}")
-            # Remove all columns with out EPS or year patterns
-            cols_to_keep = []
-            for col in df.columns:
-                if df[col].apply(lambda x: bool(global_eps_pattern.search(x)) or bool(global_year_pattern.search(x))).any():
-                    cols_to_keep.append(col)
-            if not cols_to_keep:
-                continue
-            df = df[cols_to_keep]
-            logging.info(f"After filtering, table has columns: {df.columns.tolist()}")
-            # Find EPS column and delete columns before it
-            eps_col = None
-            for col in df.columns:
-                if df[col].apply(lambda x: bool(global_eps_pattern.search(x))).any():
-                    eps_col = col
-                    break
-            if eps_col is None:
-                continue
-            df = df.loc[:, df.columns[df.columns.get_loc(eps_col):]]
-            logging.info(f"After EPS filtering, table has columns: {df.columns.tolist()}")
-            # Filtering row with EPS and year patterns
-            df = df[df.apply(lambda row: row.astype(str).str.contains(global_eps_pattern).any() or row.astype(str).str.contains(global_year_pattern).any(), axis=1)]
-            if df.empty:
-                logging.warning(f"No rows with EPS or year patterns found in table from {pdf_path}")
-                continue
-            # Reset index and columns
-            df.columns = df.iloc[0]
-            df = df[1:]
-            df = df.reset_index(drop=True)
-            logging.info(f"Filtered table:\n{df}")
-            # Expected format:
-            # 1 Chỉ số tài chính 31/12/2024 31/12/2025 31/12/2026 31/12/2027
-            # 0              EPS      3,679      3,993      4,726      5,493
-            header = df.columns.tolist()
-            for idx, row in df.iterrows():
-                logging.info(f"Processing row {idx}: {row.tolist()}")
-                # Check if EPS in the first column
-                if not any(re.search(r"\bEPS\b", str(c), re.IGNORECASE) for c in row):
+    Cheapest strategy: it reuses the text layer read by the prescan and detects no tables.
+    Values are aligned to the header from the right, so a label like "EPS 12M (VND)" does
+    not shift them, and only plausible EPS values with a four digit year are kept.
+    """
+
+    name = "text"
+    cost = 1
+
+    def __init__(self, min_labels=2):
+        self.min_labels = min_labels
+
+    def rows(self, ctx):
+        for _, text in ctx.doc.iter_page_texts(ctx.page_spec):
+            header = None
+            for line in text.splitlines():
+                match = EPS_LINE_PATTERN.search(line)
+                if not match:
+                    labels = TEXT_YEAR_LABEL_PATTERN.findall(line)
+                    if len(labels) >= self.min_labels:
+                        header = labels
                     continue
-                # Extract EPS values
-                eps_values = row[1:].tolist()
-                for year, eps in zip(header[1:], eps_values):
-                    logging.info(f"Year: {year}, EPS: {eps}")
-                
+                if not header:
+                    continue
+                values = NUMBER_PATTERN.findall(line[match.end():])
+                if len(values) > len(header):
+                    values = values[-len(header):]
+                for year, value in zip(header, values):
+                    eps = clean_number(value)
                     clean_year = normalize_year(year)
-                    
-                    if len(eps) < 3:
-                        logging.warning(f"EPS value too short for year '{year}' in row {idx}: '{eps}'")
-                        continue
-                    
-                    if eps == "" or eps is None:
-                        logging.warning(f"Empty EPS value for year '{year}' in row {idx}")
+                    if not _plausible_eps(eps) or not _valid_year(clean_year):
                         continue
-                    
-                    final_results.append({
-                        "year": year,
-                        "clean_year": clean_year,
-                        "eps": clean_number(eps),
-                        "is_forecast": clean_year and int(clean_year) >= rep_year,
-                        "report_date": report_date,
-                        "sec_code": sec_code,
-                        "firm": firm,
-                        "url": url + "  " # Space to avoid URL truncation in some DB viewers
-                    })
-        return final_results
-    except Exception as e:
-        logging.error(f"Failed sec_code detection in {pdf_path}: {e}")
-        return []
-    
-def extract_clean_eps_v6_mirra(pdf_path, report_date, valid_codes=None, blacklist_codes=None, url=None, firm=None, already_detected_sc=None, pdf_pages="1-end"):
-    """
-    (parameter) pages: str
-    pages : str, optional (default: '1')
-    Comma-separated page numbers. Example: '1,3,4' or '1,4-end' or 'all'.
-    """
-    if not report_date:
-        return None
-    _, _, rep_year = parse_vietnamese_date(report_date)
-    rep_year = int(rep_year)
-    year_patterns = [
-        r"\d{4}(?:E|F)", 
-        r"(?:Dec)[- ]?\d{2}",
-        r"31/12/\d{2,4}",
-        r"FY\d{2,4}[EF]?",
-        r"F\*\d{2,4}"
-    ]
-    year_patterns_v2 = [
-        r"\d{4}(?:E|F)?(?:\s*(?:cũ|mới|old|new))?",     # 2021, 2021E, 2021F, 2021 cũ, 2021 mới
-        r"(?:Dec)[- ]?\d{2}(?:\s*(?:cũ|mới|old|new))?", # Dec-21, Dec-21 mới
-        r"31/12/\d{2,4}(?:\s*(?:cũ|mới|old|new))?",     # 31/12/2021, 31/12/2021 cũ
-        r"FY\d{2,4}[EF]?(?:\s*(?:cũ|mới|old|new))?",    # FY22, FY2022F, FY22 mới
-        r"F\*?\d{2,4}(?:\s*(?:cũ|mới|old|new))?"        # F22, F*22, F2022 cũ
-    ]
-    
-    global_year_pattern = re.compile(
-        "|".join(year_patterns),
-        re.IGNORECASE
-        )
-    eps_patterns = [
-        r"^\s*EPS\b"
-    ]
-    global_eps_pattern = re.compile("|".join(eps_patterns), re.IGNORECASE)
-    final_results = []
-    
-    # --- Step 0: detect sec_code in the PDF ---
-    
-    sec_code = None
-    try:
-        if already_detected_sc:
-            sec_code = already_detected_sc
+                    yield ctx.row(year, clean_year, eps, int(clean_year) >= ctx.rep_year)
+                yield END_OF_TABLE
+
+
+def _word_lines(words, y_tolerance):
+    """Group pdfplumber words into lines of words sorted left to right, top to bottom."""
+    lines = []
+    for word in sorted(words, key=lambda word: (word["top"], word["x0"])):
+        middle = (word["top"] + word["bottom"]) / 2
+        if lines and abs(middle - lines[-1][0]) <= y_tolerance:
+            lines[-1][1].append(word)
         else:
-            with pdfplumber.open(pdf_path) as pdf:
-                pages_to_check = min(3, len(pdf.pages))
-                text = ""
-                for i in range(pages_to_check):
-                    text += pdf.pages[i].extract_text() or ""
-
-            # Only match exactly 3 uppercase letters, or with 2 uppercase letters with 1 number, standalone
-            matches = re.findall(r"(?<![A-Z])([A-Z]{3})(?![A-Z])", text)
-            matches += re.findall(r"(?<![A-Z])([A-Z]{2}\d)(?![A-Z])", text)
-
-            blacklist = blacklist_codes or {"MBS", "PDF", "EPS", 
-                                            "KKN", "CP", "QTR", 
-                                            "BCT", "KCN", "HNX", 
-                                            "HSX", "HOSE", "VNI", 
-                                            "VN30", "UPCOM", "USD", 
-                                            "VND", "VIX", "VNINDEX", 
-                                            "FY2", "FY1", "YTD", "MUA", "BÁN", "VNĐ", 
-                                            "NIM", "NPL", "IEA", "KHO", "BLĐ", "NII",
-                                            "PER", "ROE", "ROA", "P/B", "P/E", "PBR",
-                                            "CIR", "COV", "FDI"
-                                            }
-            tickers = [m for m in matches if m not in blacklist]
-
-            # Cross-check with valid_codes list if provided
-            if valid_codes:
-                tickers = [m for m in tickers if m in valid_codes]
-
-            if tickers:
-                sec_code = max(set(tickers), key=tickers.count)  # most frequent
-                logging.info(f"Detected sec_code '{sec_code}' in {pdf_path}")
-            else:
-                logging.warning(f"No valid sec_code found in {pdf_path}")
-                return []  # skip EPS extraction if no ticker detected
+            lines.append([middle, [word]])
+    return [(middle, sorted(line, key=lambda word: word["x0"])) for middle, line in lines]
 
-        tables = camelot.read_pdf(pdf_path, pages=pdf_pages, flavor='stream')
-        results = []
 
-        for table in tables:
-            df = table.df
-            # logging.info(f"Extracted table {table} with \n{df}")
-            # Remove all columns with out EPS or year patterns
-            cols_to_keep = []
-            for col in df.columns:
-                if df[col].apply(lambda x: bool(global_eps_pattern.search(x)) or bool(global_year_pattern.search(x))).any():
-                    cols_to_keep.append(col)
-            if not cols_to_keep:
-                continue
-            df = df[cols_to_keep]
-            logging.info(f"After filtering, table has columns: {df.columns.tolist()}")
-            # Find EPS column and delete columns before it
-            eps_col = None
-            for col in df.columns:
-                if df[col].apply(lambda x: bool(global_eps_pattern.search(x))).any():
-                    eps_col = col
-                    break
-            if eps_col is None:
-                continue
-            df = df.loc[:, df.columns[df.columns.get_loc(eps_col):]]
-            logging.info(f"After EPS filtering, table has columns: {df.columns.tolist()}")
-            # Filtering row with EPS and year patterns
-            df = df[df.apply(lambda row: row.astype(str).str.contains(global_eps_pattern).any() or row.astype(str).str.contains(global_year_pattern).any(), axis=1)]
-            if df.empty:
-                logging.warning(f"No rows with EPS or year patterns found in table from {pdf_path}")
+def _x_center(word):
+    return (word["x0"] + word["x1"]) / 2
+
+
+class WordLayoutStrategy:
+    """
+    EPS row aligned with its year header by position, from the word boxes of the text layer.
+
+    Words are grouped into lines by their vertical position. A line made of at least
+    `min_labels` year labels is a header, and one starting with the EPS label is an EPS row.
+    Each EPS value is matched with the header label above it whose column is closest
+    horizontally, within half the spacing between header columns. Side by side tables and
+    labels such as "EPS 12M (VND)" therefore do not shift the values. Rows are filtered like
+    v7: four digit years only, and EPS cells of at least `min_eps_length` characters.
+    """
+
+    name = "words"
+    cost = 2
+
+    def __init__(self, min_labels=2, min_eps_length=3):
+        self.min_labels = min_labels
+        self.min_eps_length = min_eps_length
+
+    def _header(self, line):
+        """Year label words of a header line, None if the line is not one."""
+        labels = [word for word in line if TEXT_YEAR_LABEL_PATTERN.fullmatch(word["text"])]
+        return labels if len(labels) >= self.min_labels else None
+
+    def _eps_values(self, line):
+        """
+        Number words of the EPS row in a line: those after the EPS label up to the next label,
+        so a table printed beside it on the same line is left out.
+        """
+        texts = [word["text"] for word in line]
+        start = next((i for i in range(len(line)) if EPS_LINE_PATTERN.match(" ".join(texts[i:]))), None)
+        if start is None:
+            return None
+        values = []
+        for word in line[start + 1:]:
+            if NUMBER_PATTERN.fullmatch(word["text"]):
+                values.append(word)
+            elif values and LABEL_WORD_PATTERN.search(word["text"]):
+                break
+        return values
+
+    def _align(self, header, values):
+        """(label word, value word) pairs of the values lying in a header column."""
+        centers = [_x_center(label) for label in header]
+        pitch = min(b - a for a, b in zip(centers, centers[1:]))
+        pairs = {}
+        for value in values:
+            # Compared by distance only, words are dicts and cannot break a tie
+            distance, label = min(((abs(_x_center(value) - center), label) for center, label in zip(centers, header)), key=lambda pair: pair[0])
+            if distance <= pitch / 2 and id(label) not in pairs:
+                pairs[id(label)] = (label, value)
+        return list(pairs.values())
+
+    def rows(self, ctx):
+        for _, words in ctx.doc.iter_page_words(ctx.page_spec):
+            if not words:
                 continue
-            # Reset index and columns
-            df.columns = df.iloc[0]
-            df = df[1:]
-            df = df.reset_index(drop=True)
-            logging.info(f"Filtered table:\n{df}")
-            # Expected format:
-            # 1 Chỉ số tài chính 31/12/2024 31/12/2025 31/12/2026 31/12/2027
-            # 0              EPS      3,679      3,993      4,726      5,493
-            header = df.columns.tolist()
-            for idx, row in df.iterrows():
-                logging.info(f"Processing row {idx}: {row.tolist()}")
-                # Check if EPS in the first column
-                if not any(re.search(r"\bEPS\b", str(c), re.IGNORECASE) for c in row):
+            heights = sorted(word["bottom"] - word["top"] for word in words)
+            lines = _word_lines(words, heights[len(heights) // 2] / 2)
+            headers = []
+            for middle, line in lines:
+                header = self._header(line)
+                if header:
+                    headers.append((middle, header))
                     continue
-                # Extract EPS values
-                eps_values = row[1:].tolist()
-                for year, eps in zip(header[1:], eps_values):
-                    logging.info(f"Year: {year}, EPS: {eps}")
-                
+                values = self._eps_values(line) if headers else None
+                if not values:
+                    continue
+                # Closest header above whose columns hold the values (two column pages have several)
+                for _, header in reversed(headers):
+                    pairs = self._align(header, values) if len(header) > 1 else []
+                    if len(pairs) >= self.min_labels:
+                        break
+                else:
+                    continue
+                for label, value in sorted(pairs, key=lambda pair: pair[0]["x0"]):
+                    year = label["text"]
                     clean_year = normalize_year(year)
-                    final_results.append({
-                        "year": year,
-                        "clean_year": clean_year,
-                        "eps": clean_number(eps),
-                        "is_forecast": clean_year.isdigit() and int(clean_year) >= rep_year,
-                        "report_date": report_date,
-                        "sec_code": sec_code,
-                        "firm": firm,
-                        "url": url
-                    })
-                    return final_results
-        return final_results
-    except Exception as e:
-        logging.error(f"Failed sec_code detection in {pdf_path}: {e}")
-        return []
-    
-def extract_clean_eps_v7(pdf_path, report_date, valid_codes=None, blacklist_codes=None, url=None, firm=None, already_detected_sc=None, pdf_pages="1-end"):
+                    eps = clean_number(value["text"])
+                    if len(value["text"]) < self.min_eps_length or eps is None or not _valid_year(clean_year):
+                        continue
+                    yield ctx.row(year, clean_year, eps, int(clean_year) >= ctx.rep_year)
+                yield END_OF_TABLE
+
+
+class PlumberTableStrategy:
     """
-    (parameter) pages: str
-    pages : str, optional (default: '1')
-    Comma-separated page numbers. Example: '1,3,4' or '1,4-end' or 'all'.
+    pdfplumber tables, each parsed twice: structurally (EPS rows under the first row
+    matching `header_pattern`) and with regexes over the flattened table text. When both
+    find values only the (year, EPS) pairs they agree on are kept. This was the v5 extractor.
     """
-    if not report_date:
-        return None
-    _, _, rep_year = parse_vietnamese_date(report_date)
-    rep_year = int(rep_year)
-    year_patterns = [
-        r"\d{4}(?:E|F)", 
-        r"(?:Dec)[- ]?\d{2}",
-        r"31/12/\d{2,4}",
-        r"FY\d{2,4}[EF]?",
-        r"F\*\d{2,4}"
-    ]
-    year_patterns_v2 = [
-        r"\d{4}(?:E|F)?(?:\s*(?:cũ|mới|old|new))?",     # 2021, 2021E, 2021F, 2021 cũ, 2021 mới
-        r"(?:Dec)[- ]?\d{2}(?:\s*(?:cũ|mới|old|new))?", # Dec-21, Dec-21 mới
-        r"31/12/\d{2,4}(?:\s*(?:cũ|mới|old|new))?",     # 31/12/2021, 31/12/2021 cũ
-        r"FY\d{2,4}[EF]?(?:\s*(?:cũ|mới|old|new))?",    # FY22, FY2022F, FY22 mới
-        r"F\*?\d{2,4}(?:\s*(?:cũ|mới|old|new))?"        # F22, F*22, F2022 cũ
-    ]
-    
-    global_year_pattern = re.compile(
-        "|".join(year_patterns),
-        re.IGNORECASE
-        )
-    eps_patterns = [
-        r"^\s*EPS\b"
-    ]
-    global_eps_pattern = re.compile("|".join(eps_patterns), re.IGNORECASE)
-    final_results = []
-    
-    # --- Step 0: detect sec_code in the PDF ---
-    
-    sec_code = None
-    try:
-        if already_detected_sc:
-            sec_code = already_detected_sc
-        else:
-            with pdfplumber.open(pdf_path) as pdf:
-                pages_to_check = min(3, len(pdf.pages))
-                text = ""
-                for i in range(pages_to_check):
-                    text += pdf.pages[i].extract_text() or ""
-
-            # Only match exactly 3 uppercase letters, or with 2 uppercase letters with 1 number, standalone
-            matches = re.findall(r"(?<![A-Z])([A-Z]{3})(?![A-Z])", text)
-            matches += re.findall(r"(?<![A-Z])([A-Z]{2}\d)(?![A-Z])", text)
-
-            blacklist = blacklist_codes or {"MBS", "PDF", "EPS", 
-                                            "KKN", "CP", "QTR", 
-                                            "BCT", "KCN", "HNX", 
-                                            "HSX", "HOSE", "VNI", 
-                                            "VN30", "UPCOM", "USD", 
-                                            "VND", "VIX", "VNINDEX", 
-                                            "FY2", "FY1", "YTD", "MUA", "BÁN", "VNĐ", 
-                                            "NIM", "NPL", "IEA", "KHO", "BLĐ", "NII",
-                                            "PER", "ROE", "ROA", "P/B", "P/E", "PBR",
-                                            "CIR", "COV", "FDI"
-                                            }
-            tickers = [m for m in matches if m not in blacklist]
-
-            # Cross-check with valid_codes list if provided
-            if valid_codes:
-                tickers = [m for m in tickers if m in valid_codes]
-
-            if tickers:
-                sec_code = max(set(tickers), key=tickers.count)  # most frequent
-                logging.info(f"Detected sec_code '{sec_code}' in {pdf_path}")
-            else:
-                logging.warning(f"No valid sec_code found in {pdf_path}")
-                return []  # skip EPS extraction if no ticker detected
 
-        tables = camelot.read_pdf(pdf_path, pages="1-end", flavor="stream")
+    name = "plumber"
+    cost = 3
 
-        for table in tables:
-            df = table.df
-
-            # Keep only columns with EPS or year patterns
-            cols_to_keep = [
-                col
-                for col in df.columns
-                if df[col].astype(str).apply(
-                    lambda x: bool(global_eps_pattern.search(x)) or bool(global_year_pattern.search(x))
-                ).any()
-            ]
-            if not cols_to_keep:
-                continue
+    def __init__(self, header_pattern=YEAR_HEADER_CELL_PATTERN, eps_row_pattern=EPS_WORD_PATTERN):
+        self.header_pattern = header_pattern
+        self.eps_row_pattern = eps_row_pattern
 
-            df = df[cols_to_keep]
-            logging.info(f"After filtering, table has columns: {df.columns.tolist()}")
+    def _structured(self, ctx, table):
+        eps_rows = [row for row in table if any(self.eps_row_pattern.search(c) for c in row)]
+        if not eps_rows:
+            return []
+        header = next((r for r in table if any(self.header_pattern.search(c) for c in r)), table[0])
+        years_raw = [c for c in header[1:] if c]
 
-            # Find EPS column
-            eps_col = next(
-                (col for col in df.columns if df[col].astype(str).apply(lambda x: bool(global_eps_pattern.search(x))).any()),
-                None,
-            )
-            if eps_col is None:
-                continue
+        results = []
+        for eps_row in eps_rows:
+            values = [clean_number(c) for c in eps_row[1:] if c]
+            for year, val in zip(years_raw, values):
+                if not _plausible_eps(val):
+                    continue
+                clean_year = normalize_year(year)
+                if not _valid_year(clean_year):
+                    continue
+                results.append(ctx.row(year, clean_year, val, int(clean_year) >= ctx.rep_year))
+        return results
 
-            # Drop columns before EPS
-            df = df.loc[:, df.columns[df.columns.get_loc(eps_col) :]]
-            logging.info(f"After EPS filtering, table has columns: {df.columns.tolist()}")
+    def _flattened(self, ctx, table):
+        flat_text = "\n".join(" ".join(row) for row in table)
+        years = FLAT_YEAR_PATTERN.findall(flat_text)
+        values = []
+        for match in FLAT_EPS_VALUES_PATTERN.findall(flat_text):
+            values.extend(clean_number(v) for v in WHITESPACE_PATTERN.split(match.strip()) if v)
 
-            # Keep only rows that contain EPS or year
-            df = df[
-                df.astype(str).apply(
-                    lambda row: row.str.contains(global_eps_pattern).any()
-                    or row.str.contains(global_year_pattern).any(),
-                    axis=1,
-                )
-            ]
-            if df.empty:
-                logging.warning(f"No rows with EPS or year patterns found in table from {pdf_path}")
+        results = []
+        for year, val in zip(years, values):
+            clean_year = normalize_year(year)
+            if not _valid_year(clean_year) or not _plausible_eps(val):
+                continue
+            results.append(ctx.row(year, clean_year, val, int(clean_year) >= ctx.rep_year))
+        return results
+
+    def rows(self, ctx):
+        for page_num in ctx.pages:
+            try:
+                tables = ctx.doc.page_tables(page_num)
+            except Exception as e:
+                logging.warning(f"extract_tables failed: {e}")
+                ctx.errors.append(f"{self.name} page {page_num}: {e}")
                 continue
 
-            # Reset header (use first row as header)
-            header = df.iloc[0].tolist()
-            df = df[1:].reset_index(drop=True)
-            df.columns = header
+            for table in tables:
+                table = [[(c or "").strip() for c in row] for row in table if row]
+                structured = self._structured(ctx, table)
+                flattened = self._flattened(ctx, table)
+                if structured and flattened:
+                    # Cross-validate: keep the structured rows the regex pass also found
+                    yield from (
+                        s for s in structured for r in flattened
+                        if s["clean_year"] == r["clean_year"] and s["eps"] == r["eps"]
+                    )
+                else:
+                    yield from structured or flattened
+                yield END_OF_TABLE
+
 
-            logging.info(f"Filtered table:\n{df}")
+class CamelotStreamStrategy:
+    """
+    Camelot stream tables of the prescanned pages, filtered with _eps_table_rows; the most
+    expensive strategy.
 
-            # Process EPS rows
-            for idx, row in df.iterrows():
-                logging.info(f"Processing row {idx}: {row.tolist()}")
-                # Check if EPS in the first column
-                if not any(re.search(r"\bEPS\b", str(c), re.IGNORECASE) for c in row):
-                    continue
-                # Extract EPS values
-                eps_values = row[1:].tolist()
-                for year, eps in zip(header[1:], eps_values):
+    `strict_years` drops year labels that do not normalize to a four digit year (v7);
+    without it any label is kept and one that is not a number fails the strategy (v6).
+    EPS cells shorter than `min_eps_length` characters are skipped.
+    """
+
+    name = "camelot"
+    cost = 4
+
+    def __init__(self, strict_years=True, min_eps_length=3):
+        self.strict_years = strict_years
+        self.min_eps_length = min_eps_length
+
+    def _year(self, ctx, year, idx):
+        """(clean_year, is_forecast) of a header label."""
+        if not self.strict_years:
+            clean_year = normalize_year(year)
+            return clean_year, clean_year and int(clean_year) >= ctx.rep_year
+        try:
+            clean_year = normalize_year(year)
+            if not verify_four_digit_year(clean_year):
+                logging.warning(f"Invalid year format for year '{year}' in row {idx}")
+                clean_year = None
+        except Exception as e:
+            logging.warning(f"Failed to normalize year '{year}' in row {idx}: {e}")
+            clean_year = None
+        try:
+            return clean_year, int(clean_year) >= ctx.rep_year
+        except Exception as e:
+            logging.warning(f"Invalid year format for year '{year}' in row {idx}: {e}")
+            return None, False
+
+    def rows(self, ctx):
+        # Pages are parsed as they are reached, so the pages after an early exit never are
+        for table in ctx.doc.iter_camelot_tables(ctx.page_spec):
+            filtered = _eps_table_rows(table.df, EPS_LABEL_PATTERN, YEAR_LABEL_PATTERN)
+            if filtered is None:
+                continue
+            # Expected format:
+            # 1 Chỉ số tài chính 31/12/2024 31/12/2025 31/12/2026 31/12/2027
+            # 0              EPS      3,679      3,993      4,726      5,493
+            header, eps_rows = filtered
+            for idx, row in eps_rows:
+                logging.info(f"Processing row {idx}: {row}")
+                for year, eps in zip(header[1:], row[1:]):
                     logging.info(f"Year: {year}, EPS: {eps}")
-                    
-                    try:
-                        clean_year = normalize_year(year)
-                        if not verify_four_digit_year(clean_year):
-                            logging.warning(f"Invalid year format for year '{year}' in row {idx}")
-                            clean_year = None
-                    except Exception as e:
-                        logging.warning(f"Failed to normalize year '{year}' in row {idx}: {e}")
-                        clean_year = None
-                    
-                    if len(eps) < 3:
+                    if len(eps) < self.min_eps_length:
                         logging.warning(f"EPS value too short for year '{year}' in row {idx}: '{eps}'")
                         continue
-                    
-                    if eps == "" or eps is None:
-                        logging.warning(f"Empty EPS value for year '{year}' in row {idx}")
-                        continue
-                    
-                    is_forecast = False
-                    try:
-                        if int(clean_year) >= rep_year:
-                            is_forecast = True
-                    except Exception as e:
-                        logging.warning(f"Invalid year format for year '{year}' in row {idx}: {e}")
-                        is_forecast = False
-                        clean_year = None
+                    clean_year, is_forecast = self._year(ctx, year, idx)
+                    yield ctx.row(year, clean_year, clean_number(eps), is_forecast)
+            yield END_OF_TABLE
 
-                    final_results.append({
-                        "year": year,
-                        "clean_year": clean_year,
-                        "eps": clean_number(eps),
-                        "is_forecast": is_forecast,
-                        "report_date": report_date,
-                        "sec_code": sec_code,
-                        "firm": firm,
-                        "url": url + "  " # Space to avoid URL truncation in some DB viewers
-                    })
-        return final_results
 
-    except Exception as e:
-        logging.error(f"Failed sec_code detection in {pdf_path}: {e}")
-        return []
-    
-def extract_clean_eps_v7_mirra(pdf_path, report_date, valid_codes=None, blacklist_codes=None, url=None, firm=None, already_detected_sc=None, pdf_pages="1-end"):
+class LayoutProfile:
     """
-    (parameter) pages: str
-    pages : str, optional (default: '1')
-    Comma-separated page numbers. Example: '1,3,4' or '1,4-end' or 'all'.
+    How to extract EPS from the reports of one layout (or firm).
+
+    `strategies` run from the cheapest `cost` up. A strategy whose rows cover `min_years`
+    distinct valid years ends the extraction, otherwise the next one runs and the best
+    result so far is kept. `max_rows` stops a strategy after that many rows (e.g. Mirra
+    reports, whose first EPS value is the one wanted). `stop_when` is the default
+    ConfidenceRule for early exit: once the rows of a strategy satisfy it after a table,
+    no further table or page is read. `with_digit_codes` and `sec_code_blacklist`
+    configure the ticker detection.
     """
-    if not report_date:
-        return None
-    _, _, rep_year = parse_vietnamese_date(report_date)
-    rep_year = int(rep_year)
-    year_patterns = [
-        r"\d{4}(?:E|F)", 
-        r"(?:Dec)[- ]?\d{2}",
-        r"31/12/\d{2,4}",
-        r"FY\d{2,4}[EF]?",
-        r"F\*\d{2,4}"
-    ]
-    year_patterns_v2 = [
-        r"\d{4}(?:E|F)?(?:\s*(?:cũ|mới|old|new))?",     # 2021, 2021E, 2021F, 2021 cũ, 2021 mới
-        r"(?:Dec)[- ]?\d{2}(?:\s*(?:cũ|mới|old|new))?", # Dec-21, Dec-21 mới
-        r"31/12/\d{2,4}(?:\s*(?:cũ|mới|old|new))?",     # 31/12/2021, 31/12/2021 cũ
-        r"FY\d{2,4}[EF]?(?:\s*(?:cũ|mới|old|new))?",    # FY22, FY2022F, FY22 mới
-        r"F\*?\d{2,4}(?:\s*(?:cũ|mới|old|new))?"        # F22, F*22, F2022 cũ
-    ]
-    
-    global_year_pattern = re.compile(
-        "|".join(year_patterns),
-        re.IGNORECASE
-        )
-    eps_patterns = [
-        r"^\s*EPS\b"
-    ]
-    global_eps_pattern = re.compile("|".join(eps_patterns), re.IGNORECASE)
-    final_results = []
-    
-    # --- Step 0: detect sec_code in the PDF ---
-    
-    sec_code = None
-    try:
-        if already_detected_sc:
-            sec_code = already_detected_sc
-        else:
-            with pdfplumber.open(pdf_path) as pdf:
-                pages_to_check = min(3, len(pdf.pages))
-                text = ""
-                for i in range(pages_to_check):
-                    text += pdf.pages[i].extract_text() or ""
-
-            # Only match exactly 3 uppercase letters, or with 2 uppercase letters with 1 number, standalone
-            matches = re.findall(r"(?<![A-Z])([A-Z]{3})(?![A-Z])", text)
-            matches += re.findall(r"(?<![A-Z])([A-Z]{2}\d)(?![A-Z])", text)
-
-            blacklist = blacklist_codes or {"MBS", "PDF", "EPS", 
-                                            "KKN", "CP", "QTR", 
-                                            "BCT", "KCN", "HNX", 
-                                            "HSX", "HOSE", "VNI", 
-                                            "VN30", "UPCOM", "USD", 
-                                            "VND", "VIX", "VNINDEX", 
-                                            "FY2", "FY1", "YTD", "MUA", "BÁN", "VNĐ", 
-                                            "NIM", "NPL", "IEA", "KHO", "BLĐ", "NII",
-                                            "PER", "ROE", "ROA", "P/B", "P/E", "PBR",
-                                            "CIR", "COV", "FDI"
-                                            }
-            tickers = [m for m in matches if m not in blacklist]
-
-            # Cross-check with valid_codes list if provided
-            if valid_codes:
-                tickers = [m for m in tickers if m in valid_codes]
-
-            if tickers:
-                sec_code = max(set(tickers), key=tickers.count)  # most frequent
-                logging.info(f"Detected sec_code '{sec_code}' in {pdf_path}")
-            else:
-                logging.warning(f"No valid sec_code found in {pdf_path}")
-                return []  # skip EPS extraction if no ticker detected
 
-        tables = camelot.read_pdf(pdf_path, pages="1-end", flavor="stream")
+    def __init__(self, name, strategies, min_years=2, max_rows=None, stop_when=None, with_digit_codes=True, sec_code_blacklist=None):
+        self.name = name
+        self.strategies = sorted(strategies, key=lambda strategy: strategy.cost)
+        self.min_years = min_years
+        self.max_rows = max_rows
+        self.stop_when = stop_when
+        self.with_digit_codes = with_digit_codes
+        self.sec_code_blacklist = sec_code_blacklist
 
-        for table in tables:
-            df = table.df
-
-            # Keep only columns with EPS or year patterns
-            cols_to_keep = [
-                col
-                for col in df.columns
-                if df[col].astype(str).apply(
-                    lambda x: bool(global_eps_pattern.search(x)) or bool(global_year_pattern.search(x))
-                ).any()
-            ]
-            if not cols_to_keep:
-                continue
 
-            df = df[cols_to_keep]
-            logging.info(f"After filtering, table has columns: {df.columns.tolist()}")
+def _covered_years(rows):
+    return len({row["clean_year"] for row in rows if _valid_year(row["clean_year"]) and row["eps"] is not None})
 
-            # Find EPS column
-            eps_col = next(
-                (col for col in df.columns if df[col].astype(str).apply(lambda x: bool(global_eps_pattern.search(x))).any()),
-                None,
-            )
-            if eps_col is None:
-                continue
 
-            # Drop columns before EPS
-            df = df.loc[:, df.columns[df.columns.get_loc(eps_col) :]]
-            logging.info(f"After EPS filtering, table has columns: {df.columns.tolist()}")
+class EpsEngine:
+    """
+    Run a LayoutProfile on a PDF. A strategy is an object with `name`, `cost` and
+    `rows(ctx)` yielding row dicts built with ExtractionContext.row, and END_OF_TABLE
+    after each table.
+    """
 
-            # Keep only rows that contain EPS or year
-            df = df[
-                df.astype(str).apply(
-                    lambda row: row.str.contains(global_eps_pattern).any()
-                    or row.str.contains(global_year_pattern).any(),
-                    axis=1,
+    def __init__(self, profile):
+        self.profile = profile
+
+    def _run_strategy(self, strategy, ctx):
+        """(rows, stopped_early) of one strategy; a strategy that raises finds nothing (see ctx.errors)."""
+        rows = []
+        try:
+            with profiling.stage(f"strategy.{strategy.name}"):
+                for row in strategy.rows(ctx):
+                    if row is END_OF_TABLE:
+                        if ctx.stop_when and ctx.stop_when(rows):
+                            logging.info(f"{self.profile.name}: {strategy.name} strategy satisfied {ctx.stop_when}, skipping the rest of {ctx.doc.pdf_path}")
+                            return rows, True
+                        continue
+                    rows.append(row)
+                    if self.profile.max_rows is not None and len(rows) >= self.profile.max_rows:
+                        break
+        except Exception as e:
+            logging.error(f"{self.profile.name}: {strategy.name} strategy failed on {ctx.doc.pdf_path}: {e}")
+            ctx.errors.append(f"{strategy.name}: {e}")
+            return [], False
+        return rows, False
+
+    def extract(self, pdf_path, report_date, valid_codes=None, blacklist_codes=None, url=None, firm=None, already_detected_sc=None, pdf_pages="1-end", prescan=True, early_exit=None, strict=False):
+        """
+        (parameter) pdf_pages: str
+        Comma-separated page numbers. Example: '1,3,4' or '1,4-end' or 'all'.
+        (parameter) prescan: bool
+        Only look at the pages whose text layer mentions EPS and a year header.
+        (parameter) early_exit: bool or ConfidenceRule
+        Stop reading tables once the rule holds (True: DEFAULT_CONFIDENCE). None uses the profile's default.
+        (parameter) strict: bool
+        Raise ExtractionFailed instead of returning [] (or an inconclusive result) when the
+        PDF could not be read or a strategy failed, so callers can tell "no EPS" from an error.
+        """
+        if not report_date:
+            return None
+        if early_exit is None:
+            stop_when = self.profile.stop_when
+        else:
+            stop_when = DEFAULT_CONFIDENCE if early_exit is True else early_exit or None
+        _, _, rep_year = parse_vietnamese_date(report_date)
+        rep_year = int(rep_year)
+
+        try:
+            doc = load_pdf(pdf_path)
+            with profiling.stage("sec_code_detection"):
+                sec_code = already_detected_sc or detect_sec_code(
+                    doc, valid_codes, blacklist_codes or self.profile.sec_code_blacklist,
+                    with_digit_codes=self.profile.with_digit_codes
                 )
-            ]
-            if df.empty:
-                logging.warning(f"No rows with EPS or year patterns found in table from {pdf_path}")
-                continue
+            if not sec_code:
+                return []  # skip EPS extraction if no ticker detected
+            if prescan:
+                with profiling.stage("eps_page_prescan"):
+                    pdf_pages = find_eps_pages(doc, pdf_pages)
+            ctx = ExtractionContext(doc, report_date, rep_year, sec_code, firm, url, pdf_pages, stop_when)
+        except Exception as e:
+            logging.error(f"Failed sec_code detection in {pdf_path}: {e}")
+            if strict:
+                raise ExtractionFailed(f"Failed sec_code detection in {pdf_path}: {e}") from e
+            return []
+
+        best, best_years = [], 0
+        for strategy in self.profile.strategies:
+            rows, stopped = self._run_strategy(strategy, ctx)
+            years = _covered_years(rows)
+            if stopped or years >= self.profile.min_years:
+                logging.info(f"{self.profile.name}: {strategy.name} strategy found {len(rows)} rows for {years} years in {pdf_path}")
+                return rows
+            if rows and (not best or years > best_years):
+                best, best_years = rows, years
+            logging.info(f"{self.profile.name}: {strategy.name} strategy not conclusive for {pdf_path} ({len(rows)} rows)")
+        if strict and ctx.errors:
+            raise ExtractionFailed(f"{self.profile.name} failed on {pdf_path}: {'; '.join(ctx.errors)}")
+        return best
+
+
+V5_BLACKLIST = {"MBS", "PDF", "EPS", "CP", "QTR", "BCT"}
+
+PROFILES = {
+    # Cheap strategies first, camelot only when they fail
+    "auto": LayoutProfile(
+        "auto", [TextLayerStrategy(), WordLayoutStrategy(), PlumberTableStrategy(), CamelotStreamStrategy()], stop_when=DEFAULT_CONFIDENCE
+    ),
+    "auto_mirra": LayoutProfile(
+        "auto_mirra", [TextLayerStrategy(), WordLayoutStrategy(), PlumberTableStrategy(), CamelotStreamStrategy()], min_years=1, max_rows=1
+    ),
+    # The versioned profiles read every table unless called with early_exit
+    "v5": LayoutProfile("v5", [PlumberTableStrategy()], with_digit_codes=False, sec_code_blacklist=V5_BLACKLIST),
+    "w_sc_v5": LayoutProfile("w_sc_v5", [PlumberTableStrategy(header_pattern=YEAR_OR_DATE_CELL_PATTERN)]),
+    "v6": LayoutProfile("v6", [CamelotStreamStrategy(strict_years=False)]),
+    "v6_mirra": LayoutProfile("v6_mirra", [CamelotStreamStrategy(strict_years=False, min_eps_length=0)], max_rows=1),
+    "v7": LayoutProfile("v7", [CamelotStreamStrategy()]),
+    "v7_mirra": LayoutProfile("v7_mirra", [CamelotStreamStrategy()], max_rows=1),
+    # v7 rows from the word boxes of the text layer, camelot only when they cover fewer than two years
+    "v8": LayoutProfile("v8", [WordLayoutStrategy(), CamelotStreamStrategy()]),
+}
+
+ENGINES = {name: EpsEngine(profile) for name, profile in PROFILES.items()}
+
+
+# V5 Scraping - cross validate
+def extract_clean_eps_w_sc_v5(pdf_path, report_date, sec_code):
+    if not validate_sec_code_in_pdf(pdf_path, sec_code):
+        logging.warning(f"SEC_CODE '{sec_code}' not found in {pdf_path}")
+        return None
+    return ENGINES["w_sc_v5"].extract(pdf_path, report_date, already_detected_sc=sec_code, prescan=False)
 
-            # Reset header (use first row as header)
-            header = df.iloc[0].tolist()
-            df = df[1:].reset_index(drop=True)
-            df.columns = header
 
-            logging.info(f"Filtered table:\n{df}")
+def extract_clean_eps_v5(pdf_path, report_date, valid_codes=None, blacklist_codes=None, url=None, firm=None, already_detected_sc=None, early_exit=None, strict=False):
+    """v5 always detects the sec_code itself (3 letter tickers only) and reads every page."""
+    return ENGINES["v5"].extract(pdf_path, report_date, valid_codes, blacklist_codes, url=url, firm=firm, prescan=False, early_exit=early_exit, strict=strict)
 
-            # Process EPS rows
-            for idx, row in df.iterrows():
-                logging.info(f"Processing row {idx}: {row.tolist()}")
-                # Check if EPS in the first column
-                if not any(re.search(r"\bEPS\b", str(c), re.IGNORECASE) for c in row):
-                    continue
-                # Extract EPS values
-                eps_values = row[1:].tolist()
-                for year, eps in zip(header[1:], eps_values):
-                    logging.info(f"Year: {year}, EPS: {eps}")
-                    
-                    try:
-                        clean_year = normalize_year(year)
-                        if not verify_four_digit_year(clean_year):
-                            logging.warning(f"Invalid year format for year '{year}' in row {idx}")
-                            clean_year = None
-                    except Exception as e:
-                        logging.warning(f"Failed to normalize year '{year}' in row {idx}: {e}")
-                        clean_year = None
-                    
-                    if len(eps) < 3:
-                        logging.warning(f"EPS value too short for year '{year}' in row {idx}: '{eps}'")
-                        continue
-                    
-                    if eps == "" or eps is None:
-                        logging.warning(f"Empty EPS value for year '{year}' in row {idx}")
-                        continue
-                    
-                    is_forecast = False
-                    try:
-                        if int(clean_year) >= rep_year:
-                            is_forecast = True
-                    except Exception as e:
-                        logging.warning(f"Invalid year format for year '{year}' in row {idx}: {e}")
-                        is_forecast = False
-                        clean_year = None
 
-                    final_results.append({
-                        "year": year,
-                        "clean_year": clean_year,
-                        "eps": clean_number(eps),
-                        "is_forecast": is_forecast,
-                        "report_date": report_date,
-                        "sec_code": sec_code,
-                        "firm": firm,
-                        "url": url + "  " # Space to avoid URL truncation in some DB viewers
-                    })
-                    return final_results
-        return final_results
+extract_clean_eps_v6 = ENGINES["v6"].extract
+extract_clean_eps_v6_mirra = ENGINES["v6_mirra"].extract
+extract_clean_eps_v7 = ENGINES["v7"].extract
+extract_clean_eps_v7_mirra = ENGINES["v7_mirra"].extract
+extract_clean_eps_v8 = ENGINES["v8"].extract
 
-    except Exception as e:
-        logging.error(f"Failed sec_code detection in {pdf_path}: {e}")
-        return []
\ No newline at end of file
+# Extractor versions addressable by name, e.g. from worker processes
+EXTRACTORS = {
+    "v5": extract_clean_eps_v5,
+    **{name: ENGINES[name].extract for name in ("auto", "auto_mirra", "v6", "v6_mirra", "v7", "v7_mirra", "v8")},
+}
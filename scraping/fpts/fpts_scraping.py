@@ -1,52 +1,42 @@
-import os
-import requests
 import logging
-import time
 from urllib.parse import urljoin
-from playwright.sync_api import sync_playwright
-import pandas as pd
 
-from scraping.eps_scraping_pdf import extract_clean_eps_v6
+from scraping.download_store import DEFAULT_STORE_DIR, get_store
+from scraping.downloader import get_downloader
+from scraping import waits
+from scraping.dom_extract import extract_items
+from scraping.pipeline import ExtractionPipeline, ExtractionJob, ResultSink
+from scraping.checkpoint import default_journal_path, get_journal
+from scraping.sharding import ClickPagination, run_sharded
 from scraping.utils.Utils import parse_vietnamese_date, extract_report_date, convert_vietnamese_charmonth_int, validate_sec_code
 
 ROOT_URL = "https://ezadvisorselect.fpts.com.vn"
 BASE_URL = "https://ezadvisorselect.fpts.com.vn/investmentadvisoryreport"
 DATE_RANGE = ""
 PAGE_PARAM = ""
+
+REPORT_ITEMS = "#tableGetReport #tablePaging > tr"
+# Read for every report row in one round trip
+REPORT_FIELDS = {
+    "sec_code": "td:first-child",
+    "report_date": "td:nth-child(3)",
+    "content_href": ("td:nth-child(2) a", "href"),
+}
         
-def scraping_fpts_all(download_dir="downloads", valid_codes=None, max_pages=20, start_page=1, output_dir="output/eps_rep_fpts.csv", blacklist_code=None, firm="FPTS"):
-    os.makedirs(download_dir, exist_ok=True)
+def scraping_fpts_all(download_dir="downloads", valid_codes=None, max_pages=20, start_page=1, output_dir="output/eps_rep_fpts.csv", blacklist_code=None, firm="FPTS", store_dir=DEFAULT_STORE_DIR, interactive=False, shards=1, checkpoint_path=None):
+    """download_dir is deprecated and ignored, reports are kept in the DownloadStore at store_dir."""
+    store = get_store(store_dir)
+    downloader = get_downloader(store_dir)
     
-    with sync_playwright() as p:
-        browser = p.chromium.launch(headless=False)
-        page = browser.new_page()
-        page.goto(BASE_URL, timeout=60000)
-        page.wait_for_load_state("domcontentloaded")
-
-        time.sleep(40)  # wait for 35 seconds to ensure the page is fully loaded after date range input
-        # Click outside to close the date picker
-                
-        for page_num in range(1, max_pages + 1):
-            
-            # Handle skip page from 1 to start_page
-            if page_num < start_page:
-                logging.info(f"Skipping page {page_num} to reach start_page {start_page}")
-                next_button = page.query_selector("a.page-link > a.backgroundNext")
-                next_button.click()
-                page.wait_for_load_state("domcontentloaded")
-                time.sleep(0.5)  # wait for 0.5 seconds to ensure the next page is loaded
-                continue
+    journal = get_journal(checkpoint_path or default_journal_path(output_dir))
+    
+    with ExtractionPipeline("v6", ResultSink(output_dir), journal=journal, valid_codes=valid_codes, blacklist_codes=blacklist_code) as pipeline:
 
-            # Navigate to the desired page
-            page.goto(f"{BASE_URL}?page={page_num}", timeout=60000)
-            page.wait_for_load_state("domcontentloaded")
-            logging.info(f"Loading page {page_num}")
-            
-            content = page.query_selector("#tableGetReport")
-            report_items = content.query_selector_all("#tablePaging > tr")  # Updated selector for FPTS
+        def crawl_page(page, page_num):
+            report_items = extract_items(page, REPORT_ITEMS, REPORT_FIELDS)
             if not report_items:
                 logging.info(f"No reports found on page {page_num}, stopping.")
-                continue
+                return
             logging.info(f"Found {len(report_items)} reports on page {page_num}")
             for idx, report_item in enumerate(report_items, start=1):
                 sec_code = None
@@ -55,21 +45,17 @@ def scraping_fpts_all(download_dir="downloads", valid_codes=None, max_pages=20,
                 
                 # Detect sec_code
                 try:
-                    sec_code_tag = report_item.query_selector("td:first-child")  # Assuming the first column contains the sec_code
-                    if sec_code_tag:
-                        sec_code = sec_code_tag.text_content().strip()
+                    if report_item["sec_code"] is not None:
+                        sec_code = report_item["sec_code"]
                         is_sec_code_tagged = True
                     else:
                         logging.warning(f"Could not find sec_code for report {idx} on page {page_num}, fallback to sec code tickets.")
 
-                    report_date_tag = report_item.query_selector("td:nth-child(3)")
-                    logging.info(report_date_tag)
-
-                    if not report_date_tag:
+                    if report_item["report_date"] is None:
                         logging.warning(f"Could not find report date for report {idx} on page {page_num}, skipping.")
                         continue
 
-                    report_date = report_date_tag.text_content().strip()
+                    report_date = report_item["report_date"]
                     # _, _, year = parse_vietnamese_date(report_date)
                     # logging.info(f"Extracted date: {report_date} (year: {year})")
                     # if year < 2019 or year > 2023:
@@ -85,61 +71,48 @@ def scraping_fpts_all(download_dir="downloads", valid_codes=None, max_pages=20,
                 local_path = None
                 pdf_url = None
                 try:
-                    content_link_tag = report_item.query_selector("td:nth-child(2) a")  # Assuming the PDF link is in the 2nd column
-                    
-                    # New tab popup handling
-                    with page.expect_popup() as popup_info:
-                        content_link_tag.click()
-                    new_page = popup_info.value
-                    new_page.wait_for_load_state("domcontentloaded")
-                    
-                    with new_page.expect_navigation() as popup_info2:
-                        new_page.click("#DownloadFile")  # Click the download button
-                    pdf_page = popup_info2.value
-                    pdf_url = pdf_page.url
-                    logging.info(f"Found PDF link for report {idx} on page {page_num}: {pdf_url}")
-                    filename = os.path.basename(pdf_url)
-                    local_path = os.path.join(download_dir, filename) + ".pdf"
-                    logging.info(f"Downloading PDF {pdf_url} -> {local_path}")
-                    response = requests.get(pdf_url)
-                    with open(local_path, "wb") as f:
-                        f.write(response.content)
+                    content_href = report_item["content_href"]
+                    content_url = urljoin(BASE_URL, content_href) if content_href else None
+
+                    # Reports downloaded by a previous run do not need their content page
+                    pdf_url = store.resolve(content_url)
+                    if journal.item_done(pdf_url):
+                        continue
+                    local_path = store.lookup(pdf_url)
+                    if local_path:
+                        logging.info(f"PDF already downloaded for report {idx} on page {page_num}: {pdf_url}")
+                    else:
+                        # New tab popup handling
+                        with page.expect_popup() as popup_info:
+                            page.locator(REPORT_ITEMS).nth(idx - 1).locator("td:nth-child(2) a").first.click()
+                        new_page = popup_info.value
+                        new_page.wait_for_load_state("domcontentloaded")
                         
-                    new_page.close()
-                    logging.info(f"Downloaded PDF {pdf_url} -> {local_path}")
+                        with new_page.expect_navigation() as popup_info2:
+                            new_page.click("#DownloadFile")  # Click the download button
+                        pdf_page = popup_info2.value
+                        pdf_url = pdf_page.url
+                        logging.info(f"Found PDF link for report {idx} on page {page_num}: {pdf_url}")
+                        local_path = downloader.submit(pdf_url)
+                        store.alias(content_url, pdf_url)
+                            
+                        new_page.close()
                     
                 except Exception as e:
                     logging.error(f"Error downloading PDF for report {idx} on page {page_num}: {e}")
                     continue
             
-                # # Extract EPS
-                try:
-                    eps_results = extract_clean_eps_v6(local_path, report_date, valid_codes=valid_codes, blacklist_codes=blacklist_code, firm=firm, url=pdf_url, already_detected_sc=sec_code)
-                    logging.info(f"Extracted {len(eps_results)} EPS entries from {local_path}")
-                    logging.info(f"EPS Results: {eps_results}")
-                    if not eps_results:
-                        logging.info(f"No EPS data extracted from {local_path}")
-                        continue
-                    
-                    result_df = pd.DataFrame(eps_results)
-                    result_df["sc_tag"] = is_sec_code_tagged
-                    result_df["file_name"] = local_path
-                    os.makedirs("output", exist_ok=True)
-                    if not os.path.exists(output_dir):
-                        result_df.to_csv(output_dir, index=False)
-                        logging.info(f"Results saved to {output_dir}")
-                    else:
-                        result_df.to_csv(output_dir, mode="a", header=False, index=False)
-                        logging.info(f"Results appended to {output_dir}")
-
-                except Exception as e:
-                    logging.error(f"Error processing report {idx} on page {page_num}: {e}")
-                    continue
-                
-            page.wait_for_load_state("domcontentloaded")
-            next_button = page.query_selector("a.page-link > a.backgroundNext")
-            next_button.click()
-            page.wait_for_load_state("domcontentloaded")
-            time.sleep(3)  # wait for 3 seconds to ensure the next page is loaded
+                # Queue EPS extraction, workers parse the PDF while the crawler moves on
+                pipeline.submit(ExtractionJob(local_path, report_date, sec_code, firm, pdf_url, {"sc_tag": is_sec_code_tagged, "file_name": local_path}, page=page_num))
 
-        browser.close()
+        # Paging with the next button keeps the date range set by the operator, a ?page= url resets it
+        pagination = ClickPagination(
+            BASE_URL, "#tablePaging", "a.page-link > a.backgroundNext", name="fpts", ready_selector="#tablePaging > tr",
+            on_open=(lambda page: waits.wait_for_operator("Set the date range in the browser.")) if interactive else None,
+            max_timeout=60000
+        )
+        run_sharded(
+            crawl_page, pagination, start_page, max_pages,
+            shards=shards, journal=journal, headless=False
+        )
+        waits.log_wait_stats()
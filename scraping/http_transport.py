@@ -0,0 +1,111 @@
+from contextlib import contextmanager
+
+from scraping import profiling, replay
+from scraping.dom_extract import extract_items, extract_items_html
+
+# Listing transports. Most brokers render their report listings on the server, so the
+# pages can be fetched with plain pooled HTTP and parsed without a browser (HttpTransport);
+# BrowserTransport offers the same operations through Playwright for listings that need
+# JavaScript. A scraper written against `items` / `first` runs on either one, see
+# open_transport. MBS, PSI, KBVS and YSVN default to HTTP; AGR keeps the browser because
+# its date filter and pagination run client side.
+
+TRANSPORTS = ("http", "browser")
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+DEFAULT_POOL_SIZE = 8
+
+
+class HttpTransport:
+    """
+    Listing pages over a pooled requests session (keep-alive, retries with backoff on
+    429/5xx), parsed with extract_items_html. Recorded and replayed like the rest of the
+    crawl (see scraping.replay). Safe to share between threads.
+    """
+
+    def __init__(self, pool_size=DEFAULT_POOL_SIZE, retries=3, backoff=1.0, timeout=60, headers=None):
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+
+        self.timeout = timeout
+        self._session = requests.Session()
+        self._session.headers.update(headers or {"User-Agent": "Mozilla/5.0"})
+        retry = Retry(total=retries, backoff_factor=backoff, status_forcelist=RETRY_STATUSES, allowed_methods=["GET"])
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+
+    def get(self, url):
+        """Text of the page at `url`."""
+        with profiling.stage("navigation"):
+            response = self._session.get(replay.request_url(url), timeout=self.timeout)
+        replay.record(url, response.status_code, response.headers, content=response.content)
+        response.raise_for_status()
+        profiling.count("http_transport.bytes", len(response.content))
+        return response.text
+
+    def items(self, url, item_selector, fields):
+        """extract_items on the page at `url`."""
+        return extract_items_html(self.get(url), item_selector, fields)
+
+    def first(self, url, selector, attribute="href"):
+        """`attribute` of the first element matching `selector` on the page at `url`, or None."""
+        found = extract_items_html(self.get(url), "html", {"value": (selector, attribute)})
+        return found[0]["value"] if found else None
+
+    def close(self):
+        self._session.close()
+
+
+class BrowserTransport:
+    """The HttpTransport operations through a Playwright browser, for listings rendered by JavaScript."""
+
+    def __init__(self, browser, wait_until="networkidle", timeout=60000):
+        self._browser = browser
+        # The listing page items() last loaded, for scrapers that click its download links
+        self.page = browser.new_page()
+        self.wait_until = wait_until
+        self.timeout = timeout
+
+    def _open(self, page, url):
+        with profiling.stage("navigation"):
+            page.goto(url, timeout=self.timeout)
+            page.wait_for_load_state(self.wait_until)
+
+    def items(self, url, item_selector, fields):
+        self._open(self.page, url)
+        return extract_items(self.page, item_selector, fields)
+
+    def first(self, url, selector, attribute="href"):
+        page = self._browser.new_page()
+        try:
+            self._open(page, url)
+            found = extract_items(page, "html", {"value": (selector, attribute)})
+            return found[0]["value"] if found else None
+        finally:
+            page.close()
+
+    def close(self):
+        self._browser.close()
+
+
+@contextmanager
+def open_transport(kind="http", headless=True, **kwargs):
+    """HttpTransport for "http", BrowserTransport on a fresh Chromium for "browser"."""
+    if kind not in TRANSPORTS:
+        raise ValueError(f"Unknown transport '{kind}', expected one of {TRANSPORTS}")
+    if kind == "http":
+        transport = HttpTransport(**kwargs)
+        try:
+            yield transport
+        finally:
+            transport.close()
+        return
+
+    from playwright.sync_api import sync_playwright
+    with sync_playwright() as p:
+        transport = BrowserTransport(replay.launch(p.chromium, headless=headless), **kwargs)
+        try:
+            yield transport
+        finally:
+            transport.close()
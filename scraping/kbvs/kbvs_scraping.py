@@ -1,32 +1,48 @@
-import os
-import requests
 import logging
 from urllib.parse import urljoin
-from playwright.sync_api import sync_playwright
-import pandas as pd
 
-from scraping.eps_scraping_pdf import extract_clean_eps_v6
+from scraping.download_store import DEFAULT_STORE_DIR, get_store
+from scraping.downloader import get_downloader
+from scraping.dom_extract import Field
+from scraping.http_transport import open_transport
+from scraping.pipeline import ExtractionPipeline, ExtractionJob, ResultSink
+from scraping.checkpoint import default_journal_path, get_journal
 from scraping.utils.Utils import parse_vietnamese_date, extract_report_date
 
 BASE_URL = "https://www.kbsec.com.vn/vi/bao-cao-cong-ty/p-24.htm"
 # DATE_RANGE = "&fromdate=01%2F01%2F2019&todate=31%2F12%2F2023"
 # PAGE_PARAM = "&post_page="
 
-def scraping_kbvs_all(download_dir="downloads", valid_codes=None, max_pages=20, start_page=1, output_dir="output/eps_rep_kbvs.csv", blacklist_code=None, firm="KBVS"):
-    os.makedirs(download_dir, exist_ok=True)
+REPORT_ITEMS = "div.itemNews div.item"
+# Read for every report card in one round trip, the download is its last link
+REPORT_FIELDS = {
+    "report_date": "span.date",
+    "pdf_href": Field("a", "href", nth=-1),
+}
+
+def scraping_kbvs_all(download_dir="downloads", valid_codes=None, max_pages=20, start_page=1, output_dir="output/eps_rep_kbvs.csv", blacklist_code=None, firm="KBVS", store_dir=DEFAULT_STORE_DIR, checkpoint_path=None, transport="browser"):
+    """
+    Crawl the KBVS listing. With the default transport="browser" each report is fetched by
+    clicking its link, as the site serves it. transport="http" reads the listing over plain
+    HTTP and fetches the link's href with the Downloader; that path has not been checked
+    against the live site yet, a non PDF response fails the report instead of being stored.
+    """
+    store = get_store(store_dir)
+    downloader = get_downloader(store_dir)
+    
+    journal = get_journal(checkpoint_path or default_journal_path(output_dir))
+    done_pages = journal.done_pages()
     
-    with sync_playwright() as p:
-        browser = p.chromium.launch(headless=True)
-        page = browser.new_page()
+    with open_transport(transport) as source, ExtractionPipeline("v6", ResultSink(output_dir), journal=journal, valid_codes=valid_codes, blacklist_codes=blacklist_code) as pipeline:
 
         for page_num in range(start_page, max_pages + 1):
+            if page_num in done_pages:
+                logging.info(f"Page {page_num} already done, skipping.")
+                continue
             url = f"https://www.kbsec.com.vn/vi/bao-cao-cong-ty/p-{page_num}.htm"
             logging.info(f"Loading page {page_num}: {url}")
-            page.goto(url, timeout=60000)
-            page.wait_for_load_state("networkidle")
 
-            content = page.query_selector("div.itemNews")
-            report_items = content.query_selector_all("div.item")
+            report_items = source.items(url, REPORT_ITEMS, REPORT_FIELDS)
             if not report_items:
                 logging.info(f"No reports found on page {page_num}, stopping.")
                 continue
@@ -38,20 +54,13 @@ def scraping_kbvs_all(download_dir="downloads", valid_codes=None, max_pages=20,
                 
                 # Detect sec_code
                 try:
-                    sec_code_tag = None
-                    report_date_tag = report_item.query_selector("span.date")
-
-                    if sec_code_tag:
-                        sec_code = sec_code_tag.text_content().strip().upper()
-                        is_sec_code_tagged = True
-                    else:
-                        logging.warning(f"Could not find sec_code for report {idx} on page {page_num}, fallback to sec code tickets.")
+                    logging.warning(f"Could not find sec_code for report {idx} on page {page_num}, fallback to sec code tickets.")
 
-                    if not report_date_tag:
+                    if report_item["report_date"] is None:
                         logging.warning(f"Could not find report date for report {idx} on page {page_num}, skipping.")
                         continue
 
-                    report_date = extract_report_date(report_date_tag.text_content().strip().replace("(", "").replace(")", ""))
+                    report_date = extract_report_date(report_item["report_date"].replace("(", "").replace(")", ""))
                     logging.info(f"[Page {page_num} - Report {idx}] {sec_code} ({report_date})")
                 
                 except Exception as e:
@@ -61,51 +70,31 @@ def scraping_kbvs_all(download_dir="downloads", valid_codes=None, max_pages=20,
                 local_path = None
                 pdf_url = None
                 try:
-                    pdf_link_tag = report_item.query_selector_all("a")[-1]
-                    pdf_url = urljoin(BASE_URL, pdf_link_tag.get_attribute("href"))
-                    if not pdf_link_tag:
+                    if report_item["pdf_href"] is None:
                         logging.warning(f"No PDF link in report {idx} on page {page_num}, skipping.")
                         continue
+                    pdf_url = urljoin(BASE_URL, report_item["pdf_href"])
 
                     logging.info(f"Found PDF link for report {idx} on page {page_num}")
 
-                    # Use Playwright download API
-                    with page.expect_download() as download_info:
-                        pdf_link_tag.click()   # triggers the download
-                    download = download_info.value
-
-                    # Playwright suggests the real filename (from server headers)
-                    filename = download.suggested_filename
-                    local_path = os.path.join(download_dir, filename)
-
-                    logging.info(f"Saving PDF -> {local_path}")
-                    download.save_as(local_path)
+                    if journal.item_done(pdf_url):
+                        continue
+                    local_path = store.lookup(pdf_url)
+                    if local_path:
+                        logging.info(f"PDF already downloaded: {pdf_url} -> {local_path}")
+                    elif transport == "browser":
+                        link = source.page.locator(REPORT_ITEMS).nth(idx - 1).locator("a").last
+                        with source.page.expect_download() as download_info:
+                            link.click()   # triggers the download
+                        local_path = store.save_download(pdf_url, download_info.value, staging_dir=download_dir)
+                    else:
+                        local_path = downloader.submit(pdf_url)
 
                 except Exception as e:
                     logging.error(f"Error downloading PDF for report {idx} on page {page_num}: {e}")
                     continue
             
-                # Extract EPS
-                try:
-                    eps_results = extract_clean_eps_v6(local_path, report_date, valid_codes=valid_codes, blacklist_codes=blacklist_code, firm=firm, url=pdf_url, already_detected_sc=sec_code)
-                    logging.info(f"Extracted {len(eps_results)} EPS entries from {local_path}")
-                    logging.info(f"EPS Results: {eps_results}")
-                    if not eps_results:
-                        logging.info(f"No EPS data extracted from {local_path}")
-                        continue
-                    
-                    result_df = pd.DataFrame(eps_results)
-                    result_df["sc_tag"] = is_sec_code_tagged
-                    os.makedirs("output", exist_ok=True)
-                    if not os.path.exists(output_dir):
-                        result_df.to_csv(output_dir, index=False)
-                        logging.info(f"Results saved to {output_dir}")
-                    else:
-                        result_df.to_csv(output_dir, mode="a", header=False, index=False)
-                        logging.info(f"Results appended to {output_dir}")
+                # Queue EPS extraction, workers parse the PDF while the crawler moves on
+                pipeline.submit(ExtractionJob(local_path, report_date, sec_code, firm, pdf_url, {"sc_tag": is_sec_code_tagged}, page=page_num))
 
-                except Exception as e:
-                    logging.error(f"Error processing report {idx} on page {page_num}: {e}")
-                    continue
-                
-        browser.close()
+            journal.mark_page(page_num)
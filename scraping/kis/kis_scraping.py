@@ -1,13 +1,14 @@
-import os
 import re
-import requests
 import logging
 import time
 from urllib.parse import urljoin
 from playwright.sync_api import sync_playwright
-import pandas as pd
 
-from scraping.eps_scraping_pdf import extract_clean_eps_v7
+from scraping.download_store import DEFAULT_STORE_DIR, get_store
+from scraping import profiling, replay
+from scraping.dom_extract import extract_items
+from scraping.pipeline import ExtractionPipeline, ExtractionJob, ResultSink
+from scraping.checkpoint import default_journal_path, get_journal
 from scraping.utils.Utils import parse_vietnamese_date, extract_report_date, convert_vietnamese_charmonth_int, validate_sec_code
 
 ROOT_URL = "https://kisvn.vn"
@@ -15,21 +16,33 @@ BASE_URL = "https://kisvn.vn/article-category/bao-cao-doanh-nghiep/page/"
 DATE_RANGE = ""
 PAGE_PARAM = ""
 
-def scraping_kis_all(download_dir="downloads", valid_codes=None, max_pages=20, start_page=1, output_dir="output/eps_rep_kis.csv", blacklist_code=None, firm="SSV"):
-    os.makedirs(download_dir, exist_ok=True)
+REPORT_ITEMS = "div.primary > article"
+# Read for every article in one round trip
+REPORT_FIELDS = {
+    "title": "h2.title",
+    "day": "p.day",
+    "month": "p.month",
+    "pdf_href": ("a.btn-download", "href"),
+}
+
+def scraping_kis_all(download_dir="downloads", valid_codes=None, max_pages=20, start_page=1, output_dir="output/eps_rep_kis.csv", blacklist_code=None, firm="SSV", store_dir=DEFAULT_STORE_DIR, checkpoint_path=None):
+    store = get_store(store_dir)
     last_year: int = 2023
     last_month: int = None
     
-    with sync_playwright() as p:
-        browser = p.chromium.launch(headless=True)
+    journal = get_journal(checkpoint_path or default_journal_path(output_dir))
+    
+    with sync_playwright() as p, ExtractionPipeline("v7", ResultSink(output_dir), journal=journal, valid_codes=valid_codes, blacklist_codes=blacklist_code) as pipeline:
+        browser = replay.launch(p.chromium, headless=True)
         page = browser.new_page() 
         
         for page_num in range(start_page, max_pages + 1):
             url = f"{BASE_URL}{page_num}"
             logging.info(f"Loading page {page_num}: {url}")
-            page.goto(url, timeout=60000)
+            with profiling.stage("navigation"):
+                page.goto(url, timeout=60000)
 
-            report_items = page.query_selector_all("div.primary > article")  # Updated selector for KIS
+            report_items = extract_items(page, REPORT_ITEMS, REPORT_FIELDS)
             if not report_items:
                 logging.info(f"No reports found on page {page_num}, stopping.")
                 continue
@@ -41,14 +54,14 @@ def scraping_kis_all(download_dir="downloads", valid_codes=None, max_pages=20, s
                 
                 # Detect sec_code
                 try:
-                    sec_code_tag = report_item.query_selector("h2.title")
-                    date = report_item.query_selector("p.day")
-                    month = report_item.query_selector("p.month")
-                    logging.info(f"Report {idx} title: {sec_code_tag.text_content().strip() if sec_code_tag else 'N/A'}")
-                    logging.info(f"Extracted date: {date.text_content().strip() if date else 'N/A'}, month: {month.text_content().strip() if month else 'N/A'}")
-
-                    if sec_code_tag:
-                        sec_code = sec_code_tag.text_content().strip()[:3] # Get first 3 characters as sec_code
+                    title = report_item["title"]
+                    date = report_item["day"]
+                    month = report_item["month"]
+                    logging.info(f"Report {idx} title: {title if title is not None else 'N/A'}")
+                    logging.info(f"Extracted date: {date if date is not None else 'N/A'}, month: {month if month is not None else 'N/A'}")
+
+                    if title is not None:
+                        sec_code = title[:3] # Get first 3 characters as sec_code
                         if validate_sec_code(sec_code):
                             logging.info(f"Detected sec_code '{sec_code}' in report {idx} on page {page_num}")
                             is_sec_code_tagged = True
@@ -59,11 +72,11 @@ def scraping_kis_all(download_dir="downloads", valid_codes=None, max_pages=20, s
                     else:
                         logging.warning(f"Could not find sec_code for report {idx} on page {page_num}, fallback to sec code tickets.")
 
-                    if not date and not month:
+                    if date is None and month is None:
                         logging.warning(f"Could not find report date for report {idx} on page {page_num}, skipping.")
                         continue
                     
-                    month = str(convert_vietnamese_charmonth_int(month.text_content().strip()))
+                    month = str(convert_vietnamese_charmonth_int(month))
                     if last_month is None:
                         last_month = int(month)
                     elif int(month) > last_month:
@@ -72,7 +85,7 @@ def scraping_kis_all(download_dir="downloads", valid_codes=None, max_pages=20, s
                     else:
                         last_month = int(month)
                     
-                    report_date = f"{date.text_content().strip()}/{month}/{str(last_year)}"
+                    report_date = f"{date}/{month}/{str(last_year)}"
                     logging.info(f"[Page {page_num} - Report {idx}] {sec_code} ({report_date})")
                     
                 except Exception as e:
@@ -124,51 +137,31 @@ def scraping_kis_all(download_dir="downloads", valid_codes=None, max_pages=20, s
                 local_path = None
                 pdf_url = None
                 try:
-                    pdf_link_tag = report_item.query_selector("a.btn-download")
-                    pdf_url = urljoin(BASE_URL, pdf_link_tag.get_attribute("href"))
-                    if not pdf_link_tag:
+                    if report_item["pdf_href"] is None:
                         logging.warning(f"No PDF link in report {idx} on page {page_num}, skipping.")
                         continue
+                    pdf_url = urljoin(BASE_URL, report_item["pdf_href"])
 
                     logging.info(f"Found PDF link for report {idx} on page {page_num}")
 
-                    # Use Playwright download API
-                    with page.expect_download() as download_info:
-                        pdf_link_tag.click()   # triggers the download
-                    download = download_info.value
-
-                    # Playwright suggests the real filename (from server headers)
-                    filename = download.suggested_filename
-                    local_path = os.path.join(download_dir, filename)
-
-                    logging.info(f"Saving PDF -> {local_path}")
-                    download.save_as(local_path)
+                    if journal.item_done(pdf_url):
+                        continue
+                    local_path = store.lookup(pdf_url)
+                    if local_path:
+                        logging.info(f"PDF already downloaded: {pdf_url} -> {local_path}")
+                    else:
+                        # Use Playwright download API
+                        with page.expect_download() as download_info:
+                            page.locator(REPORT_ITEMS).nth(idx - 1).locator("a.btn-download").first.click()   # triggers the download
+                        local_path = store.save_download(pdf_url, download_info.value, staging_dir=download_dir)
 
                 except Exception as e:
                     logging.error(f"Error downloading PDF for report {idx} on page {page_num}: {e}")
                     continue
                 
-                # Extract EPS
-                try:
-                    eps_results = extract_clean_eps_v7(local_path, report_date, valid_codes=valid_codes, blacklist_codes=blacklist_code, firm=firm, url=pdf_url, already_detected_sc=sec_code)
-                    logging.info(f"Extracted {len(eps_results)} EPS entries from {local_path}")
-                    logging.info(f"EPS Results: {eps_results}")
-                    if not eps_results:
-                        logging.info(f"No EPS data extracted from {local_path}")
-                        continue
-                    
-                    result_df = pd.DataFrame(eps_results)
-                    result_df["sc_tag"] = is_sec_code_tagged
-                    os.makedirs("output", exist_ok=True)
-                    if not os.path.exists(output_dir):
-                        result_df.to_csv(output_dir, index=False)
-                        logging.info(f"Results saved to {output_dir}")
-                    else:
-                        result_df.to_csv(output_dir, mode="a", header=False, index=False)
-                        logging.info(f"Results appended to {output_dir}")
+                # Queue EPS extraction, workers parse the PDF while the crawler moves on
+                pipeline.submit(ExtractionJob(local_path, report_date, sec_code, firm, pdf_url, {"sc_tag": is_sec_code_tagged}, page=page_num))
 
-                except Exception as e:
-                    logging.error(f"Error processing report {idx} on page {page_num}: {e}")
-                    continue
+            journal.mark_page(page_num)
                 
         browser.close()
@@ -1,12 +1,14 @@
-import os
-import requests
 import logging
-import time
 from urllib.parse import urljoin
 from playwright.sync_api import sync_playwright
-import pandas as pd
 
-from scraping.eps_scraping_pdf import extract_clean_eps_v7_mirra
+from scraping.download_store import DEFAULT_STORE_DIR
+from scraping.downloader import get_downloader
+from scraping import waits
+from scraping import profiling, replay
+from scraping.dom_extract import extract_items
+from scraping.pipeline import ExtractionPipeline, ExtractionJob, ResultSink
+from scraping.checkpoint import default_journal_path, get_journal
 from scraping.utils.Utils import parse_vietnamese_date, extract_report_date, convert_vietnamese_charmonth_int, validate_sec_code
 
 ROOT_URL = "https://masvn.com"
@@ -14,21 +16,31 @@ BASE_URL = "https://masvn.com/cate/nganh-doanh-nghiep-56"
 DATE_RANGE = ""
 PAGE_PARAM = ""
 
-def scraping_mirra_all(download_dir="downloads", valid_codes=None, max_pages=20, start_page=1, output_dir="output/eps_rep_mirra.csv", blacklist_code=None, firm="MirraAsset"):
-    os.makedirs(download_dir, exist_ok=True)
+REPORT_ITEMS = "div.news__latest div.news__article.hover-line"
+# Read for every article in one round trip
+REPORT_FIELDS = {
+    "report_date": "span",
+    "pdf_href": ("a", "href"),
+}
+
+def scraping_mirra_all(download_dir="downloads", valid_codes=None, max_pages=20, start_page=1, output_dir="output/eps_rep_mirra.csv", blacklist_code=None, firm="MirraAsset", store_dir=DEFAULT_STORE_DIR, checkpoint_path=None):
+    """download_dir is deprecated and ignored, reports are kept in the DownloadStore at store_dir."""
+    downloader = get_downloader(store_dir)
+    
+    journal = get_journal(checkpoint_path or default_journal_path(output_dir))
     
-    with sync_playwright() as p:
-        browser = p.chromium.launch(headless=False)
+    with sync_playwright() as p, ExtractionPipeline("v7_mirra", ResultSink(output_dir), journal=journal, valid_codes=valid_codes, blacklist_codes=blacklist_code) as pipeline:
+        browser = replay.launch(p.chromium, headless=False)
         page = browser.new_page()
-        page.goto(BASE_URL, timeout=60000)
-        page.wait_for_load_state("domcontentloaded")
+        with profiling.stage("navigation"):
+            page.goto(BASE_URL, timeout=60000)
+            page.wait_for_load_state("domcontentloaded")
 
         for page_num in range(start_page, max_pages + 1):
             page.wait_for_load_state("domcontentloaded")
             logging.info(f"Loading page {page_num}")
             
-            content = page.query_selector("div.news__latest")
-            report_items = content.query_selector_all("div.news__article.hover-line")  # Updated selector for BVS
+            report_items = extract_items(page, REPORT_ITEMS, REPORT_FIELDS)
             if not report_items:
                 logging.info(f"No reports found on page {page_num}, stopping.")
                 continue
@@ -41,20 +53,13 @@ def scraping_mirra_all(download_dir="downloads", valid_codes=None, max_pages=20,
                 
                 # Detect sec_code
                 try:
-                    sec_code_tag = None
-                    report_date_tag = report_item.query_selector("span")
-                    
-                    if sec_code_tag:
-                        sec_code = sec_code_tag.text_content().strip()[:3] # Get first 3 characters as sec_code
-                        is_sec_code_tagged = True
-                    else:
-                        logging.warning(f"Could not find sec_code for report {idx} on page {page_num}, fallback to sec code tickets.")
+                    logging.warning(f"Could not find sec_code for report {idx} on page {page_num}, fallback to sec code tickets.")
 
-                    if not report_date_tag:
+                    if report_item["report_date"] is None:
                         logging.warning(f"Could not find report date for report {idx} on page {page_num}, skipping.")
                         continue
 
-                    report_date = report_date_tag.text_content().strip().replace(" Thg ", "/").replace(" ", "/")
+                    report_date = report_item["report_date"].replace(" Thg ", "/").replace(" ", "/")
                     _, _, year = parse_vietnamese_date(report_date)
                     # if year > 2023 or year < 2018:
                     #     logging.warning(f"Report date '{report_date}' for report {idx} on page {page_num} is out of range, skipping.")
@@ -96,47 +101,24 @@ def scraping_mirra_all(download_dir="downloads", valid_codes=None, max_pages=20,
                                 # Get pdf link and download
                 local_path = None
                 try:
-                    pdf_link_tag = report_item.query_selector("a")
-                    if not pdf_link_tag:
+                    if report_item["pdf_href"] is None:
                         logging.warning(f"No PDF link in report {idx} on page {page_num}, skipping.")
                         continue
                     logging.info(f"Found PDF link for report {idx} on page {page_num}")
                     
-                    pdf_url = urljoin(BASE_URL, pdf_link_tag.get_attribute("href"))
-                    filename = os.path.basename(pdf_url)
-                    local_path = os.path.join(download_dir, filename)
-                    logging.info(f"Downloading PDF {pdf_url} -> {local_path}")
-                    response = requests.get(pdf_url)
-                    with open(local_path, "wb") as f:
-                        f.write(response.content)
+                    pdf_url = urljoin(BASE_URL, report_item["pdf_href"])
+                    if journal.item_done(pdf_url):
+                        continue
+                    local_path = downloader.submit(pdf_url)
 
                 except Exception as e:
                     logging.error(f"Error finding PDF link for report {idx} on page {page_num}: {e}")
                     continue
             
-                # # Extract EPS
-                try:
-                    eps_results = extract_clean_eps_v7_mirra(local_path, report_date, valid_codes=valid_codes, blacklist_codes=blacklist_code, firm=firm, url=pdf_url, already_detected_sc=sec_code)
-                    logging.info(f"Extracted {len(eps_results)} EPS entries from {local_path}")
-                    logging.info(f"EPS Results: {eps_results}")
-                    if not eps_results:
-                        logging.info(f"No EPS data extracted from {local_path}")
-                        continue
-                    
-                    result_df = pd.DataFrame(eps_results)
-                    result_df["sc_tag"] = is_sec_code_tagged
-                    result_df["file_name"] = local_path
-                    os.makedirs("output", exist_ok=True)
-                    if not os.path.exists(output_dir):
-                        result_df.to_csv(output_dir, index=False)
-                        logging.info(f"Results saved to {output_dir}")
-                    else:
-                        result_df.to_csv(output_dir, mode="a", header=False, index=False)
-                        logging.info(f"Results appended to {output_dir}")
+                # Queue EPS extraction, workers parse the PDF while the crawler moves on
+                pipeline.submit(ExtractionJob(local_path, report_date, sec_code, firm, pdf_url, {"sc_tag": is_sec_code_tagged, "file_name": local_path}, page=page_num))
 
-                except Exception as e:
-                    logging.error(f"Error processing report {idx} on page {page_num}: {e}")
-                    continue
+            journal.mark_page(page_num)
                 
             # page.wait_for_load_state("domcontentloaded")
             # next_button = page.query_selector("button.btn.btn-outline-primary.btnNext")
@@ -152,7 +134,7 @@ def scraping_mirra_all(download_dir="downloads", valid_codes=None, max_pages=20,
                 }
             """)
             page.click("a.mgt--60.btn.btn--more.learn-more")
-            page.wait_for_load_state("domcontentloaded")
-            time.sleep(1)  # wait for 3 seconds to ensure the next page is loaded
+            waits.wait_for_selector(page, "div.news__latest div.news__article.hover-line", state="attached", name="mirra.load_more")
 
         browser.close()
+        waits.log_wait_stats()
@@ -0,0 +1,81 @@
+import re
+
+# Regexes shared by the PDF extractors and scraping.utils.Utils, compiled once at import.
+
+# --- Year labels ---
+# Table header cell that names a (forecast) year: 2024E, 2024F, Dec-24, 31/12/2024, FY24, FY2024E, F*24
+YEAR_LABEL_PATTERN = re.compile(
+    r"\d{4}(?:E|F)|(?:Dec)[- ]?\d{2}|31/12/\d{2,4}|FY\d{2,4}[EF]?|F\*\d{2,4}",
+    re.IGNORECASE
+)
+# Header row of the v5 extractors, the year labels above matched case sensitively
+YEAR_HEADER_CELL_PATTERN = re.compile(r"\d{4}(?:E|F)|(?:Dec)[- ]?\d{2}|31/12/\d{2,4}|FY\d{2,4}[EF]?")
+# Header row of the v4 style extractors: any 4 digit year, month-yy or dd/mm/yyyy date
+YEAR_OR_DATE_CELL_PATTERN = re.compile(r"\d{4}|(?:Dec|Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov)[- ]?\d{2}|\d{1,2}/\d{1,2}/\d{4}")
+# Year labels in the flattened text of a table
+FLAT_YEAR_PATTERN = re.compile(r"(?:\d{4}(?:E|F)?)|(?:\w{3}-\d{2})|(?:F\*\d{2,4})|(?:31/12/\d{4})")
+FOUR_DIGIT_YEAR_PATTERN = re.compile(r"^\d{4}$")
+# Year labels in a line of page text: 2023, 2024F, FY24E, Dec-24, 31/12/2024, F*24
+TEXT_YEAR_LABEL_PATTERN = re.compile(
+    r"(?<![\d.,])(?:(?:19|20)\d{2}[AEF]?|FY\d{2,4}[AEF]?|Dec[- ]?\d{2}|31/12/\d{2,4}|F\*\d{2,4})(?![\d.,])",
+    re.IGNORECASE
+)
+
+# Single pass tokenizer behind normalize_year. The first run of four digits anywhere wins
+# (2018F, FY2022E, 31/12/2022); only without one are the short forms tried at the start:
+# 31/12/22, FY22, Dec-21 (any month) and F*22 / F22.
+YEAR_TOKEN_PATTERN = re.compile(
+    r"(?P<year>\d{4})"
+    r"|^(?!.*\d{4})(?:"
+    r"31/12/(?P<dmy>\d{2,4})"
+    r"|(?i:FY)(?P<fy>\d{2,4})"
+    r"|(?i:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)[- ]?(?P<month>\d{2})"
+    r"|F\*?(?P<f>\d{2})"
+    r")",
+    re.DOTALL
+)
+
+# --- EPS labels ---
+# Cell starting with EPS, used to pick the EPS column of a camelot table
+EPS_LABEL_PATTERN = re.compile(r"^\s*EPS\b", re.IGNORECASE)
+# EPS label anywhere in a cell, used to pick the EPS rows of a table
+EPS_WORD_PATTERN = re.compile(r"\bEPS\b", re.IGNORECASE)
+# Text-layer prescan: a page is worth sending to camelot only if it mentions EPS and a year header
+EPS_PAGE_PATTERN = re.compile(r"\bEPS\b|Lãi cơ bản trên cổ phiếu", re.IGNORECASE)
+# EPS label followed by its values in the flattened text of a table
+FLAT_EPS_VALUES_PATTERN = re.compile(r"(?:EPS|Lãi cơ bản trên cổ phiếu)[^\d]*(\d[\d\., ]+)+", re.IGNORECASE)
+# Line of page text starting with the EPS label
+EPS_LINE_PATTERN = re.compile(r"^\s*(?:EPS|Lãi cơ bản trên cổ phiếu)\b[^\d\n]*", re.IGNORECASE)
+# Number in a line of page text: 3,679 / 3.679 / -1,234 / (1,234)
+NUMBER_PATTERN = re.compile(r"\(?-?\d[\d.,]*\)?")
+# Word that starts another row label (two or more letters), ending the values of an EPS row; n/a is a value
+LABEL_WORD_PATTERN = re.compile(r"^(?!n/?a$)[^\W\d_]{2,}", re.IGNORECASE)
+WHITESPACE_PATTERN = re.compile(r"\s+")
+
+# --- Tickers ---
+# Standalone 3 letter ticker, or 2 letters and a digit
+TICKER_PATTERN = re.compile(r"(?<![A-Z])([A-Z]{3})(?![A-Z])")
+TICKER_WITH_DIGIT_PATTERN = re.compile(r"(?<![A-Z])([A-Z]{2}\d)(?![A-Z])")
+# Report titles: the digit code may be followed by letters but not by more digits
+TITLE_TICKER_WITH_DIGIT_PATTERN = re.compile(r"(?<![A-Z])([A-Z]{2}\d)(?![1-9])")
+VALID_TICKER_PATTERN = re.compile(r"^[A-Z]{3}$|^[A-Z]{2}\d$")
+TICKER_NOISE_PATTERN = re.compile(r"[?.,\-_ ]")
+# Ticker shaped words that are not tickers: the broker, exchanges and indices, currencies,
+# financial ratios and Vietnamese words. Used for PDF text, report titles and validation.
+SEC_CODE_BLACKLIST = frozenset({
+    "MBS", "PDF", "EPS",
+    "KKN", "CP", "QTR",
+    "BCT", "KCN", "HNX",
+    "HSX", "HOSE", "VNI",
+    "VN30", "UPCOM", "USD",
+    "VND", "VIX", "VNINDEX",
+    "FY2", "FY1", "YTD", "MUA", "BÁN", "VNĐ",
+    "NIM", "NPL", "IEA", "KHO", "BLĐ", "NII",
+    "PER", "ROE", "ROA", "P/B", "P/E", "PBR",
+    "CIR", "COV", "FDI", "VIE",
+})
+
+# --- Dates ---
+DMY_DATE_PATTERN = re.compile(r"(\d{1,2})/(\d{1,2})/(\d{4})")
+ISO_DATE_PATTERN = re.compile(r"(\d{4})-(\d{1,2})-(\d{1,2})")
+REPORT_DATE_PATTERN = re.compile(r"\b(\d{2}/\d{2}/\d{4})\b")
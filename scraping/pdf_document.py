@@ -0,0 +1,180 @@
+import hashlib
+import logging
+from collections import OrderedDict, namedtuple
+
+import pdfplumber
+import camelot
+
+# Number of parsed documents kept in memory per process
+DOCUMENT_CACHE_SIZE = 16
+
+# Peak memory of a worker process is bounded by:
+# - the layout objects of ONE pdfplumber page: every page is closed (page.close()) right
+#   after its text, words or tables are read, so pdfplumber never holds a whole document;
+# - camelot parsing ONE page: tables are read page by page and only their DataFrame is kept;
+# - for each of the DOCUMENT_CACHE_SIZE cached documents, the text, word boxes and table
+#   cells read so far (camelot tables only for the pages the prescan selected).
+# It no longer grows with the page count of the largest report; lower DOCUMENT_CACHE_SIZE
+# to trade re-parsing for memory.
+
+# A camelot table reduced to what the extractors use
+CamelotTable = namedtuple("CamelotTable", ["page", "df"])
+
+_documents = OrderedDict()
+
+
+def file_sha256(path, chunk_size=1 << 20):
+    """Return the SHA-256 hex digest of a file's content."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def parse_page_spec(pages, page_count):
+    """
+    Convert a camelot style page spec ('1', '1,3,4', '1,4-end', 'all') into a sorted list of page numbers.
+    Page numbers are 1-based and clipped to the document length.
+    """
+    if pages is None or str(pages).strip().lower() in ("all", "1-end"):
+        return list(range(1, page_count + 1))
+
+    numbers = set()
+    for part in str(pages).split(","):
+        part = part.strip().lower()
+        if not part:
+            continue
+        if "-" in part:
+            start, end = part.split("-", 1)
+            start = int(start)
+            end = page_count if end == "end" else int(end)
+            numbers.update(range(start, min(end, page_count) + 1))
+        else:
+            number = page_count if part == "end" else int(part)
+            if 1 <= number <= page_count:
+                numbers.add(number)
+    return sorted(numbers)
+
+
+class ParsedPdf:
+    """
+    Parsed artifacts of a single PDF (page text, word boxes, pdfplumber and camelot tables).
+    Every artifact is computed lazily on first access and kept for the lifetime of the object,
+    so the sec_code detector and all extractor versions share one tokenization of the file.
+    The pdfplumber page objects themselves are released after each read (see the memory
+    bound above); the iter_* methods read pages one at a time, so a caller that stops early
+    never parses the rest of the document.
+    Page numbers are 1-based, as in camelot.
+    """
+
+    def __init__(self, pdf_path, sha256):
+        self.pdf_path = pdf_path
+        self.sha256 = sha256
+        self._pdf = None
+        self._texts = {}
+        self._words = {}
+        self._plumber_tables = {}
+        self._camelot_tables = {}
+
+    def _open(self):
+        if self._pdf is None:
+            self._pdf = pdfplumber.open(self.pdf_path)
+        return self._pdf
+
+    def _read_page(self, page_num, read):
+        """Return `read(page)` for a pdfplumber page, then drop the page's cached layout objects."""
+        page = self._open().pages[page_num - 1]
+        try:
+            return read(page)
+        finally:
+            page.close()
+
+    @property
+    def page_count(self):
+        return len(self._open().pages)
+
+    def page_numbers(self):
+        return range(1, self.page_count + 1)
+
+    def page_text(self, page_num):
+        """Text layer of a page ('' when the page has no text)."""
+        if page_num not in self._texts:
+            self._texts[page_num] = self._read_page(page_num, lambda page: page.extract_text() or "")
+        return self._texts[page_num]
+
+    def iter_page_texts(self, pages="1-end"):
+        """Yield (page_num, text) for the requested pages, reading each page only when reached."""
+        for page_num in parse_page_spec(pages, self.page_count):
+            yield page_num, self.page_text(page_num)
+
+    def leading_text(self, count):
+        """Concatenated text of the first `count` pages."""
+        return "".join(self.page_text(n) for n in range(1, min(count, self.page_count) + 1))
+
+    def page_words(self, page_num):
+        """Word boxes of a page as returned by pdfplumber `extract_words`."""
+        if page_num not in self._words:
+            self._words[page_num] = self._read_page(page_num, lambda page: page.extract_words())
+        return self._words[page_num]
+
+    def iter_page_words(self, pages="1-end"):
+        """Yield (page_num, words) for the requested pages, reading each page only when reached."""
+        for page_num in parse_page_spec(pages, self.page_count):
+            yield page_num, self.page_words(page_num)
+
+    def page_tables(self, page_num):
+        """Tables detected by pdfplumber on a page."""
+        if page_num not in self._plumber_tables:
+            self._plumber_tables[page_num] = self._read_page(page_num, lambda page: page.extract_tables())
+        return self._plumber_tables[page_num]
+
+    def iter_camelot_tables(self, pages="1-end"):
+        """
+        Yield the camelot stream tables of the requested pages, in page order.
+        Pages are sent to camelot one at a time when first reached, and only the page number
+        and DataFrame of each table are kept.
+        """
+        for page_num in parse_page_spec(pages, self.page_count):
+            if page_num not in self._camelot_tables:
+                logging.info(f"Running camelot on page {page_num} of {self.pdf_path}")
+                tables = camelot.read_pdf(self.pdf_path, pages=str(page_num), flavor="stream")
+                self._camelot_tables[page_num] = [CamelotTable(page_num, table.df) for table in tables]
+            yield from self._camelot_tables[page_num]
+
+    def camelot_tables(self, pages="1-end"):
+        """Camelot stream tables of the requested pages as a list, see iter_camelot_tables."""
+        return list(self.iter_camelot_tables(pages))
+
+    def close(self):
+        if self._pdf is not None:
+            self._pdf.close()
+            self._pdf = None
+
+
+def load_pdf(pdf_path):
+    """
+    Return the ParsedPdf for a file, keyed by content hash.
+    The same report downloaded twice (or by two brokers) is only parsed once per process.
+    """
+    sha256 = file_sha256(pdf_path)
+    doc = _documents.get(sha256)
+    if doc is not None:
+        # Same content, possibly under another name: camelot reads from the latest path
+        doc.pdf_path = pdf_path
+        _documents.move_to_end(sha256)
+        return doc
+
+    doc = ParsedPdf(pdf_path, sha256)
+    _documents[sha256] = doc
+    while len(_documents) > DOCUMENT_CACHE_SIZE:
+        _, evicted = _documents.popitem(last=False)
+        evicted.close()
+    return doc
+
+
+def clear_pdf_cache():
+    """Close and drop every cached document."""
+    while _documents:
+        _, doc = _documents.popitem()
+        doc.close()
@@ -0,0 +1,418 @@
+import heapq
+import itertools
+import json
+import logging
+import math
+import multiprocessing
+import os
+import queue
+import signal
+import threading
+import time
+from collections import namedtuple
+from contextlib import nullcontext
+from concurrent.futures import Future, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from scraping import profiling, replay
+from scraping.eps_scraping_pdf import EXTRACTORS
+from scraping.result_cache import DEFAULT_CACHE_PATH, extract_cached
+from scraping.result_writer import EPS_PARTITIONING, EPS_SCHEMA, ResultWriter
+
+# One downloaded report waiting for EPS extraction.
+# `extra` holds scraper specific columns added to every extracted row (e.g. sc_tag, file_name).
+# `page` is the listing page the report came from and `key` its journal key (defaults to `url`).
+ExtractionJob = namedtuple("ExtractionJob", ["local_path", "report_date", "sec_code", "firm", "url", "extra", "page", "key"], defaults=[None, None, None])
+
+# SIGALRM lets a worker abort a job stuck in Python code, but not one blocked in a C call
+# (camelot, ghostscript) and it does not exist on Windows. Workers therefore also report
+# (token, pid, start time) of every job on this queue (set by _init_worker), and the parent
+# kills the worker of a job that runs far past its timeout.
+_HAS_ALARM = hasattr(signal, "SIGALRM")
+_KILL_SIGNAL = getattr(signal, "SIGKILL", signal.SIGTERM)
+_started_queue = None
+
+
+class ExtractionTimeout(BaseException):
+    """
+    Raised inside a worker when a job exceeds its time budget.
+    Derives from BaseException so the extractors' `except Exception` blocks do not swallow it.
+    """
+
+
+def _raise_timeout(signum, frame):
+    raise ExtractionTimeout("EPS extraction timed out")
+
+
+def _init_worker(log_level, started_queue=None):
+    global _started_queue
+    _started_queue = started_queue
+    logging.basicConfig(
+        level=log_level,
+        format="%(asctime)s - %(levelname)s - %(message)s"
+    )
+
+
+def _extract(extractor, job, extractor_kwargs, cache_path, refresh_cache=False):
+    if cache_path:
+        return extract_cached(
+            extractor, job.local_path, job.report_date,
+            url=job.url, firm=job.firm, already_detected_sc=job.sec_code,
+            cache_path=cache_path, refresh=refresh_cache, **(extractor_kwargs or {})
+        )
+    rows = EXTRACTORS[extractor](
+        job.local_path, job.report_date,
+        url=job.url, firm=job.firm, already_detected_sc=job.sec_code,
+        **(extractor_kwargs or {})
+    ) or []
+    return rows, False
+
+
+def run_extraction_job(extractor, job, extractor_kwargs=None, timeout=None, cache_path=None, profile_path=None, profiler="cprofile", token=None, refresh_cache=False):
+    """
+    Run one extraction job. Executed in a worker process.
+    Returns (rows, from_cache, stage_stats, seconds); results are memoized in `cache_path`
+    unless it is None (and re-extracted with `refresh_cache`). With `profile_path` the job
+    is profiled into that file.
+    """
+    if _started_queue is not None and token is not None:
+        _started_queue.put((token, os.getpid(), time.time()))
+    use_alarm = bool(timeout) and _HAS_ALARM
+    if use_alarm:
+        signal.signal(signal.SIGALRM, _raise_timeout)
+        signal.alarm(int(math.ceil(timeout)))
+    # Stage timings of this job only, the parent process adds them up
+    profiling.reset()
+    started = time.perf_counter()
+    try:
+        with profiling.capture(profile_path, profiler) if profile_path else nullcontext(), profiling.stage("extract"):
+            rows, from_cache = _extract(extractor, job, extractor_kwargs, cache_path, refresh_cache)
+    finally:
+        if use_alarm:
+            signal.alarm(0)
+    return rows, from_cache, profiling.stage_stats(), time.perf_counter() - started
+
+
+class ResultSink:
+    """
+    Write extracted rows through a buffered ResultWriter with the EPS schema.
+    `output_dir` ending in .parquet gives columnar output partitioned by firm and report year,
+    anything else CSV.
+    """
+
+    def __init__(self, output_dir, **writer_kwargs):
+        self.output_dir = output_dir
+        self.writer = ResultWriter(output_dir, EPS_SCHEMA, partition_by=EPS_PARTITIONING, **writer_kwargs)
+
+    def __call__(self, job, rows, on_flushed=None):
+        stamped = [
+            {**row, **(job.extra or {}), "firm": row.get("firm") or job.firm, "url": row.get("url") or job.url}
+            for row in rows
+        ]
+        with profiling.stage("sink.write"):
+            self.writer.write(stamped, on_flushed)
+
+    def close(self):
+        self.writer.close()
+
+
+class ExtractionPipeline:
+    """
+    Producer/consumer stage between the crawl loop and the result sink.
+
+    Crawlers `submit` jobs and return to the browser immediately; a pool of worker
+    processes runs the extractor and results are handed to `sink(job, rows)` in this
+    process, one at a time. At most `max_pending` jobs are in flight: `submit` blocks
+    beyond that, which keeps the crawler from racing ahead of extraction.
+
+    Each job gets `timeout` seconds. On platforms with SIGALRM the worker aborts the job
+    itself. A job still running 1.5 times longer than that (counted from the moment a worker
+    picked it up), e.g. blocked in a C call or on a platform without SIGALRM, is reported as
+    timed out and its worker process is killed. The other jobs of the pool, which breaks with
+    it, are resubmitted once to a fresh pool. `close` waits for the remaining jobs under the
+    same rule, so a hung PDF library cannot wedge the crawl.
+
+    Results are memoized in the `result_cache` SQLite file by PDF content and extractor
+    version (see scraping.result_cache); pass `result_cache=None` to always re-extract.
+
+    With a CrawlJournal every job is recorded as "queued" on submit and then with its
+    outcome, so a restarted crawl skips reports that already reached the sink.
+
+    Stage timings of the crawl (scraping.profiling) and of the workers are written to
+    `metrics_path` on close, by default next to the sink's output (*.metrics.json; *.prom
+    gives Prometheus text). With `profile_slowest=N` every job runs under `profiler`
+    ("cprofile" or "pyinstrument", several times slower) and the profiles of the N slowest
+    PDFs are kept in `profile_dir`, listed slowest first in its slowest.json.
+    """
+
+    def __init__(self, extractor, sink, workers=None, max_pending=None, timeout=300, result_cache=DEFAULT_CACHE_PATH, journal=None,
+                 metrics_path=None, profile_slowest=0, profile_dir="output/profiles", profiler="cprofile", **extractor_kwargs):
+        if extractor not in EXTRACTORS:
+            raise ValueError(f"Unknown extractor '{extractor}', expected one of {sorted(EXTRACTORS)}")
+        if profiler not in profiling.PROFILERS:
+            raise ValueError(f"Unknown profiler '{profiler}', expected one of {profiling.PROFILERS}")
+        self.extractor = extractor
+        self.sink = sink
+        self.workers = workers or max(1, (os.cpu_count() or 2) - 1)
+        self.max_pending = max_pending or self.workers * 2
+        self.timeout = timeout
+        self.result_cache = result_cache
+        self.journal = journal
+        output_dir = getattr(sink, "output_dir", None)
+        self.metrics_path = metrics_path or (profiling.default_metrics_path(output_dir) if output_dir else None)
+        self.profile_slowest = profile_slowest
+        self.profile_dir = profile_dir
+        self.profiler = profiler
+        self.extractor_kwargs = extractor_kwargs
+        self.stats = {"submitted": 0, "extracted": 0, "empty": 0, "failed": 0, "timed_out": 0, "cached": 0}
+
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._sink_lock = threading.Lock()
+        self._pending = {}
+        self._pending_lock = threading.Lock()
+        self._downloads = 0
+        self._downloads_done = threading.Condition()
+        self._slowest = []
+        self._executor = None
+        self._tokens = itertools.count()
+        self._started_queue = None
+        self._job_started = {}
+        self._executor_lock = threading.Lock()
+
+    def _start_executor(self):
+        if self.timeout and self._started_queue is None:
+            self._started_queue = multiprocessing.Queue()
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            initializer=_init_worker,
+            initargs=(logging.getLogger().level, self._started_queue)
+        )
+
+    def __enter__(self):
+        self._start_executor()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    def _profile_path(self, job):
+        if not self.profile_slowest:
+            return None
+        name = os.path.basename(job.local_path) + profiling.profile_extension(self.profiler)
+        return os.path.join(self.profile_dir, name)
+
+    def _submit_job(self, job, token):
+        return self._executor.submit(
+            run_extraction_job, self.extractor, job, self.extractor_kwargs, self.timeout, self.result_cache,
+            self._profile_path(job), self.profiler, token,
+            # A recording crawl runs every step, as its replay will
+            replay.recording()
+        )
+
+    def _count(self, key):
+        with self._pending_lock:
+            # Callbacks run on several threads
+            self.stats[key] += 1
+
+    def submit(self, job):
+        """
+        Queue a job for extraction, blocking while `max_pending` jobs are in flight.
+        `job.local_path` may be a Future from the Downloader: the job then starts once the
+        download finishes, with the future replaced by the stored path (also in `job.extra`).
+        """
+        with profiling.stage("pipeline.backpressure"):
+            while not self._slots.acquire(timeout=5):
+                self._expire_stalled()
+        # Sharded crawls submit from several threads
+        self._count("submitted")
+        self._record(job, "queued")
+        if isinstance(job.local_path, Future):
+            download = job.local_path
+            with self._downloads_done:
+                self._downloads += 1
+            download.add_done_callback(lambda f: self._on_downloaded(f, job))
+            return download
+        return self._start(job)
+
+    def _on_downloaded(self, download, job):
+        try:
+            local_path = download.result()
+            extra = {column: local_path if value is download else value for column, value in (job.extra or {}).items()}
+            self._start(job._replace(local_path=local_path, extra=extra or job.extra))
+        except Exception as e:
+            logging.error(f"Error downloading PDF {job.url}: {e}")
+            self._count("failed")
+            self._record(job, "failed", str(e))
+            self._slots.release()
+        finally:
+            with self._downloads_done:
+                self._downloads -= 1
+                self._downloads_done.notify_all()
+
+    def _start(self, job, attempt=0):
+        token = next(self._tokens)
+        executor = self._executor
+        try:
+            future = self._submit_job(job, token)
+        except BrokenProcessPool:
+            with self._executor_lock:
+                # Jobs failing together all land here, only the first one restarts the pool
+                if self._executor is executor:
+                    # A worker died (a crash inside a PDF library, or killed by _expire_stalled)
+                    logging.error("Extraction worker pool is broken, restarting it")
+                    executor.shutdown(wait=False)
+                    self._start_executor()
+            future = self._submit_job(job, token)
+        with self._pending_lock:
+            self._pending[future] = (job, time.monotonic(), token, attempt)
+        future.add_done_callback(self._on_done)
+        return future
+
+    def _expire_stalled(self):
+        """
+        Kill the worker of every job running 1.5 x `timeout` past its start and release its
+        slot. Jobs still waiting for a worker are never expired.
+        """
+        if not self.timeout or self._started_queue is None:
+            return
+        while True:
+            try:
+                token, pid, started = self._started_queue.get_nowait()
+            except queue.Empty:
+                break
+            self._job_started[token] = (pid, started)
+        now = time.time()
+        with self._pending_lock:
+            stalled = [
+                future for future, (_, _, token, _) in self._pending.items()
+                if token in self._job_started and now - self._job_started[token][1] > self.timeout * 1.5
+            ]
+            for future in stalled:
+                job, _, token, _ = self._pending.pop(future)
+                pid, _ = self._job_started.pop(token)
+                logging.error(f"Extraction of {job.local_path} exceeded {self.timeout}s, killing its worker")
+                try:
+                    os.kill(pid, _KILL_SIGNAL)
+                except OSError as e:
+                    logging.warning(f"Could not kill extraction worker {pid}: {e}")
+                self.stats["timed_out"] += 1
+                self._record(job, "timed_out")
+                self._slots.release()
+
+    def _on_done(self, future):
+        with self._pending_lock:
+            entry = self._pending.pop(future, None)
+            if entry is not None:
+                self._job_started.pop(entry[2], None)
+        if entry is None:
+            return  # already expired
+        job, started, _, attempt = entry
+        if attempt == 0 and isinstance(future.exception(), BrokenProcessPool):
+            # Lost with a worker that crashed or was killed for another job, run it again on
+            # a fresh pool; the job keeps its slot
+            logging.warning(f"Extraction of {job.local_path} was lost with a broken worker pool, resubmitting it")
+            try:
+                self._start(job, attempt + 1)
+                return
+            except Exception as e:
+                logging.error(f"Error resubmitting {job.local_path}: {e}")
+        from_cache = False
+        try:
+            rows, from_cache, stats, seconds = future.result()
+            profiling.merge(stats)
+            self._keep_profile(job, seconds)
+        except ExtractionTimeout:
+            logging.error(f"Extraction of {job.local_path} timed out after {self.timeout}s")
+            self._count("timed_out")
+            self._record(job, "timed_out")
+            rows = None
+        except Exception as e:
+            logging.error(f"Error extracting EPS from {job.local_path}: {e}")
+            self._count("failed")
+            self._record(job, "failed", str(e))
+            rows = None
+        finally:
+            self._slots.release()
+
+        if rows is None:
+            return
+        if from_cache:
+            self._count("cached")
+        logging.info(f"Extracted {len(rows)} EPS entries from {job.local_path} in {time.monotonic() - started:.1f}s")
+        if not rows:
+            logging.info(f"No EPS data extracted from {job.local_path}")
+            self._count("empty")
+            self._record(job, "empty")
+            return
+        with self._sink_lock:
+            try:
+                # Reports are journaled as extracted once the sink has their rows on disk
+                self.sink(job, rows, on_flushed=lambda: self._record(job, "extracted", str(len(rows))))
+            except Exception as e:
+                logging.error(f"Error writing results of {job.local_path}: {e}")
+                self._count("failed")
+                self._record(job, "failed", str(e))
+                return
+        self._count("extracted")
+
+    def _keep_profile(self, job, seconds):
+        """Keep the profile of `job` while it is among the `profile_slowest` slowest, delete the rest."""
+        path = self._profile_path(job)
+        if not path or not os.path.exists(path):
+            return
+        with self._pending_lock:
+            heapq.heappush(self._slowest, (seconds, path, job.url))
+            dropped = heapq.heappop(self._slowest) if len(self._slowest) > self.profile_slowest else None
+            # The same PDF may be listed twice, its file then holds the latest profile
+            if dropped and all(entry[1] != dropped[1] for entry in self._slowest):
+                os.remove(dropped[1])
+
+    def _save_metrics(self):
+        for key, value in self.stats.items():
+            profiling.count(f"pipeline.{key}", value)
+        profiling.log_stage_stats()
+        if self.metrics_path:
+            try:
+                profiling.save_stage_stats(self.metrics_path)
+                logging.info(f"Stage timings written to {self.metrics_path}")
+            except OSError as e:
+                logging.error(f"Error writing stage timings to {self.metrics_path}: {e}")
+        if self._slowest:
+            slowest = [
+                {"seconds": round(seconds, 3), "profile": path, "url": url}
+                for seconds, path, url in sorted(self._slowest, reverse=True)
+            ]
+            with open(os.path.join(self.profile_dir, "slowest.json"), "w", encoding="utf-8") as f:
+                json.dump(slowest, f, indent=2)
+            logging.info(f"Profiles of the {len(slowest)} slowest PDFs are in {self.profile_dir}")
+
+    def _record(self, job, outcome, detail=None):
+        if self.journal is None:
+            return
+        try:
+            self.journal.mark_item(job.key or job.url, outcome, page=job.page, detail=detail)
+        except Exception as e:
+            logging.error(f"Error recording {outcome} for {job.key or job.url} in the journal: {e}")
+
+    def close(self):
+        """Wait for pending downloads and every queued job to finish or expire, then shut the worker pool down."""
+        if self._executor is None:
+            return
+        with self._downloads_done:
+            self._downloads_done.wait_for(lambda: self._downloads == 0)
+        # Wait in steps, killing the workers of stalled jobs, rather than block on a hung one
+        while True:
+            with self._pending_lock:
+                pending = list(self._pending)
+            if not pending:
+                break
+            wait(pending, timeout=5)
+            self._expire_stalled()
+        self._executor.shutdown(wait=True)
+        self._executor = None
+        if hasattr(self.sink, "close"):
+            with self._sink_lock:
+                self.sink.close()
+        logging.info(f"Extraction pipeline finished: {self.stats}")
+        self._save_metrics()
@@ -0,0 +1,135 @@
+import logging
+
+import numpy as np
+import pandas as pd
+
+from scraping.datasets import read_dataset
+from scraping.result_writer import parse_date
+
+# Daily history of every ticker fetched in bulk (scraping.cafef_prices), one partition per sec_code
+DEFAULT_PRICE_STORE = "output/price_history.parquet"
+
+# side -> (searchsorted side, offset) of an as-of lookup in a sorted date array
+SIDES = {
+    "before": ("left", -1),
+    "on_or_before": ("right", -1),
+    "after": ("right", 0),
+    "on_or_after": ("left", 0),
+}
+
+
+def load_price_history(store_path=DEFAULT_PRICE_STORE, sec_codes=None, columns=("sec_code", "date", "closing_price")):
+    """
+    Price rows of `sec_codes` (all tickers when None) from a price dataset, with sec_code
+    lower case and date as datetime64[ns]. Only the partitions of the requested tickers are read.
+    """
+    filters = [("sec_code", "in", sorted({str(code).lower() for code in sec_codes}))] if sec_codes is not None else None
+    history = read_dataset(store_path, columns=list(columns), filters=filters)
+    history["sec_code"] = history["sec_code"].astype(str).str.lower()
+    history["date"] = pd.to_datetime(history["date"].map(parse_date)).astype("datetime64[ns]")
+    return history.dropna(subset=["date"])
+
+
+def _day(value):
+    """numpy datetime64[D] of a date, datetime, Timestamp or date string (dd/mm/yyyy, yyyy-mm-dd, ...), NaT if missing."""
+    if isinstance(value, str):
+        value = parse_date(value)
+    if value is None or pd.isna(value):
+        return np.datetime64("NaT", "D")
+    return np.datetime64(pd.Timestamp(value).date(), "D")
+
+
+class PriceStore:
+    """
+    In-memory price history for as-of lookups: per ticker, a sorted datetime64[D] array of
+    its trading days and the price columns aligned with it, searched with np.searchsorted.
+
+    Sides of a lookup: "before" (last trading day strictly before the date), "on_or_before",
+    "after" (first trading day strictly after) and "on_or_after". Tickers are matched case
+    insensitively.
+    """
+
+    def __init__(self, history, columns=("closing_price",)):
+        self.columns = list(columns)
+        self._series = {}
+        history = history.assign(sec_code=history["sec_code"].astype(str).str.lower())
+        history = history.sort_values(["sec_code", "date"], kind="stable").drop_duplicates(["sec_code", "date"], keep="last")
+        for sec_code, rows in history.groupby("sec_code", sort=False):
+            dates = rows["date"].to_numpy().astype("datetime64[D]")
+            values = {column: pd.to_numeric(rows[column], errors="coerce").to_numpy(dtype=float) for column in self.columns}
+            self._series[str(sec_code).lower()] = (dates, values)
+        self._calendar = None
+        logging.info(f"Price store holds {len(history)} rows of {len(self._series)} tickers")
+
+    @classmethod
+    def load(cls, store_paths=DEFAULT_PRICE_STORE, sec_codes=None, columns=("closing_price",)):
+        """Load one price dataset or a list of them (e.g. the ticker store and the index histories)."""
+        if isinstance(store_paths, str):
+            store_paths = [store_paths]
+        frames = [load_price_history(path, sec_codes, ("sec_code", "date", *columns)) for path in store_paths]
+        return cls(pd.concat(frames, ignore_index=True), columns)
+
+    def tickers(self):
+        return sorted(self._series)
+
+    def __contains__(self, sec_code):
+        return str(sec_code).lower() in self._series
+
+    def calendar(self, sec_code=None):
+        """Trading days of `sec_code`, or of the whole market (any ticker traded) when None."""
+        if sec_code is not None:
+            series = self._series.get(str(sec_code).lower())
+            return series[0] if series else np.array([], dtype="datetime64[D]")
+        if self._calendar is None:
+            days = [dates for dates, _ in self._series.values()]
+            self._calendar = np.unique(np.concatenate(days)) if days else np.array([], dtype="datetime64[D]")
+        return self._calendar
+
+    def _positions(self, dates, days, side):
+        if side not in SIDES:
+            raise ValueError(f"Unknown side '{side}', expected one of {sorted(SIDES)}")
+        search_side, offset = SIDES[side]
+        positions = np.searchsorted(dates, days, side=search_side) + offset
+        return np.where((positions >= 0) & (positions < len(dates)) & ~np.isnat(days), positions, -1)
+
+    def asof(self, sec_code, date, side="before", column="closing_price"):
+        """(trading day as datetime.date, price) of the as-of lookup, (None, None) when the store has none."""
+        series = self._series.get(str(sec_code).lower())
+        if series is None:
+            return None, None
+        dates, values = series
+        position = int(self._positions(dates, np.array([_day(date)]), side)[0])
+        if position < 0:
+            return None, None
+        value = values[column][position]
+        return dates[position].astype(object), None if np.isnan(value) else float(value)
+
+    def asof_many(self, sec_codes, dates, side="before", column="closing_price"):
+        """
+        Vectorized asof over aligned sequences of tickers and dates. Returns (days, prices) as
+        a datetime64[D] array and a float array, NaT / NaN where the store has no match or the
+        date is missing.
+        """
+        codes = pd.Series(sec_codes, dtype=object).astype(str).str.lower().to_numpy()
+        days = np.array([_day(date) for date in dates], dtype="datetime64[D]")
+        found_days = np.full(len(codes), np.datetime64("NaT"), dtype="datetime64[D]")
+        prices = np.full(len(codes), np.nan)
+        for sec_code in np.unique(codes):
+            series = self._series.get(sec_code)
+            if series is None:
+                continue
+            stored_dates, values = series
+            index = np.flatnonzero(codes == sec_code)
+            positions = self._positions(stored_dates, days[index], side)
+            hit = positions >= 0
+            found_days[index[hit]] = stored_dates[positions[hit]]
+            prices[index[hit]] = values[column][positions[hit]]
+        return found_days, prices
+
+    def last_trading_day(self, year, sec_code=None):
+        """Last trading day of `year` (datetime.date) for `sec_code`, or of the market when None."""
+        calendar = self.calendar(sec_code)
+        position = int(self._positions(calendar, np.array([np.datetime64(f"{int(year) + 1}-01-01", "D")]), "before")[0])
+        if position < 0 or calendar[position] < np.datetime64(f"{int(year)}-01-01", "D"):
+            return None
+        return calendar[position].astype(object)
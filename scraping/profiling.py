@@ -0,0 +1,193 @@
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Per-process registry of stage timings and counters. Stages are timed with `stage(name)`
+# around crawl, download, extraction and write steps; worker processes send theirs back
+# with each extraction result (see ExtractionPipeline).
+
+_stages = {}
+_counters = {}
+_lock = threading.Lock()
+
+PROFILERS = ("cprofile", "pyinstrument")
+
+
+class StageStats:
+    """Wall time spent in one named stage."""
+
+    def __init__(self, name):
+        self.name = name
+        self.count = 0
+        self.errors = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def record(self, elapsed_ms, ok=True):
+        self.count += 1
+        self.total_ms += elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+        if not ok:
+            self.errors += 1
+
+    def merge(self, other):
+        """Add the as_dict() snapshot of the same stage taken in another process."""
+        self.count += other["count"]
+        self.errors += other["errors"]
+        self.total_ms += other["total_ms"]
+        self.max_ms = max(self.max_ms, other["max_ms"])
+
+    def as_dict(self):
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "total_ms": round(self.total_ms, 1),
+            "mean_ms": round(self.total_ms / self.count, 1) if self.count else None,
+            "max_ms": round(self.max_ms, 1),
+        }
+
+
+def _stats_for(name):
+    if name not in _stages:
+        _stages[name] = StageStats(name)
+    return _stages[name]
+
+
+@contextmanager
+def stage(name):
+    """
+    Time the block as stage `name`; a block that raises is counted as an error.
+    Also usable as a decorator: @stage("download").
+    """
+    start = time.perf_counter()
+    ok = False
+    try:
+        yield
+        ok = True
+    finally:
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        with _lock:
+            _stats_for(name).record(elapsed_ms, ok)
+
+
+def count(name, n=1):
+    """Add `n` to counter `name` (e.g. rows written, cache hits)."""
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + n
+
+
+def stage_stats():
+    """{"stages": {name: count, errors, total/mean/max ms}, "counters": {name: value}} of this process."""
+    with _lock:
+        return {
+            "stages": {name: stats.as_dict() for name, stats in sorted(_stages.items())},
+            "counters": dict(sorted(_counters.items())),
+        }
+
+
+def merge(snapshot):
+    """Fold a stage_stats() snapshot taken in another process (e.g. an extraction worker) into this one."""
+    if not snapshot:
+        return
+    with _lock:
+        for name, stats in snapshot.get("stages", {}).items():
+            _stats_for(name).merge(stats)
+        for name, value in snapshot.get("counters", {}).items():
+            _counters[name] = _counters.get(name, 0) + value
+
+
+def reset():
+    with _lock:
+        _stages.clear()
+        _counters.clear()
+
+
+def log_stage_stats():
+    snapshot = stage_stats()
+    for name, stats in snapshot["stages"].items():
+        logging.info(f"Stage '{name}': {stats}")
+    for name, value in snapshot["counters"].items():
+        logging.info(f"Counter '{name}': {value}")
+
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def prometheus_text(prefix="scraping"):
+    """The registry in the Prometheus text exposition format, e.g. for a node_exporter textfile collector."""
+    snapshot = stage_stats()
+    metrics = [
+        ("stage_calls_total", "counter", "Times the stage ran", lambda stats: stats["count"]),
+        ("stage_errors_total", "counter", "Times the stage raised", lambda stats: stats["errors"]),
+        ("stage_seconds_total", "counter", "Wall time spent in the stage", lambda stats: stats["total_ms"] / 1000),
+        ("stage_max_seconds", "gauge", "Longest single run of the stage", lambda stats: stats["max_ms"] / 1000),
+    ]
+    lines = []
+    for metric, kind, help_text, value in metrics:
+        lines.append(f"# HELP {prefix}_{metric} {help_text}")
+        lines.append(f"# TYPE {prefix}_{metric} {kind}")
+        for name, stats in snapshot["stages"].items():
+            lines.append(f'{prefix}_{metric}{{stage="{_label(name)}"}} {value(stats):g}')
+    if snapshot["counters"]:
+        lines.append(f"# HELP {prefix}_events_total Events counted during the run")
+        lines.append(f"# TYPE {prefix}_events_total counter")
+        for name, value in snapshot["counters"].items():
+            lines.append(f'{prefix}_events_total{{name="{_label(name)}"}} {value:g}')
+    return "\n".join(lines) + "\n"
+
+
+def default_metrics_path(output_dir):
+    """Run summary next to the output, e.g. output/eps_rep_acbs.csv -> output/eps_rep_acbs.metrics.json."""
+    return os.path.splitext(output_dir.rstrip("/\\"))[0] + ".metrics.json"
+
+
+def save_stage_stats(path):
+    """Write the registry to `path`: Prometheus text for *.prom, JSON otherwise."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        if path.endswith(".prom"):
+            f.write(prometheus_text())
+        else:
+            json.dump(stage_stats(), f, indent=2)
+
+
+def profile_extension(profiler):
+    return ".html" if profiler == "pyinstrument" else ".prof"
+
+
+@contextmanager
+def capture(path, profiler="cprofile"):
+    """
+    Profile the block into `path`: a pstats dump for "cprofile" (open with snakeviz or
+    pstats), an HTML report for "pyinstrument" (pip install pyinstrument).
+    """
+    if profiler not in PROFILERS:
+        raise ValueError(f"Unknown profiler '{profiler}', expected one of {PROFILERS}")
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    if profiler == "pyinstrument":
+        try:
+            from pyinstrument import Profiler
+        except ImportError as e:
+            raise ImportError("Profiling with pyinstrument needs pyinstrument (pip install pyinstrument)") from e
+        profile = Profiler()
+        profile.start()
+        try:
+            yield
+        finally:
+            profile.stop()
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(profile.output_html())
+        return
+
+    import cProfile
+    profile = cProfile.Profile()
+    profile.enable()
+    try:
+        yield
+    finally:
+        profile.disable()
+        profile.dump_stats(path)
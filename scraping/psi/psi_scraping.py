@@ -1,31 +1,46 @@
-import os
-import requests
 import logging
 from urllib.parse import urljoin
-from playwright.sync_api import sync_playwright
-import pandas as pd
 
-from scraping.eps_scraping_pdf import extract_clean_eps_v6
+from scraping.download_store import DEFAULT_STORE_DIR
+from scraping.downloader import get_downloader
+from scraping.dom_extract import Field
+from scraping.http_transport import open_transport
+from scraping.pipeline import ExtractionPipeline, ExtractionJob, ResultSink
+from scraping.checkpoint import default_journal_path, get_journal
 from scraping.utils.Utils import parse_vietnamese_date
 
 BASE_URL = "https://www.psi.vn/vi/trung-tam-phan-tich/bao-cao-phan-tich-doanh-nghiep?page="
 # DATE_RANGE = "&fromdate=01%2F01%2F2019&todate=31%2F12%2F2023"
 # PAGE_PARAM = "&post_page="
 
-def scraping_psi_all(download_dir="downloads", valid_codes=None, max_pages=20, start_page=1, output_dir="output/eps_rep_psi.csv", blacklist_code=None, firm="PSI"):
-    os.makedirs(download_dir, exist_ok=True)
+REPORT_ITEMS = "div.row.article-cell.article-cell--lg.pl-0"
+# Read for every article in one round trip
+REPORT_FIELDS = {
+    "date": Field(("div.date-tag.date-tag--sm", "div.date-tag__date")),
+    "month_year": Field(("div.date-tag.date-tag--sm", "div.date-tag__month-year")),
+    "pdf_href": ("div.d-flex.flex-column.align-items-center > a", "href"),
+}
+
+def scraping_psi_all(download_dir="downloads", valid_codes=None, max_pages=20, start_page=1, output_dir="output/eps_rep_psi.csv", blacklist_code=None, firm="PSI", store_dir=DEFAULT_STORE_DIR, checkpoint_path=None, transport="http"):
+    """
+    Crawl the PSI listing, server-rendered so fetched over plain HTTP unless transport="browser".
+    download_dir is deprecated and ignored, reports are kept in the DownloadStore at store_dir.
+    """
+    downloader = get_downloader(store_dir)
+    
+    journal = get_journal(checkpoint_path or default_journal_path(output_dir))
+    done_pages = journal.done_pages()
     
-    with sync_playwright() as p:
-        browser = p.chromium.launch(headless=True)
-        page = browser.new_page()
+    with open_transport(transport) as source, ExtractionPipeline("v6", ResultSink(output_dir), journal=journal, valid_codes=valid_codes, blacklist_codes=blacklist_code) as pipeline:
 
         for page_num in range(start_page, max_pages + 1):
+            if page_num in done_pages:
+                logging.info(f"Page {page_num} already done, skipping.")
+                continue
             url = f"{BASE_URL}{page_num}"
             logging.info(f"Loading page {page_num}: {url}")
-            page.goto(url, timeout=60000)
-            page.wait_for_load_state("networkidle")
 
-            report_items = page.query_selector_all("div.row.article-cell.article-cell--lg.pl-0")
+            report_items = source.items(url, REPORT_ITEMS, REPORT_FIELDS)
             if not report_items:
                 logging.info(f"No reports found on page {page_num}, stopping.")
                 continue
@@ -37,16 +52,9 @@ def scraping_psi_all(download_dir="downloads", valid_codes=None, max_pages=20, s
                 
                 # Detect sec_code
                 try:
-                    head_card_tag = report_item.query_selector("div.date-tag.date-tag--sm")
-                    sec_code_tag = None
-                    date = head_card_tag.query_selector("div.date-tag__date").text_content().strip()
-                    month_year = head_card_tag.query_selector("div.date-tag__month-year").text_content().strip()
-                    
-                    if sec_code_tag:
-                        sec_code = sec_code_tag.text_content().strip().upper()
-                        is_sec_code_tagged = True
-                    else:
-                        logging.warning(f"Could not find sec_code for report {idx} on page {page_num}, fallback to sec code tickets.")
+                    date = report_item["date"]
+                    month_year = report_item["month_year"]
+                    logging.warning(f"Could not find sec_code for report {idx} on page {page_num}, fallback to sec code tickets.")
 
                     if not date and not month_year:
                         logging.warning(f"Could not find report date for report {idx} on page {page_num}, skipping.")
@@ -62,45 +70,21 @@ def scraping_psi_all(download_dir="downloads", valid_codes=None, max_pages=20, s
                 # Get pdf link and download
                 local_path = None
                 try:
-                    pdf_link_tag = report_item.query_selector("div.d-flex.flex-column.align-items-center > a")
-                    if not pdf_link_tag:
+                    if report_item["pdf_href"] is None:
                         logging.warning(f"No PDF link in report {idx} on page {page_num}, skipping.")
                         continue
                     logging.info(f"Found PDF link for report {idx} on page {page_num}")
                     
-                    pdf_url = urljoin(BASE_URL, pdf_link_tag.get_attribute("href"))
-                    filename = os.path.basename(pdf_url)
-                    local_path = os.path.join(download_dir, filename) + ".pdf"
-                    logging.info(f"Downloading PDF {pdf_url} -> {local_path}")
-                    response = requests.get(pdf_url)
-                    with open(local_path, "wb") as f:
-                        f.write(response.content)
+                    pdf_url = urljoin(BASE_URL, report_item["pdf_href"])
+                    if journal.item_done(pdf_url):
+                        continue
+                    local_path = downloader.submit(pdf_url)
 
                 except Exception as e:
                     logging.error(f"Error finding PDF link for report {idx} on page {page_num}: {e}")
                     continue
                 
-                # Extract EPS
-                try:
-                    eps_results = extract_clean_eps_v6(local_path, report_date, valid_codes=valid_codes, blacklist_codes=blacklist_code, firm=firm, url=pdf_url, already_detected_sc=sec_code)
-                    logging.info(f"Extracted {len(eps_results)} EPS entries from {local_path}")
-                    logging.info(f"EPS Results: {eps_results}")
-                    if not eps_results:
-                        logging.info(f"No EPS data extracted from {local_path}")
-                        continue
-                    
-                    result_df = pd.DataFrame(eps_results)
-                    result_df["sc_tag"] = is_sec_code_tagged
-                    os.makedirs("output", exist_ok=True)
-                    if not os.path.exists(output_dir):
-                        result_df.to_csv(output_dir, index=False)
-                        logging.info(f"Results saved to {output_dir}")
-                    else:
-                        result_df.to_csv(output_dir, mode="a", header=False, index=False)
-                        logging.info(f"Results appended to {output_dir}")
+                # Queue EPS extraction, workers parse the PDF while the crawler moves on
+                pipeline.submit(ExtractionJob(local_path, report_date, sec_code, firm, pdf_url, {"sc_tag": is_sec_code_tagged}, page=page_num))
 
-                except Exception as e:
-                    logging.error(f"Error processing report {idx} on page {page_num}: {e}")
-                    continue
-                
-        browser.close()
+            journal.mark_page(page_num)
@@ -0,0 +1,317 @@
+import argparse
+import atexit
+import glob
+import hashlib
+import json
+import logging
+import os
+import runpy
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, quote, urlsplit
+
+from scraping import profiling
+
+# Record / replay of everything a crawl fetches, so scrapers can run offline against fixtures.
+#
+# - Playwright: browsers started with `launch` record every context into a HAR archive
+#   (<archive>/har/*.zip) and replay from it with route_from_har; requests missing from the
+#   archive are aborted, so a replayed crawl never reaches the live site.
+# - HTTP clients (the Downloader, `http_get`): responses are recorded into an HttpArchive
+#   and replayed through a local HTTP stand-in (ReplayServer) on 127.0.0.1.
+#
+# The mode is process wide: configure("record" | "replay", archive_dir), or run a main_*.py
+# script with `python -m scraping.replay replay fixtures/acbs main_acbs.py`. While recording,
+# the download store, journal and result cache are not consulted (see `recording`), so the
+# archive is complete even when recorded in a directory holding an earlier crawl.
+
+MODES = ("live", "record", "replay")
+# Headers that describe the recorded transfer rather than the content
+_SKIPPED_HEADERS = {"content-length", "content-encoding", "transfer-encoding", "connection", "keep-alive"}
+
+_mode = "live"
+_archive_dir = None
+_archive = None
+_server = None
+_lock = threading.Lock()
+
+
+class HttpArchive:
+    """
+    Recorded HTTP responses keyed by url: an SQLite index (index.sqlite) of status and headers,
+    bodies stored once per content under bodies/<sha256>.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(os.path.join(root, "bodies"), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(root, "index.sqlite"), timeout=30, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " url TEXT PRIMARY KEY,"
+            " status INTEGER NOT NULL,"
+            " headers TEXT NOT NULL,"
+            " sha256 TEXT NOT NULL,"
+            " recorded_at REAL)"
+        )
+        self._db.commit()
+
+    def put(self, url, status, headers, path=None, content=None):
+        """Record a response whose body is the file at `path` or the bytes `content`."""
+        digest = hashlib.sha256()
+        if path is not None:
+            with open(path, "rb") as f:
+                for chunk in iter(lambda: f.read(1 << 16), b""):
+                    digest.update(chunk)
+        else:
+            digest.update(content or b"")
+        sha256 = digest.hexdigest()
+        body_path = os.path.join(self.root, "bodies", sha256)
+        if not os.path.exists(body_path):
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(body_path), suffix=".part")
+            os.close(fd)
+            if path is not None:
+                shutil.copyfile(path, tmp_path)
+            else:
+                with open(tmp_path, "wb") as f:
+                    f.write(content or b"")
+            os.replace(tmp_path, body_path)
+        kept = {name: value for name, value in headers.items() if name.lower() not in _SKIPPED_HEADERS}
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses (url, status, headers, sha256, recorded_at) VALUES (?, ?, ?, ?, ?)",
+                (url, status, json.dumps(kept), sha256, time.time())
+            )
+            self._db.commit()
+
+    def get(self, url):
+        """(status, headers, body_path) recorded for `url`, or None."""
+        with self._lock:
+            row = self._db.execute("SELECT status, headers, sha256 FROM responses WHERE url = ?", (url,)).fetchone()
+        if row is None:
+            return None
+        status, headers, sha256 = row
+        return status, json.loads(headers), os.path.join(self.root, "bodies", sha256)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+class _ReplayHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        url = parse_qs(urlsplit(self.path).query).get("url", [None])[0]
+        entry = self.server.archive.get(url) if url else None
+        if entry is None:
+            logging.warning(f"Replay: {url} is not in the archive")
+            profiling.count("replay.misses")
+            self.send_error(404, "Not recorded")
+            return
+        status, headers, body_path = entry
+        profiling.count("replay.hits")
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(os.path.getsize(body_path)))
+        self.end_headers()
+        with open(body_path, "rb") as f:
+            shutil.copyfileobj(f, self.wfile)
+
+    def log_message(self, format, *args):
+        logging.debug(f"Replay server: {format % args}")
+
+
+class ReplayServer:
+    """Local HTTP stand-in serving an HttpArchive: GET /replay?url=<recorded url>."""
+
+    def __init__(self, archive, host="127.0.0.1", port=0):
+        self._httpd = ThreadingHTTPServer((host, port), _ReplayHandler)
+        self._httpd.daemon_threads = True
+        self._httpd.archive = archive
+        self.host, self.port = self._httpd.server_address[:2]
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="replay-server", daemon=True)
+        self._thread.start()
+        logging.info(f"Replaying {archive.root} on http://{self.host}:{self.port}")
+
+    def url_for(self, url):
+        return f"http://{self.host}:{self.port}/replay?url={quote(url, safe='')}"
+
+    def close(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+
+def configure(mode, archive_dir=None):
+    """Switch this process to "live", "record" or "replay" against the archive at `archive_dir`."""
+    global _mode, _archive_dir, _archive, _server
+    if mode not in MODES:
+        raise ValueError(f"Unknown replay mode '{mode}', expected one of {MODES}")
+    if mode != "live" and not archive_dir:
+        raise ValueError(f"Mode '{mode}' needs an archive directory")
+    if mode == "replay" and not os.path.isdir(archive_dir):
+        raise ValueError(f"No recorded archive at {archive_dir}")
+    with _lock:
+        if _server:
+            _server.close()
+        if _archive:
+            _archive.close()
+        _mode, _archive_dir, _archive, _server = mode, archive_dir, None, None
+
+
+def mode():
+    return _mode
+
+
+def recording():
+    """
+    True in record mode. The download store, crawl journal and result cache then act as if
+    empty, so everything the crawl needs is fetched, and recorded, even when a previous run
+    already has it.
+    """
+    return _mode == "record"
+
+
+def _get_archive():
+    global _archive
+    with _lock:
+        if _archive is None:
+            _archive = HttpArchive(os.path.join(_archive_dir, "http"))
+        return _archive
+
+
+def _get_server():
+    global _server
+    archive = _get_archive()
+    with _lock:
+        if _server is None:
+            _server = ReplayServer(archive)
+            atexit.register(_server.close)
+        return _server
+
+
+def request_url(url):
+    """Where an HTTP client should fetch `url`: the url itself, or the replay server when replaying."""
+    return _get_server().url_for(url) if _mode == "replay" else url
+
+
+def record(url, status, headers, path=None, content=None):
+    """Keep a live response in the archive when recording, otherwise do nothing."""
+    if _mode != "record":
+        return
+    try:
+        _get_archive().put(url, status, headers, path=path, content=content)
+    except Exception as e:
+        logging.error(f"Error recording {url}: {e}")
+
+
+def http_get(url, **kwargs):
+    """requests.get that records or replays like the rest of the crawl."""
+    import requests
+    response = requests.get(request_url(url), **kwargs)
+    record(url, response.status_code, response.headers, content=response.content)
+    return response
+
+
+class ReplayBrowser:
+    """
+    Playwright browser whose contexts record to or replay from HAR files. Pages opened with
+    `new_page` share one context, so a crawl records one HAR per browser (plus one per
+    `new_context`). Anything else is delegated to the wrapped browser.
+    """
+
+    def __init__(self, browser, har_dir, replaying):
+        self._browser = browser
+        self._har_dir = har_dir
+        self._replaying = replaying
+        self._contexts = []
+        self._default_context = None
+
+    def new_context(self, **kwargs):
+        if self._replaying:
+            context = self._browser.new_context(**kwargs)
+            # Routes registered last are tried first: HAR entries, then abort whatever is left
+            context.route("**/*", lambda route: route.abort())
+            for har_path in sorted(glob.glob(os.path.join(self._har_dir, "*.zip"))):
+                context.route_from_har(har_path, not_found="fallback")
+        else:
+            os.makedirs(self._har_dir, exist_ok=True)
+            har_path = os.path.join(self._har_dir, f"{int(time.time() * 1000)}-{os.getpid()}-{threading.get_ident()}-{len(self._contexts)}.zip")
+            context = self._browser.new_context(record_har_path=har_path, record_har_content="attach", **kwargs)
+        self._contexts.append(context)
+        return context
+
+    def new_page(self, **kwargs):
+        if self._default_context is None:
+            self._default_context = self.new_context(**kwargs)
+        return self._default_context.new_page()
+
+    def close(self):
+        # A HAR is written when its context closes
+        for context in self._contexts:
+            try:
+                context.close()
+            except Exception as e:
+                logging.error(f"Error closing browser context: {e}")
+        self._contexts = []
+        self._browser.close()
+
+    def __getattr__(self, name):
+        return getattr(self._browser, name)
+
+
+def launch(browser_type, **kwargs):
+    """browser_type.launch(**kwargs), wrapped in a ReplayBrowser when recording or replaying."""
+    browser = browser_type.launch(**kwargs)
+    if _mode == "live":
+        return browser
+    har_dir = os.path.join(_archive_dir, "har")
+    if _mode == "replay" and not glob.glob(os.path.join(har_dir, "*.zip")):
+        logging.warning(f"No HAR recorded in {har_dir}, every browser request will be aborted")
+    return ReplayBrowser(browser, har_dir, replaying=_mode == "replay")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Run a scraper script while recording its traffic, or replay it offline from a recorded archive.",
+        epilog="Example: python -m scraping.replay record fixtures/acbs main_acbs.py, "
+               "then python -m scraping.replay replay --workdir /tmp/acbs_replay fixtures/acbs main_acbs.py"
+    )
+    parser.add_argument("mode", choices=["record", "replay"])
+    parser.add_argument("archive_dir")
+    parser.add_argument("script", help="scraper entry point, e.g. main_acbs.py")
+    parser.add_argument("script_args", nargs=argparse.REMAINDER)
+    parser.add_argument(
+        "--workdir",
+        help="run the script from this directory, so its output, download store and journal start empty"
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    archive_dir = os.path.abspath(args.archive_dir)
+    script = os.path.abspath(args.script)
+    # Under `python -m` this module runs as __main__, configure the copy the scrapers import
+    from scraping import replay
+    replay.configure(args.mode, archive_dir)
+
+    sys.path.insert(0, os.path.dirname(script))
+    if args.workdir:
+        os.makedirs(args.workdir, exist_ok=True)
+        os.chdir(args.workdir)
+    sys.argv = [script, *args.script_args]
+    started = time.monotonic()
+    try:
+        runpy.run_path(script, run_name="__main__")
+    finally:
+        logging.info(f"{args.mode.capitalize()} of {script} took {time.monotonic() - started:.1f}s")
+        profiling.log_stage_stats()
+
+
+if __name__ == "__main__":
+    main()
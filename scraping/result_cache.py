@@ -0,0 +1,144 @@
+import argparse
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import time
+
+from scraping import eps_scraping_pdf, patterns, pdf_document
+from scraping.eps_scraping_pdf import EXTRACTORS
+from scraping.pdf_document import file_sha256
+from scraping.utils import Utils
+
+DEFAULT_CACHE_PATH = "cache/eps_results.sqlite"
+
+
+def _source_digest(modules):
+    digest = hashlib.sha256()
+    for module in modules:
+        with open(module.__file__, "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+
+# Digest of the code behind the extractors. It is part of every cache key, so editing an
+# extractor (or the patterns and helpers it uses) stops old results from being served.
+EXTRACTOR_REVISION = _source_digest([eps_scraping_pdf, patterns, pdf_document, Utils])
+
+_connections = {}
+
+
+def _connect(cache_path):
+    """One connection per cache file and process (worker processes open their own)."""
+    conn = _connections.get(cache_path)
+    if conn is None:
+        os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+        conn = sqlite3.connect(cache_path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            " sha256 TEXT NOT NULL,"
+            " version TEXT NOT NULL,"
+            " args_key TEXT NOT NULL,"
+            " rows TEXT NOT NULL,"
+            " created_at REAL,"
+            " PRIMARY KEY (sha256, version, args_key))"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS results_version ON results (version)")
+        conn.commit()
+        _connections[cache_path] = conn
+    return conn
+
+
+def _args_key(report_date, sec_code, kwargs):
+    """Digest of everything besides the file content that changes an extractor's output."""
+    normalized = {
+        key: sorted(value) if isinstance(value, (list, set, tuple)) else value
+        for key, value in kwargs.items()
+    }
+    payload = json.dumps([report_date, sec_code, normalized, EXTRACTOR_REVISION], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _stamp(rows, firm, url):
+    """Fill in the report specific columns. Cached rows are stored with firm=None and url=''."""
+    return [{**row, "firm": firm, "url": (url or "") + (row.get("url") or "")} for row in rows]
+
+
+def extract_cached(version, pdf_path, report_date, url=None, firm=None, already_detected_sc=None, cache_path=DEFAULT_CACHE_PATH, refresh=False, **kwargs):
+    """
+    Run extractor `version` on a PDF, memoized on disk by (content hash, version, arguments,
+    EXTRACTOR_REVISION). firm and url are not part of the key, so the same report found by two
+    brokers is parsed once. With `refresh` the cached result is ignored and replaced.
+    Returns (rows, from_cache).
+
+    The extractor runs with strict=True: when it hits an error (unreadable PDF, failed
+    strategy) ExtractionFailed is raised and nothing is cached, so the report is retried
+    rather than remembered as having no EPS.
+    """
+    conn = _connect(cache_path)
+    sha256 = file_sha256(pdf_path)
+    args_key = _args_key(report_date, already_detected_sc, kwargs)
+
+    row = None if refresh else conn.execute(
+        "SELECT rows FROM results WHERE sha256 = ? AND version = ? AND args_key = ?",
+        (sha256, version, args_key)
+    ).fetchone()
+    if row is not None:
+        logging.info(f"Using cached {version} results for {pdf_path}")
+        return _stamp(json.loads(row[0]), firm, url), True
+
+    rows = EXTRACTORS[version](
+        pdf_path, report_date,
+        url="", firm=None, already_detected_sc=already_detected_sc, strict=True,
+        **kwargs
+    ) or []
+    conn.execute(
+        "INSERT OR REPLACE INTO results (sha256, version, args_key, rows, created_at) VALUES (?, ?, ?, ?, ?)",
+        (sha256, version, args_key, json.dumps(rows, default=str), time.time())
+    )
+    conn.commit()
+    return _stamp(rows, firm, url), False
+
+
+def invalidate(version=None, cache_path=DEFAULT_CACHE_PATH):
+    """Drop cached results of one extractor version (all versions when None). Returns the number of rows removed."""
+    conn = _connect(cache_path)
+    if version is None:
+        cursor = conn.execute("DELETE FROM results")
+    else:
+        cursor = conn.execute("DELETE FROM results WHERE version = ?", (version,))
+    conn.commit()
+    return cursor.rowcount
+
+
+def stats(cache_path=DEFAULT_CACHE_PATH):
+    """Number of cached documents per extractor version."""
+    conn = _connect(cache_path)
+    return dict(conn.execute("SELECT version, COUNT(*) FROM results GROUP BY version ORDER BY version").fetchall())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manage the EPS extraction result cache.")
+    parser.add_argument("--cache", default=DEFAULT_CACHE_PATH, help="cache file (default: %(default)s)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    invalidate_parser = commands.add_parser("invalidate", help="drop cached results")
+    target = invalidate_parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--version", choices=sorted(EXTRACTORS), help="extractor version to drop")
+    target.add_argument("--all", action="store_true", help="drop every version")
+
+    commands.add_parser("stats", help="show cached documents per version")
+
+    args = parser.parse_args(argv)
+    if args.command == "invalidate":
+        removed = invalidate(None if args.all else args.version, cache_path=args.cache)
+        print(f"Removed {removed} cached results")
+    else:
+        for version, count in stats(cache_path=args.cache).items():
+            print(f"{version}\t{count}")
+
+
+if __name__ == "__main__":
+    main()
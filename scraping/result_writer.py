@@ -0,0 +1,332 @@
+import csv
+import datetime
+import io
+import logging
+import math
+import os
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+from scraping import profiling
+
+# Column -> type of the EPS rows written by every broker scraper.
+# sc_tag and file_name come from ExtractionJob.extra, firm and url are filled in for extractors that omit them.
+EPS_SCHEMA = {
+    "year": "string",
+    "clean_year": "int",
+    "eps": "float",
+    "is_forecast": "bool",
+    "report_date": "date",
+    "sec_code": "string",
+    "firm": "string",
+    "url": "string",
+    "sc_tag": "bool",
+    "file_name": "string",
+}
+
+# Daily price history rows from cafef, partitioned by sec_code in columnar output
+PRICE_HISTORY_SCHEMA = {
+    "sec_code": "string",
+    "date": "date",
+    "closing_price": "float",
+    "adjusted_price": "float",
+    "changes_percent": "string",
+    "auction_volume": "int",
+    "auction_value": "float",
+    "settlement_volume": "int",
+    "settlement_value": "float",
+    "opening_price": "float",
+    "highest_price": "float",
+    "lowest_price": "float",
+}
+PRICE_HISTORY_PARTITIONING = ["sec_code"]
+
+# Columnar EPS output is laid out as <path>/firm=<firm>/report_year=<yyyy>/part-*.parquet
+EPS_PARTITIONING = {
+    "firm": lambda row: row["firm"],
+    "report_year": lambda row: getattr(parse_date(row["report_date"]), "year", None),
+}
+
+DEFAULT_FLUSH_ROWS = 500
+DEFAULT_FLUSH_SECONDS = 30
+
+# Formats seen in report and price dates, tried in order
+DATE_FORMATS = ("%d/%m/%Y", "%Y-%m-%d", "%d-%m-%Y", "%d.%m.%Y")
+# Directory name pyarrow uses for a null partition value
+NULL_PARTITION = "__HIVE_DEFAULT_PARTITION__"
+
+
+def _is_missing(value):
+    return value is None or (isinstance(value, float) and math.isnan(value)) or value == ""
+
+
+def parse_date(value):
+    """datetime.date for a date, datetime or date string in one of DATE_FORMATS, else None."""
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    if isinstance(value, datetime.date):
+        return value
+    if not isinstance(value, str):
+        return None
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.datetime.strptime(value.strip(), fmt).date()
+        except ValueError:
+            continue
+    return None
+
+
+def _coerce(value, kind):
+    if _is_missing(value):
+        return None
+    if kind == "date":
+        # Kept as given until written: CSV keeps the source text, Parquet parses it to date32
+        return value if isinstance(value, datetime.date) else str(value).strip()
+    if kind == "float":
+        try:
+            return float(str(value).replace(",", ""))
+        except ValueError:
+            return None
+    if kind == "int":
+        try:
+            return int(float(str(value).replace(",", "")))
+        except ValueError:
+            return None
+    if kind == "bool":
+        if isinstance(value, str):
+            return value.strip().lower() in ("true", "1", "yes")
+        return bool(value)
+    return str(value)
+
+
+def _format_for(path):
+    return "parquet" if path.endswith(".parquet") else "csv"
+
+
+class ResultWriter:
+    """
+    Buffered, schema enforcing writer for scraped rows.
+
+    Rows are conformed to `schema` (column -> "string" / "float" / "int" / "bool" / "date"): missing
+    columns are filled with None, unknown columns are dropped with a warning. The buffer is
+    flushed every `flush_rows` rows, on the first write `flush_seconds` after the previous
+    flush, and on close.
+
+    The format follows the path: "*.parquet" is a directory of part files (each written to
+    a temporary name and renamed), anything else a CSV file appended to with one write per
+    flush. A CSV left with a torn last line by a crash is trimmed when it is reopened, and
+    one written with fewer columns (before the schema grew) is migrated when it is opened.
+    Buffered rows are only dropped once written: after a failed flush they are written
+    again, with their `on_flushed` callbacks, on the next one.
+
+    Parquet output is hive partitioned by `partition_by`, a list of columns or a dict of
+    partition name -> function(row). Partition columns taken from the schema are stored in
+    the directory names only; read the dataset back with scraping.datasets.read_dataset.
+
+    `write(rows, on_flushed)` calls `on_flushed()` once those rows are on disk, so callers can
+    record progress (e.g. in a CrawlJournal) only for rows that will survive a crash.
+    """
+
+    def __init__(self, path, schema, flush_rows=DEFAULT_FLUSH_ROWS, flush_seconds=DEFAULT_FLUSH_SECONDS, partition_by=None):
+        self.path = path
+        self.schema = dict(schema)
+        self.columns = list(self.schema)
+        self.format = _format_for(path)
+        if isinstance(partition_by, (list, tuple)):
+            partition_by = {column: (lambda row, column=column: row[column]) for column in partition_by}
+        self.partition_by = partition_by or {}
+        self.flush_rows = flush_rows
+        self.flush_seconds = flush_seconds
+
+        self._lock = threading.Lock()
+        self._buffer = []
+        self._callbacks = []
+        self._last_flush = time.monotonic()
+        self._dropped = set()
+        self._parts = 0
+        if self.format == "csv":
+            # Before anything is crawled, so a bad existing file fails early
+            self._prepare_csv()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    def _conform(self, row):
+        unknown = set(row) - set(self.schema) - self._dropped
+        if unknown:
+            logging.warning(f"Dropping columns {sorted(unknown)} not in the schema of {self.path}")
+            self._dropped |= unknown
+        return {column: _coerce(row.get(column), kind) for column, kind in self.schema.items()}
+
+    def write(self, rows, on_flushed=None):
+        with self._lock:
+            self._buffer.extend(self._conform(row) for row in rows)
+            if on_flushed:
+                self._callbacks.append(on_flushed)
+            due = len(self._buffer) >= self.flush_rows or time.monotonic() - self._last_flush >= self.flush_seconds
+            if due:
+                self._flush_locked()
+
+    def write_row(self, row, on_flushed=None):
+        self.write([row], on_flushed)
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        self._last_flush = time.monotonic()
+        rows, callbacks = self._buffer, self._callbacks
+        if rows:
+            # The buffer is kept until the rows are on disk, a failed write is retried on the next flush
+            with profiling.stage(f"write.{self.format}"):
+                if self.format == "parquet":
+                    self._write_parquet(rows)
+                else:
+                    self._write_csv(rows)
+            profiling.count("write.rows", len(rows))
+            logging.info(f"Wrote {len(rows)} rows to {self.path}")
+        self._buffer, self._callbacks = [], []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logging.error(f"Error in flush callback of {self.path}: {e}")
+
+    def _prepare_csv(self):
+        """
+        Drop a torn last line from an existing file and check its header against the schema.
+        A file written before columns were added to the schema is migrated (new columns
+        left empty); a file with other columns is moved aside with a warning.
+        """
+        if not os.path.exists(self.path) or os.path.getsize(self.path) == 0:
+            return
+        with open(self.path, "r+b") as f:
+            header = f.readline().decode("utf-8-sig").rstrip("\r\n")
+            f.seek(0, os.SEEK_END)
+            size = f.tell()
+            f.seek(max(0, size - 1))
+            if f.read(1) != b"\n":
+                f.seek(0)
+                content = f.read()
+                f.truncate(content.rfind(b"\n") + 1)
+                logging.warning(f"Trimmed an incomplete last line from {self.path}")
+        columns = next(csv.reader([header]))
+        if columns == self.columns:
+            return
+        if set(columns) <= set(self.columns):
+            self._migrate_csv(columns)
+            return
+        stem, ext = os.path.splitext(self.path)
+        legacy_path = f"{stem}.legacy-{time.strftime('%Y%m%d%H%M%S')}{ext}"
+        os.replace(self.path, legacy_path)
+        logging.warning(f"{self.path} has columns {columns}, expected {self.columns}; moved it to {legacy_path}")
+
+    def _migrate_csv(self, columns):
+        """Rewrite the file with the schema's columns, filling the ones it lacks with empty values."""
+        directory = os.path.dirname(self.path) or "."
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".part")
+        try:
+            with open(self.path, "r", encoding="utf-8-sig", newline="") as src, \
+                    os.fdopen(fd, "w", encoding="utf-8", newline="") as dst:
+                writer = csv.DictWriter(dst, fieldnames=self.columns, lineterminator="\n")
+                writer.writeheader()
+                writer.writerows(csv.DictReader(src))
+                dst.flush()
+                os.fsync(dst.fileno())
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        logging.warning(f"Migrated {self.path} to the columns {self.columns} (added {sorted(set(self.columns) - set(columns))})")
+
+    def _write_csv(self, rows):
+        out = io.StringIO()
+        writer = csv.DictWriter(out, fieldnames=self.columns, lineterminator="\n")
+        if not os.path.exists(self.path) or os.path.getsize(self.path) == 0:
+            # First batch: write header and rows under a temporary name, then rename
+            writer.writeheader()
+            writer.writerows(rows)
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(self.path) or ".", suffix=".part")
+            with os.fdopen(fd, "w", encoding="utf-8", newline="") as f:
+                f.write(out.getvalue())
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+            return
+        writer.writerows(rows)
+        with open(self.path, "a", encoding="utf-8", newline="") as f:
+            size = f.tell()
+            try:
+                f.write(out.getvalue())
+                f.flush()
+                os.fsync(f.fileno())
+            except BaseException:
+                # Leave no partial batch behind, the whole batch is written again on retry
+                f.truncate(size)
+                raise
+
+    def _arrow_schema(self, columns):
+        import pyarrow as pa
+        types = {"string": pa.string(), "float": pa.float64(), "int": pa.int64(), "bool": pa.bool_(), "date": pa.date32()}
+        return pa.schema([(column, types[self.schema[column]]) for column in columns])
+
+    def _partition_dir(self, row):
+        parts = []
+        for name, key in self.partition_by.items():
+            value = key(row)
+            value = NULL_PARTITION if _is_missing(value) else str(value).replace("/", "_")
+            parts.append(f"{name}={value}")
+        return os.path.join(self.path, *parts)
+
+    def _write_parquet(self, rows):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise ImportError(f"Writing {self.path} needs pyarrow (pip install pyarrow)") from e
+
+        date_columns = [column for column, kind in self.schema.items() if kind == "date"]
+        stored = [column for column in self.columns if column not in self.partition_by]
+        arrow_schema = self._arrow_schema(stored)
+
+        groups = defaultdict(list)
+        for row in rows:
+            groups[self._partition_dir(row)].append(row)
+
+        self._parts += 1
+        name = f"part-{int(time.time() * 1000)}-{os.getpid()}-{self._parts:05d}.parquet"
+        # Every part is written under a temporary name first and only renamed once all of
+        # them are, so a failed flush leaves nothing behind and can be retried as a whole
+        written = []
+        try:
+            for directory, group in groups.items():
+                records = [
+                    {column: parse_date(row[column]) if column in date_columns else row[column] for column in stored}
+                    for row in group
+                ]
+                table = pa.Table.from_pylist(records, schema=arrow_schema)
+                os.makedirs(directory, exist_ok=True)
+                # Dot prefix keeps dataset readers from picking up a part still being written
+                fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".", suffix=".part")
+                os.close(fd)
+                written.append((tmp_path, os.path.join(directory, name)))
+                pq.write_table(table, tmp_path)
+        except BaseException:
+            for tmp_path, _ in written:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+            raise
+        for tmp_path, path in written:
+            os.replace(tmp_path, path)
+
+    def close(self):
+        self.flush()
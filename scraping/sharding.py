@@ -0,0 +1,150 @@
+import logging
+import threading
+
+from playwright.sync_api import sync_playwright
+
+from scraping import profiling, replay, waits
+
+# Serializes operator prompts when several shards need the same manual step
+_operator_lock = threading.Lock()
+
+
+def split_pages(start_page, max_pages, shards):
+    """Split pages start_page..max_pages into at most `shards` contiguous (first, last) ranges of near equal size."""
+    total = max_pages - start_page + 1
+    if total <= 0:
+        return []
+    shards = max(1, min(shards, total))
+    size, extra = divmod(total, shards)
+    ranges = []
+    first = start_page
+    for i in range(shards):
+        last = first + size + (1 if i < extra else 0) - 1
+        ranges.append((first, last))
+        first = last + 1
+    return ranges
+
+
+class UrlPagination:
+    """Listing whose pages are addressed by url, so a shard opens its first page directly."""
+
+    def __init__(self, url_for, load_state="networkidle", ready_selector=None, name=None, max_timeout=waits.DEFAULT_MAX_TIMEOUT):
+        self.url_for = url_for
+        self.load_state = load_state
+        self.ready_selector = ready_selector
+        self.name = name
+        self.max_timeout = max_timeout
+
+    def open(self, page, page_num):
+        url = self.url_for(page_num)
+        logging.info(f"Loading page {page_num}: {url}")
+        page.goto(url, timeout=60000)
+        page.wait_for_load_state(self.load_state)
+        if self.ready_selector:
+            waits.wait_for_selector(page, self.ready_selector, name=self.name, max_timeout=self.max_timeout)
+
+    def seek(self, page, current, page_num):
+        self.open(page, page_num)
+
+
+class ClickPagination:
+    """
+    Listing paged in place with a "next" button (VCBS, FPTS).
+
+    A shard loads `url`, runs `on_open(page)` (e.g. an operator setting filters) and clicks
+    through to its first page; every later page is one more click. Each click waits until
+    the text of `list_selector` changes.
+    """
+
+    def __init__(self, url, list_selector, next_selector, name, ready_selector=None, on_open=None, max_timeout=waits.DEFAULT_MAX_TIMEOUT):
+        self.url = url
+        self.list_selector = list_selector
+        self.next_selector = next_selector
+        self.name = name
+        self.ready_selector = ready_selector or list_selector
+        self.on_open = on_open
+        self.max_timeout = max_timeout
+
+    def open(self, page, page_num):
+        page.goto(self.url, timeout=60000)
+        page.wait_for_load_state("domcontentloaded")
+        if self.on_open:
+            with _operator_lock:
+                self.on_open(page)
+        waits.wait_for_selector(page, self.ready_selector, name=f"{self.name}.listing", max_timeout=self.max_timeout)
+        self.seek(page, 1, page_num)
+
+    def seek(self, page, current, page_num):
+        for skipped in range(current, page_num):
+            logging.debug(f"Skipping page {skipped} to reach page {page_num}")
+            waits.wait_for_change(page, self.list_selector, lambda: page.click(self.next_selector), name=f"{self.name}.next_page")
+        logging.info(f"Loading page {page_num}")
+
+
+def _crawl_shard(crawl_page, pagination, first, last, journal, headless):
+    shard_key = f"{first}-{last}"
+    done = journal.done_pages() if journal else set()
+    pages = [page_num for page_num in range(first, last + 1) if page_num not in done]
+    if not pages:
+        logging.info(f"Shard {shard_key} already finished")
+        return
+    logging.info(f"Shard {shard_key}: crawling {len(pages)} pages")
+
+    # The sync API is bound to the thread that started it, so every shard runs its own browser
+    with sync_playwright() as p:
+        browser = replay.launch(p.chromium, headless=headless)
+        context = browser.new_context()
+        page = context.new_page()
+        try:
+            with profiling.stage("navigation"):
+                pagination.open(page, pages[0])
+            current = pages[0]
+            for page_num in pages:
+                if page_num != current:
+                    with profiling.stage("navigation"):
+                        pagination.seek(page, current, page_num)
+                    current = page_num
+                try:
+                    with profiling.stage("crawl_page"):
+                        crawl_page(page, page_num)
+                except Exception as e:
+                    logging.error(f"Shard {shard_key}: error crawling page {page_num}: {e}")
+                    continue
+                if journal:
+                    journal.mark_page(page_num, shard=shard_key)
+        finally:
+            browser.close()
+
+
+def run_sharded(crawl_page, pagination, start_page, max_pages, shards=1, journal=None, headless=True):
+    """
+    Crawl listing pages start_page..max_pages, split into `shards` contiguous ranges that each
+    get their own thread and browser context.
+
+    `crawl_page(page, page_num)` handles the listing currently shown in `page` and must be
+    safe to call from several threads (the download store, Downloader and ExtractionPipeline
+    are), so every shard feeds the same result sink. A page is recorded in the CrawlJournal
+    `journal` once `crawl_page` returns, and skipped by the next run (see scraping.checkpoint).
+    """
+    ranges = split_pages(start_page, max_pages, shards)
+    if len(ranges) <= 1:
+        for first, last in ranges:
+            _crawl_shard(crawl_page, pagination, first, last, journal, headless)
+        return
+
+    failures = []
+
+    def run(first, last):
+        try:
+            _crawl_shard(crawl_page, pagination, first, last, journal, headless)
+        except Exception as e:
+            logging.error(f"Shard {first}-{last} stopped: {e}")
+            failures.append((first, last))
+
+    threads = [threading.Thread(target=run, args=shard, name=f"shard-{shard[0]}-{shard[1]}") for shard in ranges]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if failures:
+        logging.warning(f"Shards {failures} did not finish, rerun to resume them from the journal")
@@ -1,42 +1,41 @@
-import os
 import re
-import requests
 import logging
-import time
 from urllib.parse import urljoin
-from playwright.sync_api import sync_playwright
-import pandas as pd
 
-from scraping.eps_scraping_pdf import extract_clean_eps_v6
+from scraping.download_store import DEFAULT_STORE_DIR, get_store
+from scraping import waits
+from scraping.dom_extract import extract_items
+from scraping.pipeline import ExtractionPipeline, ExtractionJob, ResultSink
+from scraping.checkpoint import default_journal_path, get_journal
+from scraping.sharding import UrlPagination, run_sharded
 from scraping.utils.Utils import parse_vietnamese_date, extract_report_date
 
 ROOT_URL = "https://www.ssi.com.vn"
 BASE_URL = "https://www.ssi.com.vn/khach-hang-ca-nhan/bao-cao-cong-ty?&page="
 DATE_RANGE = ""
 PAGE_PARAM = ""
+
+REPORT_ITEMS = "div.chart__content__item.chart__content__item--undetail"
+PDF_LINK = "div.chart__content__item__time > a"
+# Read for every report in one round trip
+REPORT_FIELDS = {
+    "title": "a.titlePost",
+    "report_date": "div.chart__content__item__time > p > span",
+    "pdf_href": (PDF_LINK, "href"),
+}
         
-def scraping_ssi_all(download_dir="downloads", valid_codes=None, max_pages=20, start_page=1, output_dir="output/eps_rep_ssi.csv", blacklist_code=None, firm="SSV"):
-    os.makedirs(download_dir, exist_ok=True)
+def scraping_ssi_all(download_dir="downloads", valid_codes=None, max_pages=20, start_page=1, output_dir="output/eps_rep_ssi.csv", blacklist_code=None, firm="SSV", store_dir=DEFAULT_STORE_DIR, shards=1, checkpoint_path=None):
+    store = get_store(store_dir)
     
-    with sync_playwright() as p:
-        browser = p.chromium.launch(headless=False)
-        page = browser.new_page()
-        
-        time.sleep(60)  # Initial wait before starting
-        
-        page.goto(BASE_URL + "1", timeout=60000)
-        page.wait_for_load_state("networkidle")
-
-        for page_num in range(start_page, max_pages + 1):
-            url = f"{BASE_URL}{page_num}"
-            logging.info(f"Loading page {page_num}: {url}")
-            page.goto(url, timeout=60000)
-            page.wait_for_load_state("domcontentloaded")
+    journal = get_journal(checkpoint_path or default_journal_path(output_dir))
+    
+    with ExtractionPipeline("v6", ResultSink(output_dir), journal=journal, valid_codes=valid_codes, blacklist_codes=blacklist_code) as pipeline:
 
-            report_items = page.query_selector_all("div.chart__content__item.chart__content__item--undetail")
+        def crawl_page(page, page_num):
+            report_items = extract_items(page, REPORT_ITEMS, REPORT_FIELDS)
             if not report_items:
                 logging.info(f"No reports found on page {page_num}, stopping.")
-                continue
+                return
             logging.info(f"Found {len(report_items)} reports on page {page_num}")
             for idx, report_item in enumerate(report_items, start=1):
                 sec_code = None
@@ -45,21 +44,19 @@ def scraping_ssi_all(download_dir="downloads", valid_codes=None, max_pages=20, s
                 
                 # Detect sec_code
                 try:
-                    sec_code_tag = report_item.query_selector("a.titlePost")
-                    report_date_tag = report_item.query_selector("div.chart__content__item__time > p > span")
-                    logging.info(f"Report item {idx} on page {page_num} - sec_code_tag: {sec_code_tag}, report_date_tag: {report_date_tag}")
+                    logging.info(f"Report item {idx} on page {page_num} - title: {report_item['title']}, report_date: {report_item['report_date']}")
 
-                    if sec_code_tag:
-                        sec_code = sec_code_tag.text_content().strip()[:3].upper()
+                    if report_item["title"] is not None:
+                        sec_code = report_item["title"][:3].upper()
                         is_sec_code_tagged = True
                     else:
                         logging.warning(f"Could not find sec_code for report {idx} on page {page_num}, fallback to sec code tickets.")
 
-                    if not report_date_tag:
+                    if report_item["report_date"] is None:
                         logging.warning(f"Could not find report date for report {idx} on page {page_num}, skipping.")
                         continue
                     
-                    report_date = report_date_tag.text_content().strip()
+                    report_date = report_item["report_date"]
                     logging.info(f"[Page {page_num} - Report {idx}] {sec_code} ({report_date})")
                     
                 except Exception as e:
@@ -111,51 +108,37 @@ def scraping_ssi_all(download_dir="downloads", valid_codes=None, max_pages=20, s
                 local_path = None
                 pdf_url = None
                 try:
-                    pdf_link_tag = report_item.query_selector("div.chart__content__item__time > a")
-                    pdf_url = urljoin(BASE_URL, pdf_link_tag.get_attribute("href"))
-                    if not pdf_link_tag:
+                    if report_item["pdf_href"] is None:
                         logging.warning(f"No PDF link in report {idx} on page {page_num}, skipping.")
                         continue
+                    pdf_url = urljoin(BASE_URL, report_item["pdf_href"])
 
                     logging.info(f"Found PDF link for report {idx} on page {page_num}")
-
-                    # Use Playwright download API
-                    with page.expect_download() as download_info:
-                        pdf_link_tag.click()   # triggers the download
-                    download = download_info.value
-
-                    # Playwright suggests the real filename (from server headers)
-                    filename = download.suggested_filename
-                    local_path = os.path.join(download_dir, filename)
-
-                    logging.info(f"Saving PDF -> {local_path}")
-                    download.save_as(local_path)
-
-                except Exception as e:
-                    logging.error(f"Error downloading PDF for report {idx} on page {page_num}: {e}")
-                    continue
-                
-                # Extract EPS
-                try:
-                    eps_results = extract_clean_eps_v6(local_path, report_date, valid_codes=valid_codes, blacklist_codes=blacklist_code, firm=firm, url=pdf_url, already_detected_sc=sec_code)
-                    logging.info(f"Extracted {len(eps_results)} EPS entries from {local_path}")
-                    logging.info(f"EPS Results: {eps_results}")
-                    if not eps_results:
-                        logging.info(f"No EPS data extracted from {local_path}")
+                    if journal.item_done(pdf_url):
                         continue
-                    
-                    result_df = pd.DataFrame(eps_results)
-                    result_df["sc_tag"] = is_sec_code_tagged
-                    os.makedirs("output", exist_ok=True)
-                    if not os.path.exists(output_dir):
-                        result_df.to_csv(output_dir, index=False)
-                        logging.info(f"Results saved to {output_dir}")
+
+                    local_path = store.lookup(pdf_url)
+                    if local_path:
+                        logging.info(f"PDF already downloaded: {pdf_url} -> {local_path}")
                     else:
-                        result_df.to_csv(output_dir, mode="a", header=False, index=False)
-                        logging.info(f"Results appended to {output_dir}")
+                        # Use Playwright download API
+                        with page.expect_download() as download_info:
+                            page.locator(REPORT_ITEMS).nth(idx - 1).locator(PDF_LINK).first.click()   # triggers the download
+                        local_path = store.save_download(pdf_url, download_info.value, staging_dir=download_dir)
 
                 except Exception as e:
-                    logging.error(f"Error processing report {idx} on page {page_num}: {e}")
+                    logging.error(f"Error downloading PDF for report {idx} on page {page_num}: {e}")
                     continue
                 
-        browser.close()
+                # Queue EPS extraction, workers parse the PDF while the crawler moves on
+                pipeline.submit(ExtractionJob(local_path, report_date, sec_code, firm, pdf_url, {"sc_tag": is_sec_code_tagged}, page=page_num))
+
+        pagination = UrlPagination(
+            lambda page_num: f"{BASE_URL}{page_num}", load_state="domcontentloaded",
+            ready_selector="div.chart__content__item", name="ssi.listing", max_timeout=60000
+        )
+        run_sharded(
+            crawl_page, pagination, start_page, max_pages,
+            shards=shards, journal=journal, headless=False
+        )
+        waits.log_wait_stats()
@@ -1,7 +1,11 @@
-import re
 import logging
 from datetime import datetime
 
+from scraping.patterns import (
+    DMY_DATE_PATTERN, FOUR_DIGIT_YEAR_PATTERN, ISO_DATE_PATTERN, REPORT_DATE_PATTERN, SEC_CODE_BLACKLIST,
+    TICKER_NOISE_PATTERN, TICKER_PATTERN, TITLE_TICKER_WITH_DIGIT_PATTERN, VALID_TICKER_PATTERN, YEAR_TOKEN_PATTERN
+)
+
 def parse_vietnamese_date(date_string):
     """
     Parse Vietnamese date format (DD/MM/YYYY) and return day, month, year as integers
@@ -17,8 +21,7 @@ def parse_vietnamese_date(date_string):
         date_string = date_string.strip()
         
         # Pattern to match DD/MM/YYYY format
-        date_pattern = r'(\d{1,2})/(\d{1,2})/(\d{4})'
-        match = re.search(date_pattern, date_string)
+        match = DMY_DATE_PATTERN.search(date_string)
         
         if match:
             day = int(match.group(1))
@@ -34,8 +37,7 @@ def parse_vietnamese_date(date_string):
         else:
             # Try alternative formats or patterns
             # Pattern for YYYY-MM-DD format
-            iso_pattern = r'(\d{4})-(\d{1,2})-(\d{1,2})'
-            iso_match = re.search(iso_pattern, date_string)
+            iso_match = ISO_DATE_PATTERN.search(date_string)
             
             if iso_match:
                 year = int(iso_match.group(1))
@@ -69,76 +71,29 @@ def clean_number(val):
         except:
             return None
 
-year_patterns = [
-    r"\d{4}(?:E|F)", 
-    r"(?:Dec)[- ]?\d{2}",
-    r"31/12/\d{2,4}",
-    r"FY\d{2,4}[EF]?",
-    r"F\*\d{2,4}"
-]
-        
 def normalize_year(raw):
     """
     Convert strings like '2018F', '2017E', 'Dec-21', '31/12/2022', 'F*22', 'F*2022', 'FY22', 'FY2022E', '2022A'
     into a clean 4-digit year string.
+    One scan with YEAR_TOKEN_PATTERN: a 4-digit run anywhere is returned as is, two digit
+    short forms are mapped to 20yy below 50 and 19yy otherwise. Unrecognized labels are returned stripped.
     """
     if not raw:
         return None
     raw = raw.strip()
-    
-    # Handle 4-digit year with all suffixes
-    m = re.match(r"(\d{4})(?:[A-Z])?", raw, re.IGNORECASE)
-    if m:
-        return m.group(1)
-        
-
-    # Handle DD/MM/YYYY or similar
-    m = re.search(r"\d{4}", raw)
-    if m:
-        return m.group(0)
-    
-    # Handle 31/12/2022, 31/12/22 etc.
-    m = re.match(r"31/12/(\d{2,4})", raw)
-    if m:
-        yy = int(m.group(1))
-        year = 2000 + yy if yy < 50 else 1900 + yy
-        return str(year)
-    
-    # Handle FY22, FY2022, FY2022E etc.
-    m = re.match(r"FY(\d{2,4})(?:[EF])?", raw, re.IGNORECASE)
-    if m:
-        yy = int(m.group(1))
-        year = 2000 + yy if yy < 50 else 1900 + yy
-        return str(year)
-    
-
-    # Handle Dec-21, Mar-20 etc.
-    m = re.match(r"(?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)[- ]?(\d{2})", raw, re.IGNORECASE)
-    if m:
-        yy = int(m.group(1))
-        # assume 2000s if yy < 50 else 1900s
-        year = 2000 + yy if yy < 50 else 1900 + yy
-        return str(year)
-
-    # Handle F*22, F22F etc.
-    m = re.match(r"F\*?(\d{2})", raw)
-    if m:
-        yy = int(m.group(1))
-        year = 2000 + yy if yy < 50 else 1900 + yy
-        return str(year)
-
-    # Handle F*2022, F*22 etc.
-    m = re.match(r"F\*?(\d{2,4})", raw)
-    if m:
-        yy = int(m.group(1))
-        year = 2000 + yy if yy < 50 else 1900 + yy
-        return str(year)
 
-    return raw  # fallback
+    m = YEAR_TOKEN_PATTERN.search(raw)
+    if not m:
+        return raw  # fallback
+    if m.group("year"):
+        return m.group("year")
+    yy = int(m.group(m.lastgroup))
+    year = 2000 + yy if yy < 50 else 1900 + yy
+    return str(year)
 
 def verify_four_digit_year(year_str):
     """Verify if the given string is a valid 4-digit year."""
-    if re.match(r"^\d{4}$", year_str):
+    if FOUR_DIGIT_YEAR_PATTERN.match(year_str):
         year_int = int(year_str)
         if 1900 <= year_int <= 2100:  # reasonable range for years
             return True
@@ -149,7 +104,7 @@ def extract_report_date(text: str) -> str:
     Extracts a date in format DD/MM/YYYY from given text.
     Returns a datetime.date object, or None if not found.
     """
-    match = re.search(r"\b(\d{2}/\d{2}/\d{4})\b", text)
+    match = REPORT_DATE_PATTERN.search(text)
     if match:
         try:
             return match.group(1)
@@ -175,21 +130,10 @@ def extract_sec_code_from_title(title: str) -> str:
     Extracts a stock code (3 uppercase letters) from a given title string.
     Returns the stock code if found, else None.
     """
-    matches = re.findall(r"(?<![A-Z])([A-Z]{3})(?![A-Z])", title)
-    matches += re.findall(r"(?<![A-Z])([A-Z]{2}\d)(?![1-9])", title)
+    matches = TICKER_PATTERN.findall(title)
+    matches += TITLE_TICKER_WITH_DIGIT_PATTERN.findall(title)
 
-    blacklist_codes = {"MBS", "PDF", "EPS", 
-                        "KKN", "CP", "QTR", 
-                        "BCT", "KCN", "HNX", 
-                        "HSX", "HOSE", "VNI", 
-                        "VN30", "UPCOM", "USD", 
-                        "VND", "VIX", "VNINDEX", 
-                        "FY2", "FY1", "YTD", "MUA", "BÁN", "VNĐ", 
-                        "NIM", "NPL", "IEA", "KHO", "BLĐ", "NII",
-                        "PER", "ROE", "ROA", "P/B", "P/E", "PBR",
-                        "CIR", "COV"
-                        }
-    tickers = [m for m in matches if m not in blacklist_codes]
+    tickers = [m for m in matches if m not in SEC_CODE_BLACKLIST]
 
     if tickers:
         sec_code = max(set(tickers), key=tickers.count)  # most frequent
@@ -202,19 +146,8 @@ def validate_sec_code(sec_code: str) -> bool:
     Remove dấu hỏi, dấu chấm, dấu phẩy, dấu gạch ngang, dấu gạch dưới, khoảng trắng.
     Returns True if valid, else False.
     """
-    sec_code = re.sub(r"[?.,\-_ ]", "", sec_code)   # remove unwanted characters
-    blacklist_codes = {"MBS", "PDF", "EPS", 
-                        "KKN", "CP", "QTR", 
-                        "BCT", "KCN", "HNX", 
-                        "HSX", "HOSE", "VNI", 
-                        "VN30", "UPCOM", "USD", 
-                        "VND", "VIX", "VNINDEX", 
-                        "FY2", "FY1", "YTD", "MUA", "BÁN", "VNĐ", 
-                        "NIM", "NPL", "IEA", "KHO", "BLĐ", "NII",
-                        "PER", "ROE", "ROA", "P/B", "P/E", "PBR",
-                        "CIR", "VIE", "COV"
-                        }
-    if re.match(r"^[A-Z]{3}$", sec_code) or re.match(r"^[A-Z]{2}\d$", sec_code):
-        if sec_code not in blacklist_codes:
+    sec_code = TICKER_NOISE_PATTERN.sub("", sec_code)   # remove unwanted characters
+    if VALID_TICKER_PATTERN.match(sec_code):
+        if sec_code not in SEC_CODE_BLACKLIST:
             return True
     return False
\ No newline at end of file
@@ -1,48 +1,41 @@
-import os
 import re
-import requests
 import logging
-import time
 from urllib.parse import urljoin
-from playwright.sync_api import sync_playwright
-import pandas as pd
 from PyPDF2 import PdfReader
 
-from scraping.eps_scraping_pdf import extract_clean_eps_v6
+from scraping.download_store import DEFAULT_STORE_DIR
+from scraping.downloader import get_downloader
+from scraping import waits
+from scraping.dom_extract import extract_items
+from scraping.pipeline import ExtractionPipeline, ExtractionJob, ResultSink
+from scraping.checkpoint import default_journal_path, get_journal
+from scraping.sharding import ClickPagination, run_sharded
 from scraping.utils.Utils import parse_vietnamese_date, extract_report_date
 
 ROOT_URL = "https://www.vcbs.com.vn"
 BASE_URL = "https://www.vcbs.com.vn/trung-tam-phan-tich/bao-cao-chi-tiet?code=BCDN&page="
+
+REPORT_ITEMS = "div.t-acReportList_list > div.t-acReportList_list-item"
+# Read for every report card in one round trip, the PDF only opens by clicking its icon
+REPORT_FIELDS = {
+    "title": "div.o-simpleReportCard_title > h3",
+}
 DATE_RANGE = ""
 PAGE_PARAM = ""
         
-def scraping_vcbs_all(download_dir="downloads", valid_codes=None, max_pages=20, start_page=1, output_dir="output/eps_rep_vcbs.csv", blacklist_code=None, firm="SSV"):
-    os.makedirs(download_dir, exist_ok=True)
+def scraping_vcbs_all(download_dir="downloads", valid_codes=None, max_pages=20, start_page=1, output_dir="output/eps_rep_vcbs.csv", blacklist_code=None, firm="SSV", store_dir=DEFAULT_STORE_DIR, shards=1, checkpoint_path=None):
+    """download_dir is deprecated and ignored, reports are kept in the DownloadStore at store_dir."""
+    downloader = get_downloader(store_dir)
     
-    with sync_playwright() as p:
-        browser = p.chromium.launch(headless=False)
-        page = browser.new_page()
-        
-        page.goto(BASE_URL, timeout=60000)
-        page.wait_for_load_state("domcontentloaded")
-        time.sleep(5)  # wait for JS to load content
-
-        for page_num in range(1, max_pages + 1):
-            # Handle skip page from 1 to start_page
-            if page_num < start_page:
-                logging.info(f"Skipping page {page_num} to reach start_page {start_page}")
-                next_button = page.query_selector("a.link-page.link-next")
-                next_button.click()
-                page.wait_for_load_state("domcontentloaded")
-                time.sleep(0.5)  # wait for 0.5 seconds to ensure the next page is loaded
-                continue
-            
-            logging.info(f"Loading page {page_num}")
-
-            report_items = page.query_selector_all("div.t-acReportList_list > div.t-acReportList_list-item")
+    journal = get_journal(checkpoint_path or default_journal_path(output_dir))
+    
+    with ExtractionPipeline("v6", ResultSink(output_dir), journal=journal, valid_codes=valid_codes, blacklist_codes=blacklist_code) as pipeline:
+
+        def crawl_page(page, page_num):
+            report_items = extract_items(page, REPORT_ITEMS, REPORT_FIELDS)
             if not report_items:
                 logging.info(f"No reports found on page {page_num}, stopping.")
-                continue
+                return
             logging.info(f"Found {len(report_items)} reports on page {page_num}")
             for idx, report_item in enumerate(report_items, start=1):
                 sec_code = None
@@ -51,11 +44,11 @@ def scraping_vcbs_all(download_dir="downloads", valid_codes=None, max_pages=20,
                 
                 # Detect sec_code
                 try:
-                    sec_code_tag = report_item.query_selector("div.o-simpleReportCard_title > h3")
-                    logging.info(f"Report {idx} title: {sec_code_tag.text_content().strip() if sec_code_tag else 'N/A'}")
+                    title = report_item["title"]
+                    logging.info(f"Report {idx} title: {title if title is not None else 'N/A'}")
 
-                    if sec_code_tag:
-                        sec_code = sec_code_tag.text_content().strip()[:3].upper()
+                    if title is not None:
+                        sec_code = title[:3].upper()
                         is_sec_code_tagged = True
                     else:
                         logging.warning(f"Could not find sec_code for report {idx} on page {page_num}, fallback to sec code tickets.")
@@ -70,23 +63,18 @@ def scraping_vcbs_all(download_dir="downloads", valid_codes=None, max_pages=20,
                 local_path = None
                 report_date = None
                 try:
-                    pdf_page = report_item.query_selector("div.o-simpleReportCard_icon")
-                    
                     with page.expect_popup() as popup_info:
-                        pdf_page.click()
+                        page.locator(REPORT_ITEMS).nth(idx - 1).locator("div.o-simpleReportCard_icon").first.click()
                     
                     popup_info.value.wait_for_load_state("networkidle")
-                    time.sleep(0.4)  # wait for JS to load content
+                    waits.wait_for_url(popup_info.value, lambda url: not url.startswith("about:"), name="vcbs.popup_url", max_timeout=10000)
                     
                     pdf_url = popup_info.value.url
                     logging.info(f"Popup opened with PDF URL: {pdf_url}")
+                    if journal.item_done(pdf_url):
+                        continue
 
-                    filename = os.path.basename(f"{sec_code}_page{page_num}") + ".pdf"
-                    local_path = os.path.join(download_dir, filename)
-                    logging.info(f"Downloading PDF {pdf_url} -> {local_path}")
-                    response = requests.get(pdf_url)
-                    with open(local_path, "wb") as f:
-                        f.write(response.content)
+                    local_path = downloader.fetch(pdf_url)  # needed right away for the report date
                         
                     pdf = PdfReader(local_path)
                     report_date = pdf.metadata.creation_date
@@ -192,31 +180,16 @@ def scraping_vcbs_all(download_dir="downloads", valid_codes=None, max_pages=20,
                 #     logging.error(f"Error downloading PDF from popup: {e}")
                 #     return None
                 
-                # # Extract EPS
-                try:
-                    eps_results = extract_clean_eps_v6(local_path, report_date, valid_codes=valid_codes, blacklist_codes=blacklist_code, firm=firm, url=pdf_url, already_detected_sc=sec_code)
-                    logging.info(f"Extracted {len(eps_results)} EPS entries from {local_path}")
-                    logging.info(f"EPS Results: {eps_results}")
-                    if not eps_results:
-                        logging.info(f"No EPS data extracted from {local_path}")
-                        continue
-                    
-                    result_df = pd.DataFrame(eps_results)
-                    result_df["sc_tag"] = is_sec_code_tagged
-                    os.makedirs("output", exist_ok=True)
-                    if not os.path.exists(output_dir):
-                        result_df.to_csv(output_dir, index=False)
-                        logging.info(f"Results saved to {output_dir}")
-                    else:
-                        result_df.to_csv(output_dir, mode="a", header=False, index=False)
-                        logging.info(f"Results appended to {output_dir}")
-
-                except Exception as e:
-                    logging.error(f"Error processing report {idx} on page {page_num}: {e}")
-                    continue
-                
-            page.click("a.link-page.link-next")
-            page.wait_for_load_state("domcontentloaded")
-            time.sleep(2)  # wait for JS to load content
-                
-        browser.close()
+                # Queue EPS extraction, workers parse the PDF while the crawler moves on
+                pipeline.submit(ExtractionJob(local_path, report_date, sec_code, firm, pdf_url, {"sc_tag": is_sec_code_tagged}, page=page_num))
+
+        # Pagination is click-only, each shard clicks through to its first page
+        pagination = ClickPagination(
+            BASE_URL, "div.t-acReportList_list", "a.link-page.link-next", name="vcbs",
+            ready_selector="div.t-acReportList_list > div.t-acReportList_list-item"
+        )
+        run_sharded(
+            crawl_page, pagination, start_page, max_pages,
+            shards=shards, journal=journal, headless=False
+        )
+        waits.log_wait_stats()
@@ -1,42 +1,57 @@
-import os
 import re
-import requests
 import logging
-import time
 from urllib.parse import urljoin
 from playwright.sync_api import sync_playwright
-import pandas as pd
 
-from scraping.eps_scraping_pdf import extract_clean_eps_v6
+from scraping.download_store import DEFAULT_STORE_DIR
+from scraping.downloader import get_downloader
+from scraping import waits
+from scraping import profiling, replay
+from scraping.dom_extract import extract_items
+from scraping.pipeline import ExtractionPipeline, ExtractionJob, ResultSink
+from scraping.checkpoint import default_journal_path, get_journal
 from scraping.utils.Utils import parse_vietnamese_date, extract_report_date
 
 ROOT_URL = "https://www.vdsc.com.vn"
 BASE_URL = "https://www.vdsc.com.vn/trung-tam-phan-tich/doanh-nghiep?page="
 DATE_RANGE = ""
 PAGE_PARAM = ""
+
+REPORT_ITEMS = "div.list-report div.col-6.col-md-3"
+# Read for every report card in one round trip, the PDF only opens by clicking the card
+REPORT_FIELDS = {
+    "title": "h3",
+    "day": "h2.title",
+    "month": "h4.title",
+}
         
-def scraping_vds_all(download_dir="downloads", valid_codes=None, max_pages=20, start_page=1, output_dir="output/eps_rep_vds.csv", blacklist_code=None, firm="SSV"):
-    os.makedirs(download_dir, exist_ok=True)
+def scraping_vds_all(download_dir="downloads", valid_codes=None, max_pages=20, start_page=1, output_dir="output/eps_rep_vds.csv", blacklist_code=None, firm="SSV", store_dir=DEFAULT_STORE_DIR, checkpoint_path=None):
+    """download_dir is deprecated and ignored, reports are kept in the DownloadStore at store_dir."""
+    downloader = get_downloader(store_dir)
+    
+    journal = get_journal(checkpoint_path or default_journal_path(output_dir))
+    done_pages = journal.done_pages()
     
-    with sync_playwright() as p:
-        browser = p.chromium.launch(headless=False)
+    with sync_playwright() as p, ExtractionPipeline("v6", ResultSink(output_dir), journal=journal, valid_codes=valid_codes, blacklist_codes=blacklist_code) as pipeline:
+        browser = replay.launch(p.chromium, headless=False)
         page = browser.new_page()
         
-        time.sleep(60)  # Initial wait before starting
-        page.wait_for_load_state("domcontentloaded")
-
-        
-        page.goto(BASE_URL + "1", timeout=60000)
-        page.wait_for_load_state("domcontentloaded")
+        with profiling.stage("navigation"):
+            page.goto(BASE_URL + "1", timeout=60000)
+            page.wait_for_load_state("domcontentloaded")
+        waits.wait_for_selector(page, "div.list-report div.col-6.col-md-3", name="vds.listing", max_timeout=60000)
 
         for page_num in range(start_page, max_pages + 1):
+            if page_num in done_pages:
+                logging.info(f"Page {page_num} already done, skipping.")
+                continue
             url = f"{BASE_URL}{page_num}"
             logging.info(f"Loading page {page_num}: {url}")
-            page.goto(url, timeout=60000)
-            page.wait_for_load_state("domcontentloaded")
+            with profiling.stage("navigation"):
+                page.goto(url, timeout=60000)
+                page.wait_for_load_state("domcontentloaded")
             
-            content = page.query_selector("div.list-report")
-            report_items = content.query_selector_all(" div.col-6.col-md-3")
+            report_items = extract_items(page, REPORT_ITEMS, REPORT_FIELDS)
             if not report_items:
                 logging.info(f"No reports found on page {page_num}, stopping.")
                 continue
@@ -48,25 +63,25 @@ def scraping_vds_all(download_dir="downloads", valid_codes=None, max_pages=20, s
                 
                 # Detect sec_code
                 try:
-                    sec_code_tag = report_item.query_selector("h3")
-                    date = report_item.query_selector("h2.title")
-                    month = report_item.query_selector("h4.title")
-                    logging.info(f"Report {idx} title: {sec_code_tag.text_content().strip() if sec_code_tag else 'N/A'}")
-                    logging.info(f"Extracted date: {date.text_content().strip() if date else 'N/A'}, month: {month.text_content().strip() if month else 'N/A'}")
-
-                    if sec_code_tag:
-                        sec_code = sec_code_tag.text_content().strip()[:3].upper()
+                    title = report_item["title"]
+                    date = report_item["day"]
+                    month = report_item["month"]
+                    logging.info(f"Report {idx} title: {title if title is not None else 'N/A'}")
+                    logging.info(f"Extracted date: {date if date is not None else 'N/A'}, month: {month if month is not None else 'N/A'}")
+
+                    if title is not None:
+                        sec_code = title[:3].upper()
                         is_sec_code_tagged = True
                     else:
                         logging.warning(f"Could not find sec_code for report {idx} on page {page_num}, fallback to sec code tickets.")
 
-                    if not date or not month:
+                    if date is None or month is None:
                         logging.warning(f"Could not find report date for report {idx} on page {page_num}, skipping.")
                         continue
                     # Replace 'Tháng' in month with ''
-                    month_text = month.text_content().lower().replace("tháng", "").replace("-", "/").replace(" ", "").strip()
+                    month_text = month.lower().replace("tháng", "").replace("-", "/").replace(" ", "").strip()
 
-                    report_date = f"{date.text_content().strip()}/{month_text}"
+                    report_date = f"{date}/{month_text}"
                     logging.info(f"[Page {page_num} - Report {idx}] {sec_code} ({report_date})")
                     
                 except Exception as e:
@@ -144,63 +159,33 @@ def scraping_vds_all(download_dir="downloads", valid_codes=None, max_pages=20, s
                 
                 # Get pdf link and download
                 local_path = None
-                pdf_link_tag = report_item
                 try:
                     # Step 1: Catch popup
                     with page.expect_popup() as popup_info:
-                        pdf_link_tag.click()
+                        page.locator(REPORT_ITEMS).nth(idx - 1).click()
                     popup = popup_info.value
                     popup.wait_for_load_state("networkidle")
 
                     # Step 2: Get PDF URL
                     pdf_url = popup.url
                     logging.info(f"Popup opened with PDF URL: {pdf_url}")
+                    if journal.item_done(pdf_url):
+                        popup.close()
+                        continue
 
-                    # Step 3: Extract filename and set local path
-                    filename = os.path.basename(pdf_url.split("?")[0])  # strip query params
-                    local_path = os.path.join(download_dir, filename)
-
-                    # Step 4: Download using requests with cookies (to handle auth)
-                    cookies = page.context.cookies()
-                    session = requests.Session()
-                    for c in cookies:
-                        session.cookies.set(c["name"], c["value"], domain=c["domain"])
-
-                    response = session.get(pdf_url, stream=True)
-                    response.raise_for_status()
-
-                    with open(local_path, "wb") as f:
-                        for chunk in response.iter_content(8192):
-                            f.write(chunk)
-
-                    logging.info(f"PDF saved to {local_path}")
+                    # Step 3: Queue the download with the browser cookies (to handle auth), skipped when already stored
+                    cookies = {c["name"]: c["value"] for c in page.context.cookies(pdf_url)}
+                    local_path = downloader.submit(pdf_url, cookies=cookies)
                     popup.close()
 
                 except Exception as e:
                     logging.error(f"Error downloading PDF from popup: {e}")
                     return None
                 
-                # Extract EPS
-                try:
-                    eps_results = extract_clean_eps_v6(local_path, report_date, valid_codes=valid_codes, blacklist_codes=blacklist_code, firm=firm, url=pdf_url, already_detected_sc=sec_code)
-                    logging.info(f"Extracted {len(eps_results)} EPS entries from {local_path}")
-                    logging.info(f"EPS Results: {eps_results}")
-                    if not eps_results:
-                        logging.info(f"No EPS data extracted from {local_path}")
-                        continue
-                    
-                    result_df = pd.DataFrame(eps_results)
-                    result_df["sc_tag"] = is_sec_code_tagged
-                    os.makedirs("output", exist_ok=True)
-                    if not os.path.exists(output_dir):
-                        result_df.to_csv(output_dir, index=False)
-                        logging.info(f"Results saved to {output_dir}")
-                    else:
-                        result_df.to_csv(output_dir, mode="a", header=False, index=False)
-                        logging.info(f"Results appended to {output_dir}")
+                # Queue EPS extraction, workers parse the PDF while the crawler moves on
+                pipeline.submit(ExtractionJob(local_path, report_date, sec_code, firm, pdf_url, {"sc_tag": is_sec_code_tagged}, page=page_num))
 
-                except Exception as e:
-                    logging.error(f"Error processing report {idx} on page {page_num}: {e}")
-                    continue
+            journal.mark_page(page_num)
                 
         browser.close()
+        waits.log_wait_stats()
@@ -1,12 +1,13 @@
-import os
-import requests
 import logging
-import time
 from urllib.parse import urljoin
 from playwright.sync_api import sync_playwright
-import pandas as pd
 
-from scraping.eps_scraping_pdf import extract_clean_eps_v6
+from scraping.download_store import DEFAULT_STORE_DIR, get_store
+from scraping import waits
+from scraping import profiling, replay
+from scraping.dom_extract import extract_items
+from scraping.pipeline import ExtractionPipeline, ExtractionJob, ResultSink
+from scraping.checkpoint import default_journal_path, get_journal
 from scraping.utils.Utils import parse_vietnamese_date, extract_report_date, convert_vietnamese_charmonth_int, validate_sec_code
 
 ROOT_URL = "https://finance.vietstock.vn"
@@ -14,22 +15,33 @@ BASE_URL = "https://finance.vietstock.vn/bao-cao-phan-tich/phan-tich-doanh-nghie
 DATE_RANGE = ""
 PAGE_PARAM = ""
 
-def scraping_vs_all(download_dir="downloads", valid_codes=None, max_pages=20, start_page=1, output_dir="output/eps_rep_vs.csv", blacklist_code=None, firm="VS"):
-    os.makedirs(download_dir, exist_ok=True)
+REPORT_ITEMS = "div#report-content div.col-xs-24"
+# Read for every report in one round trip
+REPORT_FIELDS = {
+    "title": "a.title-link",
+    "report_date": "small.pull-right > i",
+    "pdf_href": ("a.txt-red", "href"),
+}
+
+def scraping_vs_all(download_dir="downloads", valid_codes=None, max_pages=20, start_page=1, output_dir="output/eps_rep_vs.csv", blacklist_code=None, firm="VS", store_dir=DEFAULT_STORE_DIR, interactive=False, checkpoint_path=None):
+    store = get_store(store_dir)
+    
+    journal = get_journal(checkpoint_path or default_journal_path(output_dir))
     
-    with sync_playwright() as p:
-        browser = p.chromium.launch(headless=False)
+    with sync_playwright() as p, ExtractionPipeline("v6", ResultSink(output_dir), journal=journal, valid_codes=valid_codes, blacklist_codes=blacklist_code) as pipeline:
+        browser = replay.launch(p.chromium, headless=False)
         page = browser.new_page()
-        page.goto(BASE_URL, timeout=60000)
+        with profiling.stage("navigation"):
+            page.goto(BASE_URL, timeout=60000)
 
-        time.sleep(15)  # wait for 10 seconds to ensure the page is fully loaded after date range input
-        # Click outside to close the date picker
+        if interactive:
+            waits.wait_for_operator("Set the date range in the browser.")
+        waits.wait_for_selector(page, "div#report-content div.col-xs-24", name="vs.listing", max_timeout=60000)
             
         for page_num in range(start_page, max_pages + 1):
             logging.info(f"Loading page {page_num}")
             
-            content = page.query_selector("div#report-content")    
-            report_items = content.query_selector_all("div.col-xs-24")  # Updated selector for BVS
+            report_items = extract_items(page, REPORT_ITEMS, REPORT_FIELDS)
             if not report_items:
                 logging.info(f"No reports found on page {page_num}, stopping.")
                 continue
@@ -41,21 +53,17 @@ def scraping_vs_all(download_dir="downloads", valid_codes=None, max_pages=20, st
                 
                 # Detect sec_code
                 try:
-                    sec_code_tag = report_item.query_selector("a.title-link")  # Adjusted selector for VS
-                    if sec_code_tag:
-                        sec_code = sec_code_tag.text_content().strip()[:3] # Get first 3 characters as sec_code
+                    if report_item["title"] is not None:
+                        sec_code = report_item["title"][:3] # Get first 3 characters as sec_code
                         is_sec_code_tagged = True
                     else:
                         logging.warning(f"Could not find sec_code for report {idx} on page {page_num}, fallback to sec code tickets.")
                     
-                    report_date_tag = report_item.query_selector("small.pull-right > i")
-                    logging.info(report_date_tag)
-
-                    if not report_date_tag:
+                    if report_item["report_date"] is None:
                         logging.warning(f"Could not find report date for report {idx} on page {page_num}, skipping.")
                         continue
 
-                    report_date = report_date_tag.text_content().strip()
+                    report_date = report_item["report_date"]
                     # _, _, year = parse_vietnamese_date(report_date)
                     # logging.info(f"Extracted date: {report_date} (year: {year})")
                     # if year < 2019 or year > 2023:
@@ -71,56 +79,36 @@ def scraping_vs_all(download_dir="downloads", valid_codes=None, max_pages=20, st
                 local_path = None
                 pdf_url = None
                 try:
-                    pdf_link_tag = report_item.query_selector("a.txt-red")
-                    pdf_url = urljoin(BASE_URL, pdf_link_tag.get_attribute("href")) if pdf_link_tag else None
+                    pdf_url = urljoin(BASE_URL, report_item["pdf_href"]) if report_item["pdf_href"] is not None else None
                     logging.info(f"PDF URL: {pdf_url}")
-                    if not pdf_link_tag:
+                    if pdf_url is None:
                         logging.warning(f"No PDF link in report {idx} on page {page_num}, skipping.")
                         continue
 
                     logging.info(f"Found PDF link for report {idx} on page {page_num}")
 
-                    # Use Playwright download API
-                    with page.expect_download() as download_info:
-                        pdf_link_tag.click()   # triggers the download
-                    download = download_info.value
-
-                    # Playwright suggests the real filename (from server headers)
-                    filename = download.suggested_filename
-                    local_path = os.path.join(download_dir, filename) + ".pdf"
-
-                    logging.info(f"Saving PDF -> {local_path}")
-                    download.save_as(local_path)
+                    if journal.item_done(pdf_url):
+                        continue
+                    local_path = store.lookup(pdf_url)
+                    if local_path:
+                        logging.info(f"PDF already downloaded: {pdf_url} -> {local_path}")
+                    else:
+                        # Use Playwright download API
+                        with page.expect_download() as download_info:
+                            page.locator(REPORT_ITEMS).nth(idx - 1).locator("a.txt-red").first.click()   # triggers the download
+                        local_path = store.save_download(pdf_url, download_info.value, staging_dir=download_dir)
 
                 except Exception as e:
                     logging.error(f"Error downloading PDF for report {idx} on page {page_num}: {e}")
                     continue
             
-                # Extract EPS
-                try:
-                    eps_results = extract_clean_eps_v6(local_path, report_date, valid_codes=valid_codes, blacklist_codes=blacklist_code, firm=firm, url=pdf_url, already_detected_sc=sec_code)
-                    logging.info(f"Extracted {len(eps_results)} EPS entries from {local_path}")
-                    logging.info(f"EPS Results: {eps_results}")
-                    if not eps_results:
-                        logging.info(f"No EPS data extracted from {local_path}")
-                        continue
-                    
-                    result_df = pd.DataFrame(eps_results)
-                    result_df["sc_tag"] = is_sec_code_tagged
-                    os.makedirs("output", exist_ok=True)
-                    if not os.path.exists(output_dir):
-                        result_df.to_csv(output_dir, index=False)
-                        logging.info(f"Results saved to {output_dir}")
-                    else:
-                        result_df.to_csv(output_dir, mode="a", header=False, index=False)
-                        logging.info(f"Results appended to {output_dir}")
+                # Queue EPS extraction, workers parse the PDF while the crawler moves on
+                pipeline.submit(ExtractionJob(local_path, report_date, sec_code, firm, pdf_url, {"sc_tag": is_sec_code_tagged}, page=page_num))
 
-                except Exception as e:
-                    logging.error(f"Error processing report {idx} on page {page_num}: {e}")
-                    continue
+            journal.mark_page(page_num)
                 
             next_button = page.query_selector("li.next > a")
-            next_button.click()
-            time.sleep(1)  # wait for 1 second to ensure the next page is loaded
+            waits.wait_for_change(page, "div#report-content", next_button.click, name="vs.next_page")
 
         browser.close()
+        waits.log_wait_stats()
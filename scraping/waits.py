@@ -0,0 +1,157 @@
+import json
+import logging
+import os
+import threading
+import time
+
+from playwright.sync_api import Error as PlaywrightError
+from playwright.sync_api import TimeoutError as PlaywrightTimeoutError
+
+# Upper bound for a wait that has never been observed, in milliseconds
+DEFAULT_MAX_TIMEOUT = 30000
+# Adaptive timeouts never drop below this
+MIN_TIMEOUT = 2000
+# Adaptive timeout = HEADROOM x typical duration of that wait
+HEADROOM = 4
+EWMA_ALPHA = 0.2
+
+_stats = {}
+_stats_lock = threading.Lock()
+
+
+class WaitStats:
+    """Observed durations of one named wait, used to size its next timeout."""
+
+    def __init__(self, name):
+        self.name = name
+        self.count = 0
+        self.misses = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.ewma_ms = None
+
+    def timeout(self, max_timeout):
+        if self.ewma_ms is None:
+            return max_timeout
+        return int(min(max_timeout, max(MIN_TIMEOUT, HEADROOM * self.ewma_ms)))
+
+    def record(self, elapsed_ms, ok):
+        self.count += 1
+        self.total_ms += elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+        if not ok:
+            self.misses += 1
+            # A miss means the site got slower, widen the next timeout
+            elapsed_ms *= 2
+        if self.ewma_ms is None:
+            self.ewma_ms = elapsed_ms
+        else:
+            self.ewma_ms = EWMA_ALPHA * elapsed_ms + (1 - EWMA_ALPHA) * self.ewma_ms
+
+    def as_dict(self):
+        return {
+            "count": self.count,
+            "misses": self.misses,
+            "total_ms": round(self.total_ms, 1),
+            "mean_ms": round(self.total_ms / self.count, 1) if self.count else None,
+            "max_ms": round(self.max_ms, 1),
+            "ewma_ms": round(self.ewma_ms, 1) if self.ewma_ms is not None else None,
+        }
+
+
+def _stats_for(name):
+    with _stats_lock:
+        if name not in _stats:
+            _stats[name] = WaitStats(name)
+        return _stats[name]
+
+
+def _timed(name, max_timeout, wait):
+    """
+    Run `wait(timeout_ms)` with the adaptive timeout of `name` and record how long it took.
+    A timeout is logged and returns None, like the fixed sleeps these waits replace.
+    """
+    stats = _stats_for(name)
+    timeout = stats.timeout(max_timeout)
+    start = time.monotonic()
+    try:
+        result, ok = wait(timeout), True
+    except PlaywrightTimeoutError:
+        result, ok = None, False
+    elapsed_ms = (time.monotonic() - start) * 1000
+    with _stats_lock:
+        stats.record(elapsed_ms, ok)
+    if ok:
+        logging.debug(f"Wait '{name}' done in {elapsed_ms:.0f}ms")
+    else:
+        logging.warning(f"Wait '{name}' timed out after {timeout}ms")
+    return result
+
+
+def wait_for_selector(page, selector, name=None, state="visible", max_timeout=DEFAULT_MAX_TIMEOUT):
+    """Wait until `selector` reaches `state` ('visible', 'attached', 'hidden', 'detached'). Returns the element or None."""
+    return _timed(name or selector, max_timeout, lambda timeout: page.wait_for_selector(selector, state=state, timeout=timeout))
+
+
+def wait_for_change(page, selector, action, name=None, max_timeout=DEFAULT_MAX_TIMEOUT):
+    """
+    Run `action` (e.g. a paginator click) and wait until the text of `selector` differs from before.
+    Covers in-place (AJAX) page switches where load states do not fire.
+    """
+    before = page.evaluate("sel => { const e = document.querySelector(sel); return e ? e.innerText : null; }", selector)
+    action()
+
+    def wait(timeout):
+        try:
+            return page.wait_for_function(
+                "([sel, old]) => { const e = document.querySelector(sel); return !!e && e.innerText !== old; }",
+                arg=[selector, before],
+                timeout=timeout
+            )
+        except PlaywrightError as e:
+            if isinstance(e, PlaywrightTimeoutError) or "context was destroyed" not in str(e):
+                raise
+            # The action triggered a full navigation, the new document is the next page
+            page.wait_for_load_state("domcontentloaded", timeout=timeout)
+            return page.wait_for_selector(selector, state="attached", timeout=timeout)
+    return _timed(name or selector, max_timeout, wait)
+
+
+def wait_for_response(page, action, predicate, name, max_timeout=DEFAULT_MAX_TIMEOUT):
+    """Run `action` and wait for a network response matching `predicate(response)`. Returns the response or None."""
+    def wait(timeout):
+        with page.expect_response(predicate, timeout=timeout) as response_info:
+            action()
+        return response_info.value
+    return _timed(name, max_timeout, wait)
+
+
+def wait_for_url(page, predicate, name, max_timeout=DEFAULT_MAX_TIMEOUT):
+    """Wait until the page url satisfies `predicate(url)` (e.g. a popup leaving about:blank)."""
+    return _timed(name, max_timeout, lambda timeout: page.wait_for_url(predicate, timeout=timeout))
+
+
+def wait_for_operator(prompt, name="operator"):
+    """Block until the operator confirms in the terminal, for manual steps (filters, captchas) in a headed browser."""
+    stats = _stats_for(name)
+    start = time.monotonic()
+    input(f"{prompt} Press Enter to continue...")
+    with _stats_lock:
+        stats.record((time.monotonic() - start) * 1000, True)
+
+
+def wait_stats():
+    """Per wait name: count, misses, total/mean/max duration and the EWMA used for its timeout."""
+    with _stats_lock:
+        return {name: stats.as_dict() for name, stats in sorted(_stats.items())}
+
+
+def log_wait_stats():
+    for name, stats in wait_stats().items():
+        logging.info(f"Wait '{name}': {stats}")
+
+
+def save_wait_stats(path):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(wait_stats(), f, indent=2)
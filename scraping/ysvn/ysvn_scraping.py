@@ -1,37 +1,48 @@
-import os
 import re
-import requests
 import logging
 import time
 from urllib.parse import urljoin
-from playwright.sync_api import sync_playwright
-import pandas as pd
 
-from scraping.eps_scraping_pdf import extract_clean_eps_v6
+from scraping.download_store import DEFAULT_STORE_DIR, get_store
+from scraping.downloader import get_downloader
+from scraping.http_transport import open_transport
+from scraping.pipeline import ExtractionPipeline, ExtractionJob, ResultSink
+from scraping.checkpoint import default_journal_path, get_journal
 from scraping.utils.Utils import parse_vietnamese_date, extract_report_date
 
 ROOT_URL = "https://www.yuanta.com.vn"
 BASE_URL = "https://yuanta.com.vn/analysis-category/phan-tich-doanh-nghiep/page/"
 DATE_RANGE = ""
 PAGE_PARAM = ""
+
+REPORT_ITEMS = "article.phan-tich"
+# Read for every article in one round trip
+REPORT_FIELDS = {
+    "title": "a.title",
+    "report_date": "div.meta-item.date",
+    "content_url": ("a.title", "href"),
+}
         
-def scraping_ysvn_all(download_dir="downloads", valid_codes=None, max_pages=20, start_page=1, output_dir="output/eps_rep_ysvn.csv", blacklist_code=None, firm="SSV"):
-    os.makedirs(download_dir, exist_ok=True)
+def scraping_ysvn_all(download_dir="downloads", valid_codes=None, max_pages=20, start_page=1, output_dir="output/eps_rep_ysvn.csv", blacklist_code=None, firm="SSV", store_dir=DEFAULT_STORE_DIR, checkpoint_path=None, transport="http"):
+    """
+    Crawl the Yuanta listing, server-rendered so fetched over plain HTTP unless transport="browser".
+    download_dir is deprecated and ignored, reports are kept in the DownloadStore at store_dir.
+    """
+    store = get_store(store_dir)
+    downloader = get_downloader(store_dir)
     
-    with sync_playwright() as p:
-        browser = p.chromium.launch(headless=True)
-        page = browser.new_page()
-        
-        page.goto(BASE_URL + "1", timeout=60000)
-        page.wait_for_load_state("networkidle")
-
+    journal = get_journal(checkpoint_path or default_journal_path(output_dir))
+    done_pages = journal.done_pages()
+    
+    with open_transport(transport) as source, ExtractionPipeline("v6", ResultSink(output_dir), journal=journal, valid_codes=valid_codes, blacklist_codes=blacklist_code) as pipeline:
         for page_num in range(start_page, max_pages + 1):
+            if page_num in done_pages:
+                logging.info(f"Page {page_num} already done, skipping.")
+                continue
             url = f"{BASE_URL}{page_num}"
             logging.info(f"Loading page {page_num}: {url}")
-            page.goto(url, timeout=60000)
-            page.wait_for_load_state("domcontentloaded")
 
-            report_items = page.query_selector_all("article.phan-tich")
+            report_items = source.items(url, REPORT_ITEMS, REPORT_FIELDS)
             if not report_items:
                 logging.info(f"No reports found on page {page_num}, stopping.")
                 continue
@@ -43,21 +54,19 @@ def scraping_ysvn_all(download_dir="downloads", valid_codes=None, max_pages=20,
                 
                 # Detect sec_code
                 try:
-                    sec_code_tag = report_item.query_selector("a.title")
-                    report_date_tag = report_item.query_selector("div.meta-item.date")
-                    logging.info(f"Report item {idx} on page {page_num} - sec_code_tag: {sec_code_tag}, report_date_tag: {report_date_tag}")
+                    logging.info(f"Report item {idx} on page {page_num} - title: {report_item['title']}, report_date: {report_item['report_date']}")
 
-                    if sec_code_tag:
-                        sec_code = sec_code_tag.text_content().strip()[:3].upper()
+                    if report_item["title"] is not None:
+                        sec_code = report_item["title"][:3].upper()
                         is_sec_code_tagged = True
                     else:
                         logging.warning(f"Could not find sec_code for report {idx} on page {page_num}, fallback to sec code tickets.")
 
-                    if not report_date_tag:
+                    if report_item["report_date"] is None:
                         logging.warning(f"Could not find report date for report {idx} on page {page_num}, skipping.")
                         continue
                     
-                    report_date = extract_report_date(report_date_tag.text_content().strip())
+                    report_date = extract_report_date(report_item["report_date"])
                     logging.info(f"[Page {page_num} - Report {idx}] {sec_code} ({report_date})")
                     
                 except Exception as e:
@@ -66,26 +75,26 @@ def scraping_ysvn_all(download_dir="downloads", valid_codes=None, max_pages=20,
                 
                 # Get pdf link and download
                 local_path = None
-                new_page = None
                 try:
-                    new_page = browser.new_page()
-                    content = report_item.query_selector("a.title")
-                    new_page.goto(content.get_attribute("href"), timeout=60000)
-                    new_page.wait_for_load_state("networkidle")
-                    
-                    pdf_link_tag = new_page.query_selector("a[href$='.pdf']")
-                    if not pdf_link_tag:
-                        logging.warning(f"No PDF link in report {idx} on page {page_num}, skipping.")
+                    content_url = report_item["content_url"]
+
+                    # Reports downloaded by a previous run do not need their content page
+                    pdf_url = store.resolve(content_url)
+                    if journal.item_done(pdf_url):
                         continue
-                    logging.info(f"Found PDF link for report {idx} on page {page_num}")
-                    
-                    pdf_url = urljoin(BASE_URL, pdf_link_tag.get_attribute("href"))
-                    filename = os.path.basename(pdf_url)
-                    local_path = os.path.join(download_dir, filename) + ".pdf"
-                    logging.info(f"Downloading PDF {pdf_url} -> {local_path}")
-                    response = requests.get(pdf_url)
-                    with open(local_path, "wb") as f:
-                        f.write(response.content)
+                    local_path = store.lookup(pdf_url)
+                    if local_path:
+                        logging.info(f"PDF already downloaded for report {idx} on page {page_num}: {pdf_url}")
+                    else:
+                        pdf_href = source.first(content_url, "a[href$='.pdf']")
+                        if not pdf_href:
+                            logging.warning(f"No PDF link in report {idx} on page {page_num}, skipping.")
+                            continue
+                        logging.info(f"Found PDF link for report {idx} on page {page_num}")
+                        
+                        pdf_url = urljoin(BASE_URL, pdf_href)
+                        local_path = downloader.submit(pdf_url)
+                        store.alias(content_url, pdf_url)
                 #     with requests.get(pdf_url, stream=True, allow_redirects=True) as r:
                 #         r.raise_for_status()
 
@@ -111,10 +120,6 @@ def scraping_ysvn_all(download_dir="downloads", valid_codes=None, max_pages=20,
                     logging.error(f"Error finding PDF link for report {idx} on page {page_num}: {e}")
                     continue
                 
-                finally:
-                    if new_page:
-                        new_page.close()
-                
                 # # Get pdf link and download
                 # local_path = None
                 # pdf_url = None
@@ -143,27 +148,7 @@ def scraping_ysvn_all(download_dir="downloads", valid_codes=None, max_pages=20,
                 #     logging.error(f"Error downloading PDF for report {idx} on page {page_num}: {e}")
                 #     continue
                 
-                # Extract EPS
-                try:
-                    eps_results = extract_clean_eps_v6(local_path, report_date, valid_codes=valid_codes, blacklist_codes=blacklist_code, firm=firm, url=pdf_url, already_detected_sc=sec_code)
-                    logging.info(f"Extracted {len(eps_results)} EPS entries from {local_path}")
-                    logging.info(f"EPS Results: {eps_results}")
-                    if not eps_results:
-                        logging.info(f"No EPS data extracted from {local_path}")
-                        continue
-                    
-                    result_df = pd.DataFrame(eps_results)
-                    result_df["sc_tag"] = is_sec_code_tagged
-                    os.makedirs("output", exist_ok=True)
-                    if not os.path.exists(output_dir):
-                        result_df.to_csv(output_dir, index=False)
-                        logging.info(f"Results saved to {output_dir}")
-                    else:
-                        result_df.to_csv(output_dir, mode="a", header=False, index=False)
-                        logging.info(f"Results appended to {output_dir}")
+                # Queue EPS extraction, workers parse the PDF while the crawler moves on
+                pipeline.submit(ExtractionJob(local_path, report_date, sec_code, firm, pdf_url, {"sc_tag": is_sec_code_tagged}, page=page_num))
 
-                except Exception as e:
-                    logging.error(f"Error processing report {idx} on page {page_num}: {e}")
-                    continue
-                
-        browser.close()
+            journal.mark_page(page_num)
@@ -0,0 +1,27 @@
+import pytest
+
+from scraping.download_store import DownloadStore, NotPdfError
+
+
+class FakeDownload:
+    suggested_filename = "report.pdf"
+
+    def __init__(self, content):
+        self.content = content
+
+    def save_as(self, path):
+        with open(path, "wb") as f:
+            f.write(self.content)
+
+
+def test_html_interstitial_is_not_stored(tmp_path):
+    store = DownloadStore(str(tmp_path / "store"))
+    url = "https://example.com/report"
+    with pytest.raises(NotPdfError):
+        store.save_download(url, FakeDownload(b"<html>Please wait</html>"), staging_dir=str(tmp_path / "staging"))
+    assert store.lookup(url) is None
+    assert list((tmp_path / "staging").iterdir()) == []
+
+    local_path = store.save_download(url, FakeDownload(b"%PDF-1.4 report"), staging_dir=str(tmp_path / "staging"))
+    assert store.lookup(url) == local_path
+    store.close()
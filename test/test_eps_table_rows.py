@@ -0,0 +1,71 @@
+import re
+
+import pandas as pd
+import pytest
+
+from scraping.eps_scraping_pdf import _eps_table_rows
+from scraping.patterns import EPS_LABEL_PATTERN, YEAR_LABEL_PATTERN
+
+
+def _loop_eps_table_rows(df, eps_pattern, year_pattern):
+    """The per-cell filtering extract_clean_eps_v6 did before _eps_table_rows."""
+    cols_to_keep = [
+        col for col in df.columns
+        if df[col].apply(lambda x: bool(eps_pattern.search(x)) or bool(year_pattern.search(x))).any()
+    ]
+    if not cols_to_keep:
+        return None
+    df = df[cols_to_keep]
+    eps_col = next((col for col in df.columns if df[col].apply(lambda x: bool(eps_pattern.search(x))).any()), None)
+    if eps_col is None:
+        return None
+    df = df.loc[:, df.columns[df.columns.get_loc(eps_col):]]
+    df = df[df.apply(lambda row: row.astype(str).str.contains(eps_pattern).any() or row.astype(str).str.contains(year_pattern).any(), axis=1)]
+    if df.empty:
+        return None
+    df.columns = df.iloc[0]
+    df = df[1:].reset_index(drop=True)
+    header = df.columns.tolist()
+    rows = [
+        (idx, row.tolist()) for idx, row in df.iterrows()
+        if any(re.search(r"\bEPS\b", str(c), re.IGNORECASE) for c in row)
+    ]
+    return header, rows
+
+
+TABLES = [
+    # EPS label in the first column, years in the header
+    [
+        ["Chỉ số tài chính", "31/12/2024", "31/12/2025", "31/12/2026"],
+        ["Doanh thu", "1,000", "1,200", "1,300"],
+        ["EPS", "3,679", "3,993", "4,726"],
+        ["EPS (VND)", "3,600", "3,900", "4,700"],
+    ],
+    # Columns before the EPS column and without any label are dropped
+    [
+        ["", "Năm", "2023", "2024F", "ghi chú"],
+        ["1", "EPS điều chỉnh", "2,100", "2,500", ""],
+        ["2", "P/E", "10", "9", ""],
+    ],
+    # Year labels but no EPS cell
+    [
+        ["Chỉ tiêu", "2024E", "2025F"],
+        ["ROE", "15%", "16%"],
+    ],
+    # EPS only in a body row, the header is the first labelled row
+    [
+        ["Báo cáo", "", ""],
+        ["Dec-24", "FY25E", "FY26E"],
+        ["eps", "1,234", "1,456"],
+    ],
+]
+
+
+@pytest.mark.parametrize("cells", TABLES)
+def test_masks_match_the_loop(cells):
+    df = pd.DataFrame(cells)
+    assert _eps_table_rows(df, EPS_LABEL_PATTERN, YEAR_LABEL_PATTERN) == _loop_eps_table_rows(df, EPS_LABEL_PATTERN, YEAR_LABEL_PATTERN)
+
+
+def test_empty_table():
+    assert _eps_table_rows(pd.DataFrame(), EPS_LABEL_PATTERN, YEAR_LABEL_PATTERN) is None
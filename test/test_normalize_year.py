@@ -0,0 +1,38 @@
+import pytest
+
+from scraping.utils.Utils import normalize_year
+
+
+@pytest.mark.parametrize("raw, year", [
+    # A four digit run anywhere wins
+    ("2018", "2018"),
+    ("2018F", "2018"),
+    ("2017E", "2017"),
+    ("2022A", "2022"),
+    ("FY2022E", "2022"),
+    ("31/12/2022", "2022"),
+    ("F*2022", "2022"),
+    # Short forms, only at the start
+    ("31/12/22", "2022"),
+    ("FY22", "2022"),
+    ("fy23", "2023"),
+    ("Dec-21", "2021"),
+    ("Jun 19", "2019"),
+    ("Mar99", "1999"),
+    ("F*22", "2022"),
+    ("F22", "2022"),
+    # Surrounding whitespace
+    ("  2024F ", "2024"),
+])
+def test_year_forms(raw, year):
+    assert normalize_year(raw) == year
+
+
+def test_unrecognized_label_is_returned_stripped():
+    assert normalize_year(" EPS ") == "EPS"
+    assert normalize_year("Q3-22") == "Q3-22"
+
+
+@pytest.mark.parametrize("raw", [None, ""])
+def test_missing(raw):
+    assert normalize_year(raw) is None
@@ -0,0 +1,60 @@
+import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from scraping.price_store import PriceStore
+
+
+@pytest.fixture
+def store():
+    history = pd.DataFrame({
+        "sec_code": ["aaa", "aaa", "AAA", "bbb"],
+        "date": pd.to_datetime(["2024-01-02", "2024-01-05", "2024-01-03", "2024-01-04"]),
+        "closing_price": [10.0, 12.0, 11.0, 20.0],
+    })
+    return PriceStore(history)
+
+
+def test_asof_before(store):
+    assert store.asof("AAA", "05/01/2024", "before") == (datetime.date(2024, 1, 3), 11.0)
+    assert store.asof("aaa", datetime.date(2024, 1, 4), "before") == (datetime.date(2024, 1, 3), 11.0)
+    assert store.asof("aaa", "2024-01-02", "before") == (None, None)
+
+
+def test_asof_on_or_before(store):
+    assert store.asof("aaa", "05/01/2024", "on_or_before") == (datetime.date(2024, 1, 5), 12.0)
+    assert store.asof("aaa", "2024-01-04", "on_or_before") == (datetime.date(2024, 1, 3), 11.0)
+    assert store.asof("aaa", "2024-01-01", "on_or_before") == (None, None)
+
+
+def test_asof_missing_ticker_or_date(store):
+    assert "ccc" not in store
+    assert store.asof("ccc", "05/01/2024") == (None, None)
+    assert store.asof("aaa", None) == (None, None)
+
+
+def test_asof_unknown_side(store):
+    with pytest.raises(ValueError):
+        store.asof("aaa", "05/01/2024", "nearest")
+
+
+def test_asof_many(store):
+    codes = ["AAA", "bbb", "ccc", "aaa", "aaa"]
+    dates = ["05/01/2024", "2024-01-05", "2024-01-05", "2024-01-02", None]
+    days, prices = store.asof_many(codes, dates, "before")
+    np.testing.assert_array_equal(days, np.array(["2024-01-03", "2024-01-04", "NaT", "NaT", "NaT"], dtype="datetime64[D]"))
+    np.testing.assert_array_equal(prices, [11.0, 20.0, np.nan, np.nan, np.nan])
+
+    days, prices = store.asof_many(codes, dates, "on_or_before")
+    np.testing.assert_array_equal(days, np.array(["2024-01-05", "2024-01-04", "NaT", "2024-01-02", "NaT"], dtype="datetime64[D]"))
+    np.testing.assert_array_equal(prices, [12.0, 20.0, np.nan, 10.0, np.nan])
+
+
+def test_asof_many_matches_asof(store):
+    codes = ["aaa", "bbb", "aaa"]
+    dates = ["2024-01-03", "2024-01-10", "2024-01-06"]
+    days, prices = store.asof_many(codes, dates, "on_or_before")
+    for code, date, day, price in zip(codes, dates, days, prices):
+        assert store.asof(code, date, "on_or_before") == (day.astype(object), float(price))
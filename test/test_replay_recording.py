@@ -0,0 +1,34 @@
+import pytest
+
+from scraping import replay
+from scraping.checkpoint import CrawlJournal
+from scraping.download_store import DownloadStore
+
+
+@pytest.fixture
+def recording(tmp_path):
+    replay.configure("record", str(tmp_path / "archive"))
+    yield
+    replay.configure("live")
+
+
+def test_store_and_journal_act_empty_while_recording(tmp_path, recording):
+    store = DownloadStore(str(tmp_path / "store"))
+    journal = CrawlJournal(str(tmp_path / "journal.sqlite"))
+    url = "https://example.com/report.pdf"
+    stored = store.put_bytes(url, b"%PDF-1.4")
+    store.alias("https://example.com/report", url)
+    journal.mark_item(url, "extracted", page=1)
+    journal.mark_page(1)
+
+    assert store.lookup(url) is None
+    assert store.resolve("https://example.com/report") is None
+    assert not journal.item_done(url)
+    assert journal.done_pages() == set()
+
+    replay.configure("live")
+    assert store.lookup(url) == stored
+    assert journal.item_done(url)
+    assert journal.done_pages() == {1}
+    store.close()
+    journal.close()
@@ -0,0 +1,37 @@
+import pytest
+
+from scraping import result_cache
+from scraping.eps_scraping_pdf import ExtractionFailed
+from scraping.result_cache import extract_cached, stats
+
+
+@pytest.fixture
+def cache_path(tmp_path):
+    path = str(tmp_path / "eps_results.sqlite")
+    yield path
+    result_cache._connections.pop(path).close()
+
+
+def test_unreadable_pdf_is_not_cached(tmp_path, cache_path):
+    pdf = tmp_path / "broken.pdf"
+    pdf.write_bytes(b"not a pdf")
+    with pytest.raises(ExtractionFailed):
+        extract_cached("v6", str(pdf), "01/02/2024", cache_path=cache_path)
+    assert stats(cache_path) == {}
+
+
+def test_results_are_keyed_on_the_extractor_revision(tmp_path, cache_path, monkeypatch):
+    pdf = tmp_path / "report.pdf"
+    pdf.write_bytes(b"%PDF-1.4 stub")
+    calls = []
+
+    def extractor(pdf_path, report_date, **kwargs):
+        calls.append(kwargs["strict"])
+        return [{"year": "2024", "eps": 1000.0}]
+    monkeypatch.setitem(result_cache.EXTRACTORS, "v6", extractor)
+
+    assert extract_cached("v6", str(pdf), "01/02/2024", cache_path=cache_path)[1] is False
+    assert extract_cached("v6", str(pdf), "01/02/2024", cache_path=cache_path)[1] is True
+    monkeypatch.setattr(result_cache, "EXTRACTOR_REVISION", "changed")
+    assert extract_cached("v6", str(pdf), "01/02/2024", cache_path=cache_path)[1] is False
+    assert calls == [True, True]
@@ -0,0 +1,97 @@
+import csv
+
+import pytest
+
+from scraping import result_writer
+from scraping.result_writer import EPS_SCHEMA, ResultWriter
+
+SCHEMA = {"sec_code": "string", "eps": "float"}
+
+
+def _read(path):
+    with open(path, encoding="utf-8", newline="") as f:
+        return list(csv.reader(f))
+
+
+def test_failed_flush_keeps_rows_and_callbacks(tmp_path, monkeypatch):
+    path = str(tmp_path / "eps.csv")
+    flushed = []
+    writer = ResultWriter(path, SCHEMA, flush_rows=10)
+    writer.write([{"sec_code": "aaa", "eps": 1}], lambda: flushed.append("aaa"))
+
+    write_csv = writer._write_csv
+
+    def fail(rows):
+        raise OSError("disk full")
+    monkeypatch.setattr(writer, "_write_csv", fail)
+    with pytest.raises(OSError):
+        writer.flush()
+    assert flushed == []
+
+    monkeypatch.setattr(writer, "_write_csv", write_csv)
+    writer.write([{"sec_code": "bbb", "eps": 2}], lambda: flushed.append("bbb"))
+    writer.close()
+    assert flushed == ["aaa", "bbb"]
+    assert _read(path) == [["sec_code", "eps"], ["aaa", "1.0"], ["bbb", "2.0"]]
+
+
+def test_failed_append_leaves_no_partial_batch(tmp_path, monkeypatch):
+    path = str(tmp_path / "eps.csv")
+    writer = ResultWriter(path, SCHEMA, flush_rows=1)
+    writer.write([{"sec_code": "aaa", "eps": 1}])
+
+    fsync = result_writer.os.fsync
+    monkeypatch.setattr(result_writer.os, "fsync", lambda fd: (_ for _ in ()).throw(OSError("io error")))
+    with pytest.raises(OSError):
+        writer.write([{"sec_code": "bbb", "eps": 2}])
+    assert _read(path) == [["sec_code", "eps"], ["aaa", "1.0"]]
+
+    monkeypatch.setattr(result_writer.os, "fsync", fsync)
+    writer.close()
+    assert _read(path) == [["sec_code", "eps"], ["aaa", "1.0"], ["bbb", "2.0"]]
+
+
+def test_failed_parquet_flush_writes_no_part(tmp_path, monkeypatch):
+    pq = pytest.importorskip("pyarrow.parquet")
+    path = str(tmp_path / "eps.parquet")
+    writer = ResultWriter(path, SCHEMA, flush_rows=10, partition_by=["sec_code"])
+    writer.write([{"sec_code": "aaa", "eps": 1}, {"sec_code": "bbb", "eps": 2}])
+
+    write_table = pq.write_table
+    calls = []
+
+    def fail_second(table, where):
+        calls.append(where)
+        if len(calls) == 2:
+            raise OSError("disk full")
+        write_table(table, where)
+    monkeypatch.setattr(pq, "write_table", fail_second)
+    with pytest.raises(OSError):
+        writer.flush()
+    assert not [p for p in tmp_path.rglob("*") if p.is_file()]
+
+    monkeypatch.setattr(pq, "write_table", write_table)
+    writer.close()
+    assert len(list(tmp_path.rglob("part-*.parquet"))) == 2
+
+
+def test_legacy_csv_header_is_migrated(tmp_path):
+    path = tmp_path / "eps_rep_mbs.csv"
+    legacy = [column for column in EPS_SCHEMA if column != "file_name"]
+    path.write_text(",".join(legacy) + "\n2024,2024,100,True,01/02/2024,aaa,MBS,u,False\n", encoding="utf-8")
+
+    with ResultWriter(str(path), EPS_SCHEMA) as writer:
+        writer.write([{"year": "2025", "sec_code": "bbb", "file_name": "b.pdf"}])
+
+    rows = _read(path)
+    assert rows[0] == list(EPS_SCHEMA)
+    assert rows[1] == ["2024", "2024", "100", "True", "01/02/2024", "aaa", "MBS", "u", "False", ""]
+    assert rows[2][0] == "2025" and rows[2][-1] == "b.pdf"
+
+
+def test_foreign_csv_is_moved_aside(tmp_path):
+    path = tmp_path / "eps.csv"
+    path.write_text("a,b\n1,2\n", encoding="utf-8")
+    ResultWriter(str(path), SCHEMA).close()
+    assert not path.exists()
+    assert [p.read_text(encoding="utf-8") for p in tmp_path.glob("eps.legacy-*.csv")] == ["a,b\n1,2\n"]